@@ -0,0 +1,507 @@
+"""
+2048 N-Tuple Network Training - Benchmark Suite
+
+固定种子的性能基准，用于客观判断对游戏引擎、特征提取、网络评估和训练循环的修改是否变快。
+
+工作负载：
+  move.<dir>              game.move 标量移动（每个方向单独计时）
+  move_batch.<dir>        game.move_batch 批量移动
+  transpose               game.transpose
+  extract.<set>           NTupleNetwork.extract_indices（全部元组与对称变换的索引）
+  evaluate.<set>          NTupleNetwork.evaluate
+  evaluate_batch.<set>    NTupleNetwork.evaluate_batch
+  evaluate_unmerged.<set> 与 evaluate 相同，但不合并互为对称像的模式（merge_symmetric=False）
+  evaluate_staged.<set>   与 evaluate 相同，但使用三阶段网络（阶段方块 8192、16384）
+  td_update.<set>         NTupleNetwork.update_weights（含特征提取）
+  td_step.<set>           一步 TD：evaluate_with_indices 评估当前棋盘，用上一步的索引向量更新
+  td_step_legacy.<set>    一步 TD 的旧写法：evaluate 当前棋盘，update_weights 重新提取上一步棋盘
+  td_step_tc.<set>        与 td_step 相同，但启用 Temporal Coherence 自适应学习率
+  td_step_unmerged.<set>  与 td_step 相同，但不合并互为对称像的模式
+  episode.<backend>       Trainer.train_episode 整局训练（4-tuple 模式集）
+
+evaluate 与 td_step 的各个变体由 EVALUATE_VARIANTS、TD_STEP_VARIANTS 两张表生成，
+所用网络的构造方式见 NETWORK_VARIANTS；增加对照项只需在表中加一行。
+
+运行 episode 工作负载时还会统计 Python 后端每步的工作量（移动次数、特征提取/评估次数），
+并与每步重新执行所选移动、重新评估所选后继状态的旧实现对比，报告节省的比例。
+
+<set> 为 4tuple（ROW_COL_4TUPLE_PATTERNS）或 6tuple（STANDARD_6TUPLE_PATTERNS）。
+棋盘样本由固定种子的随机对局生成；每项重复若干次取最快一次，结果为每秒操作数。
+
+用法：
+  python bench/bench.py [options]
+
+选项：
+  --only <prefix>        只运行名称以该前缀开头的工作负载（可重复）
+  --repeat <n>           每项重复次数，取最快一次（默认：5）
+  --quick                缩小样本规模，用于快速检查
+  --json <path>          把结果写入 JSON 文件
+  --baseline <path>      与基线比较（默认：bench/baseline.json）
+  --no-baseline          不与基线比较，只输出结果
+  --save-baseline        把本次结果写为基线
+  --threshold <r>        允许的相对下降比例，超过即视为回退（默认：0.10）
+
+存在回退或找不到基线时以退出码 1 结束，可直接用于 CI。基线与机器相关，仓库不附带，
+应在同一台机器上先用 --save-baseline 录制再比较。
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+
+import game  # noqa: E402
+import jit_backend  # noqa: E402
+from network import NTupleNetwork  # noqa: E402
+from patterns import Pattern, ROW_COL_4TUPLE_PATTERNS, STANDARD_6TUPLE_PATTERNS  # noqa: E402
+from trainer import Trainer, TrainingConfig  # noqa: E402
+
+BENCH_VERSION = 1
+DEFAULT_BASELINE_PATH = os.path.join(SCRIPT_DIR, 'baseline.json')
+DIRECTION_NAMES = ['up', 'right', 'down', 'left']
+
+PATTERN_SETS: Dict[str, List[Pattern]] = {
+    '4tuple': ROW_COL_4TUPLE_PATTERNS,
+    '6tuple': STANDARD_6TUPLE_PATTERNS,
+}
+
+# 网络变体：名称 -> (NTupleNetwork 的额外构造参数, 是否启用 Temporal Coherence)
+NETWORK_VARIANTS: Dict[str, Tuple[Dict[str, Any], bool]] = {
+    'default': ({}, False),
+    'tc': ({}, True),
+    'unmerged': ({'merge_symmetric': False}, False),
+    'staged': ({'stage_exponents': [13, 14]}, False),
+}
+
+# evaluate 工作负载：名称前缀 -> 网络变体
+EVALUATE_VARIANTS: Dict[str, str] = {
+    'evaluate': 'default',
+    'evaluate_unmerged': 'unmerged',
+    'evaluate_staged': 'staged',
+}
+
+# 一步 TD 工作负载：名称前缀 -> (网络变体, 是否复用上一步的索引向量)
+TD_STEP_VARIANTS: Dict[str, Tuple[str, bool]] = {
+    'td_step': ('default', True),
+    'td_step_legacy': ('default', False),
+    'td_step_tc': ('tc', True),
+    'td_step_unmerged': ('unmerged', True),
+}
+
+
+class Workload:
+    def __init__(self, name: str, unit: str, setup: Callable[[], Callable[[], int]]):
+        """
+        Args:
+            name: 工作负载名称
+            unit: 结果单位
+            setup: 准备数据并返回计时函数；计时函数执行一次完整工作量，返回完成的操作数
+        """
+        self.name = name
+        self.unit = unit
+        self.setup = setup
+
+
+def sample_boards(count: int, seed: int = 2048) -> np.ndarray:
+    """用固定种子的随机对局生成棋盘样本，覆盖开局到中局的各种局面。"""
+    rng = np.random.default_rng(seed)
+    boards = game.new_board_batch(count, rng)
+    samples = []
+    for step in range(200):
+        afterstates = np.empty((4, count), dtype=np.uint64)
+        valid = np.empty((4, count), dtype=bool)
+        for dir in range(4):
+            afterstates[dir], _, valid[dir] = game.move_batch(boards, dir)
+        # 每局随机选一个合法方向；无合法方向的对局重新开始
+        choice = np.where(valid, rng.random((4, count)), -1.0).argmax(axis=0)
+        alive = valid.any(axis=0)
+        moved = afterstates[choice, np.arange(count)]
+        boards = np.where(alive, game.add_random_tile_batch(moved, rng), game.new_board_batch(count, rng))
+        if step % 20 == 19:
+            samples.append(boards.copy())
+
+    stacked = np.concatenate(samples)
+    return stacked[np.random.default_rng(seed).permutation(len(stacked))[:count]]
+
+
+def measure(run: Callable[[], int], repeat: int) -> float:
+    """重复执行计时函数，返回最快一次的每秒操作数。"""
+    best = float('inf')
+    ops = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = run()
+        best = min(best, time.perf_counter() - start)
+    return ops / best if best > 0 else 0.0
+
+
+def build_workloads(quick: bool) -> List[Workload]:
+    board_count = 1024 if quick else 8192
+    batch_count = 16384 if quick else 131072
+    episode_count = 5 if quick else 20
+    workloads: List[Workload] = []
+    cache: Dict[str, Any] = {}
+
+    def boards() -> List[int]:
+        if 'boards' not in cache:
+            cache['boards'] = [int(b) for b in sample_boards(board_count)]
+        return cache['boards']
+
+    def board_array() -> np.ndarray:
+        if 'board_array' not in cache:
+            cache['board_array'] = sample_boards(batch_count)
+        return cache['board_array']
+
+    def network(name: str, variant: str = 'default') -> NTupleNetwork:
+        key = f'network.{name}.{variant}'
+        if key not in cache:
+            kwargs, temporal_coherence = NETWORK_VARIANTS[variant]
+            # 小幅随机权重，避免全零表让评估结果退化；只有样本涉及的页会被实际分配
+            net = NTupleNetwork(PATTERN_SETS[name], **kwargs)
+            indices = net.features.extract_batch(board_array()[:4096]).ravel()
+            net.flat_weights[indices] = np.random.default_rng(0).random(len(indices))
+            if temporal_coherence:
+                net.enable_temporal_coherence()
+            cache[key] = net
+        return cache[key]
+
+    batch_workloads: List[Workload] = []
+    for dir, dir_name in enumerate(DIRECTION_NAMES):
+        def setup_move(dir: int = dir) -> Callable[[], int]:
+            game.init_tables()
+            samples = boards()
+            move = game.move
+
+            def run() -> int:
+                for board in samples:
+                    move(board, dir)
+                return len(samples)
+            return run
+
+        def setup_move_batch(dir: int = dir) -> Callable[[], int]:
+            game.init_tables()
+            samples = board_array()
+
+            def run() -> int:
+                game.move_batch(samples, dir)
+                return len(samples)
+            return run
+
+        workloads.append(Workload(f'move.{dir_name}', 'moves/s', setup_move))
+        batch_workloads.append(Workload(f'move_batch.{dir_name}', 'moves/s', setup_move_batch))
+
+    workloads.extend(batch_workloads)
+
+    def setup_transpose() -> Callable[[], int]:
+        samples = boards()
+        transpose = game.transpose
+
+        def run() -> int:
+            for board in samples:
+                transpose(board)
+            return len(samples)
+        return run
+
+    workloads.append(Workload('transpose', 'boards/s', setup_transpose))
+
+    for set_name in PATTERN_SETS:
+        def setup_extract(set_name: str = set_name) -> Callable[[], int]:
+            net = network(set_name)
+            samples = boards()
+
+            def run() -> int:
+                for board in samples:
+                    net.extract_indices(board)
+                return len(samples)
+            return run
+
+        def setup_evaluate(set_name: str = set_name, variant: str = 'default') -> Callable[[], int]:
+            net = network(set_name, variant)
+            samples = boards()
+
+            def run() -> int:
+                for board in samples:
+                    net.evaluate(board)
+                return len(samples)
+            return run
+
+        def setup_evaluate_batch(set_name: str = set_name) -> Callable[[], int]:
+            net = network(set_name)
+            samples = board_array()
+
+            def run() -> int:
+                net.evaluate_batch(samples)
+                return len(samples)
+            return run
+
+        def setup_td_update(set_name: str = set_name) -> Callable[[], int]:
+            net = network(set_name)
+            samples = boards()
+
+            def run() -> int:
+                # 正负交替，重复运行后权重保持不变
+                for i, board in enumerate(samples):
+                    net.update_weights(board, 1e-3 if i % 2 == 0 else -1e-3)
+                return len(samples)
+            return run
+
+        def setup_td_step(
+            set_name: str = set_name, variant: str = 'default', fused: bool = True
+        ) -> Callable[[], int]:
+            net = network(set_name, variant)
+            samples = boards()
+
+            def run_fused() -> int:
+                prev_indices = None
+                for i, board in enumerate(samples):
+                    _, indices = net.evaluate_with_indices(board)
+                    if prev_indices is not None:
+                        net.update_weights_by_indices(prev_indices, 1e-3 if i % 2 == 0 else -1e-3)
+                    prev_indices = indices
+                return len(samples)
+
+            def run_legacy() -> int:
+                prev_board = None
+                for i, board in enumerate(samples):
+                    net.evaluate(board)
+                    if prev_board is not None:
+                        net.update_weights(prev_board, 1e-3 if i % 2 == 0 else -1e-3)
+                    prev_board = board
+                return len(samples)
+
+            return run_fused if fused else run_legacy
+
+        workloads.append(Workload(f'extract.{set_name}', 'boards/s', setup_extract))
+        for prefix, variant in EVALUATE_VARIANTS.items():
+            workloads.append(Workload(
+                f'{prefix}.{set_name}', 'evals/s',
+                lambda set_name=set_name, variant=variant: setup_evaluate(set_name, variant),
+            ))
+        workloads.append(Workload(f'evaluate_batch.{set_name}', 'evals/s', setup_evaluate_batch))
+        workloads.append(Workload(f'td_update.{set_name}', 'updates/s', setup_td_update))
+        for prefix, (variant, fused) in TD_STEP_VARIANTS.items():
+            workloads.append(Workload(
+                f'{prefix}.{set_name}', 'steps/s',
+                lambda set_name=set_name, variant=variant, fused=fused: setup_td_step(set_name, variant, fused),
+            ))
+
+    backends = ['python'] + (['numba'] if jit_backend.NUMBA_AVAILABLE else [])
+    for backend in backends:
+        def setup_episode(backend: str = backend) -> Callable[[], int]:
+            game.init_tables()
+            config = TrainingConfig(backend=backend)
+            if backend == 'numba':
+                # 预热：触发编译
+                Trainer(NTupleNetwork(ROW_COL_4TUPLE_PATTERNS), config).train_episode()
+
+            def run() -> int:
+                # 每次从同一初始权重和同一随机种子开始，保证工作量完全相同
+                random.seed(0)
+                np.random.seed(0)
+                if backend == 'numba':
+                    jit_backend.seed(0)
+                trainer = Trainer(NTupleNetwork(ROW_COL_4TUPLE_PATTERNS), config)
+                for _ in range(episode_count):
+                    trainer.train_episode()
+                return episode_count
+            return run
+
+        workloads.append(Workload(f'episode.{backend}', 'episodes/s', setup_episode))
+
+    return workloads
+
+
+def count_episode_work(episodes: int) -> Dict[str, float]:
+    """
+    统计 Python 后端整局训练每步的移动与评估次数。
+    旧实现在选出移动后还会再执行一次 get_afterstate 和 game.move、再评估一次所选后继状态，
+    即每步多 2 次移动和 1 次评估，据此给出节省的比例。
+    评估次数在 features.extract 处统计：evaluate、evaluate_with_indices 与 update_weights 都经过它。
+    """
+    game.init_tables()
+    counts = {'moves': 0, 'evaluations': 0}
+    net = NTupleNetwork(ROW_COL_4TUPLE_PATTERNS)
+    extract = net.features.extract
+    get_afterstate = game.Game.get_afterstate
+
+    def counting_extract(board: int) -> np.ndarray:
+        counts['evaluations'] += 1
+        return extract(board)
+
+    def counting_get_afterstate(self: game.Game, dir: int) -> Any:
+        counts['moves'] += 1
+        return get_afterstate(self, dir)
+
+    net.features.extract = counting_extract  # type: ignore[method-assign]
+    game.Game.get_afterstate = counting_get_afterstate  # type: ignore[method-assign]
+    try:
+        random.seed(0)
+        trainer = Trainer(net, TrainingConfig())
+        steps = sum(trainer.train_episode().moves for _ in range(episodes))
+    finally:
+        game.Game.get_afterstate = get_afterstate  # type: ignore[method-assign]
+
+    legacy_evaluations = counts['evaluations'] + steps
+    legacy_moves = counts['moves'] + 2 * steps
+    return {
+        'steps': steps,
+        'evaluationsPerStep': counts['evaluations'] / steps,
+        'legacyEvaluationsPerStep': legacy_evaluations / steps,
+        'savedEvaluations': steps / legacy_evaluations,
+        'movesPerStep': counts['moves'] / steps,
+        'legacyMovesPerStep': legacy_moves / steps,
+        'savedMoves': 2 * steps / legacy_moves,
+    }
+
+
+def run_benchmarks(workloads: List[Workload], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for workload in workloads:
+        run = workload.setup()
+        rate = measure(run, repeat)
+        results[workload.name] = {'rate': rate, 'unit': workload.unit}
+        print(f'{workload.name:28s} {rate:14,.0f} {workload.unit}')
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+) -> List[str]:
+    """
+    与基线逐项比较，返回回退的工作负载名称。
+    基线条目可带 threshold 字段覆盖全局阈值（用于噪声较大的工作负载）。
+    """
+    regressions: List[str] = []
+    print()
+    print(f'{"工作负载":24s} {"基线":>14s} {"本次":>14s} {"变化":>8s}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base_rate = baseline[name]['rate']
+        limit = baseline[name].get('threshold', threshold)
+        ratio = result['rate'] / base_rate if base_rate > 0 else float('inf')
+        flag = ''
+        if ratio < 1 - limit:
+            flag = '  回退'
+            regressions.append(name)
+        print(f'{name:28s} {base_rate:14,.0f} {result["rate"]:14,.0f} {(ratio - 1) * 100:+7.1f}%{flag}')
+    return regressions
+
+
+def load_results(path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get('version') != BENCH_VERSION:
+        print(f'警告：基线版本不匹配：期望 {BENCH_VERSION}，实际 {data.get("version")}')
+        return None
+    return data['results']
+
+
+def save_results(
+    path: str,
+    results: Dict[str, Dict[str, Any]],
+    args: argparse.Namespace,
+    work: Optional[Dict[str, float]] = None,
+) -> None:
+    data = {
+        'version': BENCH_VERSION,
+        'timestamp': int(time.time() * 1000),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'numba': jit_backend.NUMBA_AVAILABLE,
+        },
+        'settings': {'repeat': args.repeat, 'quick': args.quick},
+        'results': results,
+    }
+    if work is not None:
+        data['work'] = work
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='2048 N-Tuple 训练器性能基准')
+    parser.add_argument('--only', action='append', default=None, help='只运行名称以该前缀开头的工作负载')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数，取最快一次（默认：5）')
+    parser.add_argument('--quick', action='store_true', help='缩小样本规模')
+    parser.add_argument('--json', type=str, default=None, help='把结果写入 JSON 文件')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE_PATH, help='基线文件路径')
+    parser.add_argument('--no-baseline', action='store_true', help='不与基线比较，只输出结果')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写为基线')
+    parser.add_argument('--threshold', type=float, default=0.10, help='允许的相对下降比例（默认：0.10）')
+    args = parser.parse_args()
+
+    if args.repeat <= 0:
+        print('Error: repeat must be positive')
+        sys.exit(1)
+
+    if args.threshold < 0 or args.threshold >= 1:
+        print('Error: threshold must be in [0, 1)')
+        sys.exit(1)
+
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+
+    workloads = build_workloads(args.quick)
+    if args.only:
+        workloads = [w for w in workloads if any(w.name.startswith(p) for p in args.only)]
+        if not workloads:
+            print('Error: no workload matches --only')
+            sys.exit(1)
+
+    results = run_benchmarks(workloads, args.repeat)
+
+    work: Optional[Dict[str, float]] = None
+    if any(w.name == 'episode.python' for w in workloads):
+        work = count_episode_work(5 if args.quick else 20)
+        print(f'\n每步评估: {work["evaluationsPerStep"]:.2f}（旧实现 {work["legacyEvaluationsPerStep"]:.2f}，'
+              f'节省 {work["savedEvaluations"] * 100:.1f}%）| '
+              f'每步移动: {work["movesPerStep"]:.2f}（旧实现 {work["legacyMovesPerStep"]:.2f}，'
+              f'节省 {work["savedMoves"] * 100:.1f}%）')
+
+    if args.json:
+        save_results(args.json, results, args, work)
+        print(f'\n结果已写入: {args.json}')
+
+    if args.save_baseline:
+        save_results(args.baseline, results, args)
+        print(f'基线已写入: {args.baseline}')
+        return
+
+    if args.no_baseline:
+        return
+
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        print(f'\n错误：没有可用的基线 {args.baseline}。基线与机器相关，仓库不附带；'
+              '请先在本机用 --save-baseline 录制，或加 --no-baseline 只输出结果')
+        sys.exit(1)
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f'\n{len(regressions)} 项性能回退: {", ".join(regressions)}')
+        sys.exit(1)
+    print('\n无性能回退')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+2048 N-Tuple Network Training - Move Table Cache Check
+
+检查模块旁的移动表缓存（move_tables_*.npy + move_tables.json）：
+校验版本与校验和，缓存缺失或过期时重新计算并写回。
+
+用法：
+  python check_tables.py [options]
+
+选项：
+  --full    重新计算全部表并与缓存逐项比较（用于确认表编码变化时已递增版本号）
+  --force   无论缓存是否有效都重新生成
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import game
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='2048 移动表缓存检查')
+    parser.add_argument('--full', action='store_true', help='重新计算并与缓存逐项比较')
+    parser.add_argument('--force', action='store_true', help='强制重新生成缓存')
+    args = parser.parse_args()
+
+    directory = game.MOVE_TABLES_DIR
+    print(f'缓存目录: {directory} | 版本: {game.MOVE_TABLES_VERSION}')
+
+    tables = None if args.force else game.load_move_tables(directory)
+    fresh = None
+
+    if tables is not None:
+        print('缓存有效：版本与校验和一致')
+        if args.full:
+            fresh = game.build_move_tables()
+            if all(np.array_equal(a, b) for a, b in zip(tables, fresh)):
+                print('内容与重新计算的表一致')
+            else:
+                print('内容与重新计算的表不一致（表编码已变化但版本号未递增？）')
+                tables = None
+
+    if tables is None:
+        if args.force:
+            print('强制重新生成')
+        elif not os.path.exists(os.path.join(directory, game.MOVE_TABLES_META_FILE)):
+            print('缓存缺失，正在生成')
+        else:
+            print('缓存过期，正在重新生成')
+
+        start = time.time()
+        if fresh is None:
+            fresh = game.build_move_tables()
+        try:
+            game.save_move_tables(*fresh, directory=directory)
+        except OSError as e:
+            print(f'写入失败: {e}')
+            sys.exit(1)
+        print(f'已写入缓存 ({time.time() - start:.2f}秒)')
+
+        if game.load_move_tables(directory) is None:
+            print('写入后校验失败')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
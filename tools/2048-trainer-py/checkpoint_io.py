@@ -0,0 +1,80 @@
+"""
+2048 N-Tuple Network Training - Background Checkpoint Writer
+
+在后台线程中保存检查点和权重文件，训练线程只负责拍摄权重快照。
+
+快照是与扁平权重数组等大的常驻副本：每次拍摄只复制自上次快照以来
+被更新过的脏块（见 NTupleNetwork.dirty_blocks），其余块沿用旧副本。
+启用 Temporal Coherence 时，累加器与权重在相同位置更新，按同一组脏块一起复制。
+写入通过 file_io.atomic_write 完成（临时文件 + fsync + rename），
+因此检查点文件在任何时刻都是完整可加载的。
+"""
+
+from typing import Callable, List, Optional
+import threading
+import traceback
+import numpy as np
+from network import NTupleNetwork, DIRTY_BLOCK_SIZE
+
+
+class CheckpointWriter:
+    def __init__(self):
+        self.snapshots: List[np.ndarray] = []
+        self.thread: Optional[threading.Thread] = None
+        self.copied_blocks = 0
+
+    def wait(self) -> None:
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def capture(self, network: NTupleNetwork) -> List[np.ndarray]:
+        """
+        拍摄快照，返回与 network.tracked_arrays() 一一对应的副本（第一个为扁平权重）。
+        会先等待上一次写入完成，因为写入线程正在读取同一份快照。
+        """
+        self.wait()
+
+        arrays = network.tracked_arrays()
+        dirty = network.dirty_blocks
+
+        reuse = dirty is not None and len(self.snapshots) == len(arrays) and all(
+            snapshot.shape == array.shape and snapshot.dtype == array.dtype
+            for snapshot, array in zip(self.snapshots, arrays)
+        )
+
+        if not reuse:
+            self.snapshots = [np.array(array) for array in arrays]
+            self.copied_blocks = -(-len(arrays[0]) // DIRTY_BLOCK_SIZE)
+        else:
+            full_blocks = len(arrays[0]) // DIRTY_BLOCK_SIZE
+            size = full_blocks * DIRTY_BLOCK_SIZE
+            blocks = np.flatnonzero(dirty[:full_blocks])
+            tail = len(dirty) > full_blocks and dirty[full_blocks]
+
+            for snapshot, array in zip(self.snapshots, arrays):
+                if len(blocks) > 0:
+                    target = snapshot[:size].reshape(full_blocks, DIRTY_BLOCK_SIZE)
+                    source = array[:size].reshape(full_blocks, DIRTY_BLOCK_SIZE)
+                    target[blocks] = source[blocks]
+                if tail:
+                    snapshot[size:] = array[size:]
+            self.copied_blocks = len(blocks) + int(tail)
+
+        if dirty is not None:
+            dirty.fill(False)
+
+        return self.snapshots
+
+    def submit(self, job: Callable[[], None]) -> None:
+        self.wait()
+
+        def run() -> None:
+            try:
+                job()
+            except Exception:
+                print('\n后台保存失败:')
+                traceback.print_exc()
+
+        self.thread = threading.Thread(target=run, name='checkpoint-writer', daemon=True)
+        self.thread.start()
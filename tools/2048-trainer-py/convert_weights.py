@@ -0,0 +1,90 @@
+"""
+2048 N-Tuple Network Training - Weight Format Converter
+
+在 JSON 权重文件与二进制权重文件之间相互转换，评估结果不变。
+输入格式根据文件头自动识别，输出格式由输出文件扩展名决定（.bin 为二进制，其余为 JSON）。
+二进制输出与训练器相同，合并对称模式后按存储布局保存（见 weights_io），可直接内存映射；
+合并后再导出 JSON 时各成员表取合并表的 1/成员数，单表数值可能与原文件不同，评估结果相同。
+
+二进制输出可用 --dtype 指定存储类型：float64、float32，或 int16/int8 定点（有损，每个元组一个缩放系数）。
+
+用法：
+  python convert_weights.py <input> <output> [--dtype <name>]
+
+示例：
+  python convert_weights.py weights.json weights.bin
+  python convert_weights.py weights.bin weights.json
+  python convert_weights.py weights.json weights-int16.bin --dtype int16
+"""
+
+from typing import Optional
+import argparse
+import sys
+import time
+from network import NTupleNetwork, stage_exponents_from_tiles
+from weights_io import (
+    FLOAT_DTYPES,
+    QUANTIZED_DTYPES,
+    binary_to_config,
+    is_binary_weights,
+    load_binary_weights,
+    load_weights_config,
+    save_json_weights,
+)
+
+
+def convert(input_path: str, output_path: str, dtype: Optional[str] = None) -> None:
+    if output_path.endswith('.bin'):
+        if is_binary_weights(input_path):
+            header, flat_weights = load_binary_weights(input_path)
+            network = NTupleNetwork.from_binary_data(header, flat_weights)
+            metadata = header['metadata']
+        else:
+            config = load_weights_config(input_path)
+            network = NTupleNetwork(
+                config['patterns'], stage_exponents=stage_exponents_from_tiles(config.get('stageTiles', []))
+            )
+            network.load_weights(config)
+            metadata = config.get('metadata')
+        network.save_binary(output_path, metadata, dtype)
+    else:
+        if is_binary_weights(input_path):
+            header, flat_weights = load_binary_weights(input_path)
+            if 'sourcePatterns' in header:
+                config = NTupleNetwork.from_binary_data(header, flat_weights).export_weights(header['metadata'])
+            else:
+                config = binary_to_config(header, flat_weights)
+        else:
+            config = load_weights_config(input_path)
+        save_json_weights(output_path, config)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='2048 N-Tuple 权重格式转换（JSON <-> 二进制）')
+    parser.add_argument('input', type=str, help='输入权重文件（JSON 或二进制）')
+    parser.add_argument('output', type=str, help='输出权重文件（.bin 为二进制，其余为 JSON）')
+    parser.add_argument(
+        '--dtype',
+        type=str,
+        choices=list(FLOAT_DTYPES) + list(QUANTIZED_DTYPES),
+        default=None,
+        help='二进制输出的存储类型（默认：与输入相同）',
+    )
+    args = parser.parse_args()
+
+    if args.dtype is not None and not args.output.endswith('.bin'):
+        print('Error: --dtype requires a .bin output path')
+        sys.exit(1)
+
+    start = time.time()
+    try:
+        convert(args.input, args.output, args.dtype)
+    except (OSError, ValueError, KeyError) as e:
+        print(f'转换失败: {e}')
+        sys.exit(1)
+
+    print(f'已转换: {args.input} -> {args.output} ({time.time() - start:.2f}秒)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+"""
+2048 N-Tuple Network Training - Weight Evaluation Entry Point
+
+加载权重文件（JSON 或二进制），用深度受限的 Expectimax 搜索下 M 局游戏，
+报告得分分布和最大方块分布，用于在发布到 public/2048data 之前衡量权重强度。
+
+第 i 局使用种子 seed + i，结果只取决于权重与种子集合，与进程数无关；--jobs 把对局分给进程池，
+权重放入共享内存只保留一份。平均得分、中位数与到达率附带置信区间；
+--baseline 与之前的 --json 结果按相同种子配对比较，平均得分显著下降时以退出码 1 结束。
+
+用法：
+  python evaluate.py <weights> [options]
+
+选项：
+  --games <n>            对局数（默认：100）
+  --depth <n>            Expectimax 机会层深度，0 为贪心（默认：1）
+  --prob-threshold <p>   机会节点剪枝概率阈值（默认：0.001）
+  --tt-size <n>          置换表容量（默认：1048576）
+  --seed <n>             第一局的随机种子，第 i 局使用 seed + i（默认：0）
+  --jobs <n>             并行对局的进程数（默认：1）
+  --confidence <p>       置信区间的置信水平（默认：0.95）
+  --baseline <path>      与之前 --json 写出的结果按种子配对比较
+  --json <path>          把结果写入 JSON 文件
+  --record <dir>         把对局的转移记录到回放目录（见 replay），供 train.py --replay 离线训练
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import signal
+import statistics
+import sys
+import time
+import numpy as np
+from game import add_random_tile, get_max_tile
+from network import NTupleNetwork
+from expectimax import ExpectimaxPlayer
+from replay import TransitionRecorder
+
+REPORT_TILES = [512, 1024, 2048, 4096, 8192, 16384, 32768]
+
+
+class GameRecord:
+    def __init__(self, seed: int, score: int, max_tile: int, moves: int, elapsed: float):
+        self.seed = seed
+        self.score = score
+        self.max_tile = max_tile
+        self.moves = moves
+        self.elapsed = elapsed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'seed': self.seed,
+            'score': self.score,
+            'maxTile': self.max_tile,
+            'moves': self.moves,
+            'elapsed': self.elapsed,
+            'movesPerSecond': self.moves / self.elapsed if self.elapsed > 0 else 0.0,
+        }
+
+
+def play_game(player: ExpectimaxPlayer, seed: int, recorder: Optional[TransitionRecorder] = None) -> GameRecord:
+    """用固定种子下一局；置换表在每局开始时清空，保证结果只取决于种子。"""
+    random.seed(seed)
+    player.table.clear()
+
+    start = time.time()
+    board = add_random_tile(add_random_tile(0))
+    score = 0
+    moves = 0
+    prev_afterstate = 0
+
+    while True:
+        choice = player.choose_move(board)
+        if choice is None:
+            break
+        _, afterstate, reward = choice
+        if recorder is not None:
+            if prev_afterstate != 0:
+                recorder.add(prev_afterstate, reward, afterstate)
+            prev_afterstate = afterstate
+        board = add_random_tile(afterstate)
+        score += reward
+        moves += 1
+
+    if recorder is not None and prev_afterstate != 0:
+        recorder.add(prev_afterstate, 0, 0)
+
+    return GameRecord(seed, score, get_max_tile(board), moves, time.time() - start)
+
+
+# 进程池子进程中的玩家与共享内存块（由 init_worker 创建）
+worker_player: Optional[ExpectimaxPlayer] = None
+worker_block: Any = None
+
+
+def init_worker(
+    patterns: List[List[int]],
+    shm_name: str,
+    dtype: str,
+    max_tile_exponent: int,
+    stage_exponents: List[int],
+    depth: int,
+    prob_threshold: float,
+    tt_size: int,
+) -> None:
+    """进程池子进程入口：挂载主进程放入共享内存的权重，创建本进程的 Expectimax 玩家。"""
+    global worker_player, worker_block
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    network, worker_block = NTupleNetwork.from_shared_memory(
+        patterns, shm_name, dtype, max_tile_exponent, stage_exponents=stage_exponents
+    )
+    worker_player = ExpectimaxPlayer(network, depth, prob_threshold, tt_size)
+
+
+def play_counted(player: ExpectimaxPlayer, seed: int) -> Tuple[GameRecord, Tuple[int, int, int, int]]:
+    """下一局，同时返回本局的 (叶子评估, 层内合并节点, 置换表命中, 置换表未命中) 计数。"""
+    before = (player.evaluations, player.merged_nodes, player.table.hits, player.table.misses)
+    record = play_game(player, seed)
+    after = (player.evaluations, player.merged_nodes, player.table.hits, player.table.misses)
+    return record, tuple(a - b for a, b in zip(after, before))
+
+
+def play_worker(seed: int) -> Tuple[GameRecord, Tuple[int, int, int, int]]:
+    return play_counted(worker_player, seed)
+
+
+def mean_interval(values: np.ndarray, z: float) -> Tuple[float, float]:
+    """均值的正态近似置信区间：mean ± z·s/√n。"""
+    if len(values) < 2:
+        return float(values.mean()), float(values.mean())
+    half = z * float(values.std(ddof=1)) / math.sqrt(len(values))
+    return float(values.mean()) - half, float(values.mean()) + half
+
+
+def median_interval(values: np.ndarray, z: float) -> Tuple[float, float]:
+    """中位数的无分布假设置信区间：取排序后第 n/2 ∓ z·√n/2 个值。"""
+    ordered = np.sort(values)
+    n = len(ordered)
+    half = z * math.sqrt(n) / 2
+    lo = max(0, int(math.floor(n / 2 - half)))
+    hi = min(n - 1, int(math.ceil(n / 2 + half)) - 1)
+    return float(ordered[lo]), float(ordered[max(lo, hi)])
+
+
+def wilson_interval(successes: int, n: int, z: float) -> Tuple[float, float]:
+    """比例的 Wilson 置信区间，比例接近 0 或 1、局数较少时也不会越界。"""
+    if n == 0:
+        return 0.0, 0.0
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def confidence_z(confidence: float) -> float:
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def summarize(records: List[GameRecord], confidence: float = 0.95) -> Dict[str, Any]:
+    scores = np.array([r.score for r in records], dtype=np.float64)
+    max_tiles = np.array([r.max_tile for r in records])
+    total_moves = sum(r.moves for r in records)
+    total_time = sum(r.elapsed for r in records)
+    game_speeds = np.array([r.moves / r.elapsed if r.elapsed > 0 else 0.0 for r in records])
+    z = confidence_z(confidence)
+
+    distribution: Dict[str, int] = {}
+    for tile in sorted(set(max_tiles.tolist())):
+        distribution[str(tile)] = int((max_tiles == tile).sum())
+
+    return {
+        'games': len(records),
+        'meanScore': float(scores.mean()),
+        'medianScore': float(np.median(scores)),
+        'minScore': float(scores.min()),
+        'maxScore': float(scores.max()),
+        'scorePercentiles': {
+            str(p): float(np.percentile(scores, p)) for p in (10, 25, 75, 90)
+        },
+        'reachRates': {
+            str(tile): float((max_tiles >= tile).mean()) for tile in REPORT_TILES
+        },
+        'confidence': confidence,
+        'meanScoreInterval': list(mean_interval(scores, z)),
+        'medianScoreInterval': list(median_interval(scores, z)),
+        'reachRateIntervals': {
+            str(tile): list(wilson_interval(int((max_tiles >= tile).sum()), len(records), z)) for tile in REPORT_TILES
+        },
+        'maxTileDistribution': distribution,
+        'movesPerSecond': total_moves / total_time if total_time > 0 else 0.0,
+        'gameMovesPerSecond': {
+            str(p): float(np.percentile(game_speeds, p)) for p in (10, 50, 90)
+        },
+    }
+
+
+def compare_with_baseline(
+    records: List[GameRecord], baseline: Dict[str, Any], confidence: float
+) -> Optional[Dict[str, Any]]:
+    """
+    与基线结果按相同种子配对比较：同一种子的两局面对相同的随机方块序列（直到走法分叉），
+    配对差的方差远小于两组独立均值之差，少量对局就能分辨小幅回退。没有共同种子时返回 None；
+    只有 1 局配对时无法估计方差，结论固定为 inconclusive。
+    """
+    base_scores = {r['seed']: r['score'] for r in baseline.get('gameRecords', [])}
+    base_tiles = {r['seed']: r['maxTile'] for r in baseline.get('gameRecords', [])}
+    paired = [r for r in records if r.seed in base_scores]
+    if len(paired) == 0:
+        return None
+
+    z = confidence_z(confidence)
+    diffs = np.array([r.score - base_scores[r.seed] for r in paired], dtype=np.float64)
+    lo, hi = mean_interval(diffs, z)
+    if len(paired) < 2:
+        verdict = 'inconclusive'
+    else:
+        verdict = 'regression' if hi < 0 else 'improvement' if lo > 0 else 'inconclusive'
+    return {
+        'pairedGames': len(paired),
+        'confidence': confidence,
+        'meanScoreDelta': float(diffs.mean()),
+        'meanScoreDeltaInterval': [lo, hi],
+        'reachRateDeltas': {
+            str(tile): float(np.mean([(r.max_tile >= tile) - (base_tiles[r.seed] >= tile) for r in paired]))
+            for tile in REPORT_TILES
+        },
+        'verdict': verdict,
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    level = f'{summary["confidence"] * 100:g}%'
+    mean_lo, mean_hi = summary['meanScoreInterval']
+    median_lo, median_hi = summary['medianScoreInterval']
+    print('=' * 60)
+    print(f'对局数: {summary["games"]}')
+    print(f'平均得分: {summary["meanScore"]:.0f}（{level} 置信区间 {mean_lo:.0f} - {mean_hi:.0f}）| '
+          f'中位数: {summary["medianScore"]:.0f}（{median_lo:.0f} - {median_hi:.0f}）')
+    print(f'最低: {summary["minScore"]:.0f} | 最高: {summary["maxScore"]:.0f}')
+    percentiles = summary['scorePercentiles']
+    print('得分分位数: ' + ' | '.join(f'P{p}: {v:.0f}' for p, v in percentiles.items()))
+    print(f'到达率（{level} 置信区间）:')
+    for tile, rate in summary['reachRates'].items():
+        lo, hi = summary['reachRateIntervals'][tile]
+        print(f'  {tile:>5}: {rate * 100:5.1f}%（{lo * 100:5.1f}% - {hi * 100:5.1f}%）')
+    print('最大方块分布: ' + ' | '.join(
+        f'{tile}: {count}' for tile, count in summary['maxTileDistribution'].items()
+    ))
+    speeds = summary['gameMovesPerSecond']
+    print(f'速度: {summary["movesPerSecond"]:.0f} 步/秒 | 单局 P10/P50/P90: '
+          f'{speeds["10"]:.0f} / {speeds["50"]:.0f} / {speeds["90"]:.0f} 步/秒')
+    print('=' * 60)
+
+
+def print_comparison(comparison: Dict[str, Any], baseline_path: str) -> None:
+    lo, hi = comparison['meanScoreDeltaInterval']
+    verdict = {'regression': '显著下降', 'improvement': '显著提升', 'inconclusive': '无显著差异'}
+    print(f'与基线比较: {baseline_path}（{comparison["pairedGames"]} 局相同种子配对）')
+    print(f'平均得分差: {comparison["meanScoreDelta"]:+.0f}（{comparison["confidence"] * 100:g}% 置信区间 '
+          f'{lo:+.0f} - {hi:+.0f}）→ {verdict[comparison["verdict"]]}')
+    if comparison['pairedGames'] < 2:
+        print('  仅 1 局配对，无法估计置信区间，请增加 --games')
+    print('到达率差: ' + ' | '.join(
+        f'{tile}: {delta * 100:+.1f}%' for tile, delta in comparison['reachRateDeltas'].items()
+    ))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='2048 N-Tuple 权重评估（Expectimax）')
+    parser.add_argument('weights', type=str, help='权重文件路径（JSON 或二进制）')
+    parser.add_argument('--games', '-g', type=int, default=100, help='对局数（默认：100）')
+    parser.add_argument('--depth', type=int, default=1, help='Expectimax 机会层深度，0 为贪心（默认：1）')
+    parser.add_argument('--prob-threshold', type=float, default=1e-3, help='机会节点剪枝概率阈值（默认：0.001）')
+    parser.add_argument('--tt-size', type=int, default=1 << 20, help='置换表容量（默认：1048576）')
+    parser.add_argument('--seed', type=int, default=0, help='第一局的随机种子（默认：0）')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='并行对局的进程数（默认：1）')
+    parser.add_argument('--confidence', type=float, default=0.95, help='置信区间的置信水平（默认：0.95）')
+    parser.add_argument('--baseline', type=str, default=None, help='与之前 --json 写出的结果按种子配对比较')
+    parser.add_argument('--json', type=str, default=None, help='把结果写入 JSON 文件')
+    parser.add_argument('--record', type=str, default=None, help='把对局的转移记录到回放目录')
+    args = parser.parse_args()
+
+    if args.games <= 0:
+        print('Error: games must be positive')
+        sys.exit(1)
+
+    if args.depth < 0:
+        print('Error: depth must be non-negative')
+        sys.exit(1)
+
+    if args.jobs <= 0:
+        print('Error: jobs must be positive')
+        sys.exit(1)
+
+    if args.confidence <= 0 or args.confidence >= 1:
+        print('Error: confidence must be between 0 and 1')
+        sys.exit(1)
+
+    if args.record is not None and args.jobs > 1:
+        print('Error: --record cannot be combined with --jobs')
+        sys.exit(1)
+
+    return args
+
+
+def play_parallel(network: NTupleNetwork, args: argparse.Namespace) -> Tuple[List[GameRecord], List[int]]:
+    """
+    把对局分给 args.jobs 个进程：权重放入共享内存，子进程各自挂载并创建玩家。
+    结果按种子顺序返回，与串行执行完全相同（耗时除外）。
+
+    Returns:
+        (对局记录, [叶子评估, 层内合并节点, 置换表命中, 置换表未命中] 的总和)
+    """
+    ctx = multiprocessing.get_context()
+    block = network.share_memory()
+    records: List[GameRecord] = []
+    counters = [0, 0, 0, 0]
+    initargs = (
+        network.source_patterns,
+        block.name,
+        network.get_dtype(),
+        network.max_tile_exponent,
+        network.stage_exponents,
+        args.depth,
+        args.prob_threshold,
+        args.tt_size,
+    )
+    try:
+        with ctx.Pool(args.jobs, initializer=init_worker, initargs=initargs) as pool:
+            seeds = range(args.seed, args.seed + args.games)
+            for i, (record, counts) in enumerate(pool.imap(play_worker, seeds)):
+                records.append(record)
+                counters = [a + b for a, b in zip(counters, counts)]
+                report_game(i, args.games, record)
+    finally:
+        network.release_shared_memory(block)
+    return records, counters
+
+
+def report_game(i: int, games: int, record: GameRecord) -> None:
+    print(f'\r第 {i + 1}/{games} 局 | 得分: {record.score:6d} | 最大: {record.max_tile:5d} | '
+          f'{record.moves / record.elapsed:6.0f} 步/秒', end='', flush=True)
+
+
+def main() -> None:
+    args = parse_args()
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    network = NTupleNetwork.from_file(args.weights)
+    recorder = TransitionRecorder(args.record) if args.record is not None else None
+
+    print(f'权重: {args.weights}')
+    print(f'深度: {args.depth} | 剪枝阈值: {args.prob_threshold} | 置换表: {args.tt_size} | 进程: {args.jobs}')
+
+    start = time.time()
+    if args.jobs > 1:
+        records, (evaluations, merged_nodes, hits, misses) = play_parallel(network, args)
+    else:
+        player = ExpectimaxPlayer(network, args.depth, args.prob_threshold, args.tt_size)
+        records = []
+        for i in range(args.games):
+            record = play_game(player, args.seed + i, recorder)
+            records.append(record)
+            report_game(i, args.games, record)
+        evaluations, merged_nodes = player.evaluations, player.merged_nodes
+        hits, misses = player.table.hits, player.table.misses
+    wall_time = time.time() - start
+    print()
+    if recorder is not None:
+        recorder.close()
+        print(f'已记录 {recorder.records:,} 条转移到: {args.record}')
+
+    summary = summarize(records, args.confidence)
+    summary['config'] = {
+        'weights': args.weights,
+        'depth': args.depth,
+        'probThreshold': args.prob_threshold,
+        'ttSize': args.tt_size,
+        'seed': args.seed,
+        'jobs': args.jobs,
+    }
+    summary['wallTime'] = wall_time
+    summary['throughputMovesPerSecond'] = sum(r.moves for r in records) / wall_time if wall_time > 0 else 0.0
+    summary['transpositionHitRate'] = hits / (hits + misses) if hits + misses > 0 else 0.0
+    print_summary(summary)
+    summary['mergedNodes'] = merged_nodes
+    summary['evaluations'] = evaluations
+    print(f'置换表命中率: {summary["transpositionHitRate"] * 100:.1f}% | '
+          f'层内合并重复节点: {merged_nodes} | 叶子评估: {evaluations}')
+    print(f'总耗时: {wall_time:.1f} 秒 | 吞吐: {summary["throughputMovesPerSecond"]:.0f} 步/秒（{args.jobs} 个进程）')
+
+    regression = False
+    if baseline is not None:
+        comparison = compare_with_baseline(records, baseline, args.confidence)
+        if comparison is None:
+            print(f'警告：基线 {args.baseline} 中没有相同种子的对局，跳过比较')
+        else:
+            base_config = baseline.get('config', {})
+            if any(base_config.get(key) != summary['config'][key] for key in ('depth', 'probThreshold', 'ttSize')):
+                print('警告：基线的搜索参数（深度、剪枝阈值或置换表容量）不同，差异不只来自权重')
+            print_comparison(comparison, args.baseline)
+            summary['baseline'] = dict(comparison, path=args.baseline)
+            regression = comparison['verdict'] == 'regression'
+
+    if args.json:
+        summary['gameRecords'] = [r.to_dict() for r in records]
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f'结果已写入: {args.json}')
+
+    if regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+2048 N-Tuple Network Training - Expectimax Search
+
+使用训练好的 N-Tuple 网络做深度受限的 Expectimax 搜索，用于评估权重强度。
+
+搜索按层批量展开：同一深度的所有机会节点一起枚举随机方块、一起执行四个方向的
+move_batch，下一层的后继状态合并去重后再递归，叶子用一次 evaluate_batch 评估。
+这样每一步只需要少量 NumPy 调用，而不是每个节点一次 Python 调用。
+
+- depth=0 等价于训练时的贪心 1 层搜索：reward + V(afterstate)
+- 机会节点剪枝：到达概率低于 prob_threshold 的机会节点直接用 V(afterstate) 估值
+- 置换表：以 64 位棋盘为键缓存机会节点的 (剩余深度, 值)，搜索深度不低于需求时命中；
+  容量有上限，满时淘汰最早插入的条目。同一层内的重复节点由 np.unique 合并，不占用置换表
+"""
+
+from typing import Dict, Optional, Tuple
+import numpy as np
+from game import Board, move_batch
+from network import NTupleNetwork
+
+TILE_SHIFTS = np.array([(15 - pos) * 4 for pos in range(16)], dtype=np.uint64)
+TILE_MASK = np.uint64(0xF)
+SPAWN_VALUES = (np.uint64(1), np.uint64(2))
+SPAWN_PROBS = (0.9, 0.1)
+
+
+class TranspositionTable:
+    def __init__(self, max_entries: int = 1 << 20):
+        self.max_entries = max_entries
+        self.entries: Dict[int, Tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, board: int, depth: int) -> Optional[float]:
+        entry = self.entries.get(board)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, board: int, depth: int, value: float) -> None:
+        if self.max_entries <= 0:
+            return
+        if board not in self.entries and len(self.entries) >= self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        self.entries[board] = (depth, value)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+class ExpectimaxPlayer:
+    def __init__(
+        self,
+        network: NTupleNetwork,
+        depth: int = 1,
+        prob_threshold: float = 1e-3,
+        tt_size: int = 1 << 20,
+    ):
+        self.network = network
+        self.depth = depth
+        self.prob_threshold = prob_threshold
+        self.table = TranspositionTable(tt_size)
+        self.evaluations = 0
+        self.merged_nodes = 0
+
+    def chance_values(self, afterstates: np.ndarray, depth: int, probs: np.ndarray) -> np.ndarray:
+        """
+        计算一批机会节点（后继状态）的期望值。
+
+        Args:
+            afterstates: uint64 后继状态数组
+            depth: 剩余机会层数，0 表示直接用网络估值
+            probs: 到达每个节点的累计概率，用于剪枝
+        """
+        if depth == 0:
+            self.evaluations += len(afterstates)
+            return self.network.evaluate_batch(afterstates)
+
+        values = np.empty(len(afterstates), dtype=np.float64)
+        expand = probs >= self.prob_threshold
+
+        for i in np.flatnonzero(expand):
+            cached = self.table.get(int(afterstates[i]), depth)
+            if cached is not None:
+                values[i] = cached
+                expand[i] = False
+
+        pruned = ~expand & (probs < self.prob_threshold)
+        if pruned.any():
+            self.evaluations += int(pruned.sum())
+            values[pruned] = self.network.evaluate_batch(afterstates[pruned])
+
+        nodes = np.flatnonzero(expand)
+        if len(nodes) == 0:
+            return values
+
+        boards = afterstates[nodes]
+        empty = ((boards[:, None] >> TILE_SHIFTS) & TILE_MASK) == 0
+        counts = empty.sum(axis=1)
+        node_of_cell, cell = np.nonzero(empty)
+
+        children = []
+        child_nodes = []
+        child_probs = []
+        for value, prob in zip(SPAWN_VALUES, SPAWN_PROBS):
+            children.append(boards[node_of_cell] | (value << TILE_SHIFTS[cell]))
+            child_nodes.append(node_of_cell)
+            child_probs.append(prob / counts[node_of_cell])
+        children = np.concatenate(children)
+        child_nodes = np.concatenate(child_nodes)
+        child_probs = np.concatenate(child_probs)
+
+        next_afterstates = np.empty((4, len(children)), dtype=np.uint64)
+        rewards = np.empty((4, len(children)), dtype=np.float64)
+        valid = np.empty((4, len(children)), dtype=bool)
+        for dir in range(4):
+            next_afterstates[dir], rewards[dir], valid[dir] = move_batch(children, dir)
+
+        reach = probs[nodes][child_nodes] * child_probs
+        candidates = next_afterstates[valid]
+        candidate_probs = np.broadcast_to(reach, valid.shape)[valid]
+
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        self.merged_nodes += len(candidates) - len(unique)
+        unique_probs = np.zeros(len(unique), dtype=np.float64)
+        np.maximum.at(unique_probs, inverse, candidate_probs)
+        next_values = self.chance_values(unique, depth - 1, unique_probs)
+
+        q = np.full(valid.shape, -np.inf)
+        q[valid] = rewards[valid] + next_values[inverse.ravel()]
+        best = q.max(axis=0)
+        best[~valid.any(axis=0)] = 0.0
+
+        node_values = np.bincount(child_nodes, weights=best * child_probs, minlength=len(nodes))
+        for i, node in enumerate(nodes):
+            values[node] = node_values[i]
+            self.table.put(int(afterstates[node]), depth, float(node_values[i]))
+
+        return values
+
+    def choose_move(self, board: Board) -> Optional[Tuple[int, Board, int]]:
+        """
+        Returns:
+            (方向, 后继状态, 奖励)，无合法移动时返回 None
+        """
+        boards = np.array([board], dtype=np.uint64)
+        afterstates = []
+        rewards = []
+        dirs = []
+        for dir in range(4):
+            after, reward, moved = move_batch(boards, dir)
+            if moved[0]:
+                afterstates.append(after[0])
+                rewards.append(int(reward[0]))
+                dirs.append(dir)
+
+        if not dirs:
+            return None
+
+        afterstates = np.array(afterstates, dtype=np.uint64)
+        values = np.array(rewards, dtype=np.float64) + self.chance_values(
+            afterstates, self.depth, np.ones(len(dirs))
+        )
+        best = int(np.argmax(values))
+        return (dirs[best], int(afterstates[best]), rewards[best])
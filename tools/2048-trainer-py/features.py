@@ -0,0 +1,141 @@
+"""
+2048 N-Tuple Network Training - Feature Extraction
+
+一次性计算棋盘在全部元组（含 8 种对称变换）上的查表索引。
+
+对每个模式预先把 8 种对称变换后的位置展开成 nibble 收集表（gather table），
+提取时先用一次移位把棋盘拆成 16 个 nibble，再按收集表取出每个元组的方块并按
+基数 16 合成索引，最后加上该模式在扁平权重数组中的偏移。
+得到的索引向量可以被 evaluate 和 update 重复使用，避免重复提取。
+
+max_tile_exponent 小于 15 时使用降基数编码：方块指数先截断到上限，再按基数
+max_tile_exponent + 1 合成索引，查找表相应缩小。
+
+分阶段网络（stage_exponents 非空）为每个阶段保存一整套查找表，各阶段首尾相接。
+棋盘的阶段是它已出现的阶段方块个数：阶段方块指数 t 按升序排列，
+棋盘上有不小于 t 的方块即算出现。判定用字节通道并行比较完成：16 个 nibble 按奇偶
+拆进两个各含 8 个字节通道的整数，每个通道置位 0x10 后减 t，第 4 位仍为 1 说明该方块 >= t。
+得到的阶段乘以 stage_size 加到全部索引上。
+"""
+
+from typing import List, Dict, Sequence, Tuple
+import numpy as np
+from game import Board
+from patterns import MAX_TILE_EXPONENT, Pattern
+
+TILE_SHIFTS = np.array([(15 - pos) * 4 for pos in range(16)], dtype=np.uint64)
+TILE_MASK = np.uint64(0xF)
+
+# 字节通道：每个通道放一个方块指数，0x10 位用于判定减法后是否借位
+LANE_MASK = 0x0F0F0F0F0F0F0F0F
+LANE_HIGH = 0x1010101010101010
+LANE_ONES = 0x0101010101010101
+
+
+class FeatureExtractor:
+    def __init__(
+        self,
+        symmetric_patterns: List[List[Pattern]],
+        offsets: List[int],
+        max_tile_exponent: int = MAX_TILE_EXPONENT,
+        stage_exponents: Sequence[int] = (),
+        stage_size: int = 0,
+    ):
+        """
+        Args:
+            stage_exponents: 划分阶段的方块指数（升序），为空时只有一个阶段
+            stage_size: 每个阶段的权重数，阶段 k 的索引整体偏移 k × stage_size
+        """
+        self.max_tile_exponent = max_tile_exponent
+        self.clamp = max_tile_exponent < MAX_TILE_EXPONENT
+        radix = max_tile_exponent + 1
+
+        # 按元组长度分组，每组一个 (元组数, 长度) 收集表
+        groups: Dict[int, List[Tuple[Pattern, int]]] = {}
+        for patterns, offset in zip(symmetric_patterns, offsets):
+            for pattern in patterns:
+                groups.setdefault(len(pattern), []).append((pattern, offset))
+
+        self.gathers: List[np.ndarray] = []
+        self.radices: List[np.ndarray] = []
+        self.bases: List[np.ndarray] = []
+        for size, entries in groups.items():
+            self.gathers.append(np.array([p for p, _ in entries], dtype=np.intp))
+            self.radices.append(radix ** np.arange(size - 1, -1, -1, dtype=np.int64))
+            self.bases.append(np.array([offset for _, offset in entries], dtype=np.int64))
+
+        self.num_features = sum(len(base) for base in self.bases)
+
+        self.stage_size = stage_size
+        self.stage_subtrahends: List[int] = [t * LANE_ONES for t in stage_exponents]
+        self.stage_subtrahends_u64 = np.array(self.stage_subtrahends, dtype=np.uint64)
+        # 各阶段预先加好偏移的 bases，单棋盘提取时直接选用，不再额外做一次数组加法
+        self.stage_bases: List[List[np.ndarray]] = [
+            [base + stage * stage_size for base in self.bases]
+            for stage in range(len(self.stage_subtrahends) + 1)
+        ]
+
+    def stage(self, board: Board) -> int:
+        """棋盘已出现的阶段方块个数（见模块说明），常数次位运算。"""
+        even = (board & LANE_MASK) | LANE_HIGH
+        odd = ((board >> 4) & LANE_MASK) | LANE_HIGH
+        stage = 0
+        for subtrahend in self.stage_subtrahends:
+            if ((even - subtrahend) | (odd - subtrahend)) & LANE_HIGH:
+                stage += 1
+        return stage
+
+    def stage_batch(self, boards: np.ndarray) -> np.ndarray:
+        boards = np.asarray(boards, dtype=np.uint64)
+        even = (boards & np.uint64(LANE_MASK)) | np.uint64(LANE_HIGH)
+        odd = ((boards >> np.uint64(4)) & np.uint64(LANE_MASK)) | np.uint64(LANE_HIGH)
+        stages = np.zeros(len(boards), dtype=np.int64)
+        for subtrahend in self.stage_subtrahends_u64:
+            stages += (((even - subtrahend) | (odd - subtrahend)) & np.uint64(LANE_HIGH)) != 0
+        return stages
+
+    def padded_tables(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        把各长度分组合并成统一宽度的 (gather, radix, base) 三张表，供编译后端使用。
+        较短元组的填充列基数为 0，不影响索引结果。
+        """
+        width = max(gather.shape[1] for gather in self.gathers)
+        gathers = []
+        radices = []
+        for gather, radix in zip(self.gathers, self.radices):
+            pad = width - gather.shape[1]
+            gathers.append(np.pad(gather, ((0, 0), (0, pad))))
+            radices.append(np.tile(np.pad(radix, (0, pad)), (len(gather), 1)))
+        return (
+            np.concatenate(gathers).astype(np.int64),
+            np.concatenate(radices),
+            np.concatenate(self.bases),
+        )
+
+    def extract(self, board: Board) -> np.ndarray:
+        tiles = ((np.uint64(board) >> TILE_SHIFTS) & TILE_MASK).astype(np.int64)
+        if self.clamp:
+            np.minimum(tiles, self.max_tile_exponent, out=tiles)
+        bases = self.stage_bases[self.stage(board)] if self.stage_subtrahends else self.bases
+        if len(self.gathers) == 1:
+            return tiles[self.gathers[0]] @ self.radices[0] + bases[0]
+        return np.concatenate([
+            tiles[gather] @ radix + base
+            for gather, radix, base in zip(self.gathers, self.radices, bases)
+        ])
+
+    def extract_batch(self, boards: np.ndarray) -> np.ndarray:
+        boards = np.asarray(boards, dtype=np.uint64)
+        tiles = ((boards[:, None] >> TILE_SHIFTS) & TILE_MASK).astype(np.int64)
+        if self.clamp:
+            np.minimum(tiles, self.max_tile_exponent, out=tiles)
+        if len(self.gathers) == 1:
+            indices = tiles[:, self.gathers[0]] @ self.radices[0] + self.bases[0]
+        else:
+            indices = np.concatenate([
+                tiles[:, gather] @ radix + base
+                for gather, radix, base in zip(self.gathers, self.radices, self.bases)
+            ], axis=1)
+        if self.stage_subtrahends:
+            indices += (self.stage_batch(boards) * self.stage_size)[:, None]
+        return indices
@@ -0,0 +1,49 @@
+"""
+2048 N-Tuple Network Training - File Helpers
+
+与具体数据格式无关的文件写入工具：原子写入与 JSON 保存。
+游戏引擎（移动表缓存）、权重文件、检查点与各种报告共用，不依赖训练器的其他模块。
+"""
+
+from typing import Any, BinaryIO, Callable
+import json
+import os
+import secrets
+
+
+def atomic_write(path: str, write: Callable[[BinaryIO], None]) -> None:
+    """
+    先写入同目录下的临时文件并 fsync，再用 os.replace 原子替换目标文件。
+    写入过程中被中断时，目标文件保持上一次完整写入的内容。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    # 以 0666 创建临时文件，由内核按当前 umask 得出普通文件的默认权限（mkstemp 固定为 0600）
+    while True:
+        tmp_path = os.path.join(directory, f'{os.path.basename(path)}.{secrets.token_hex(4)}.tmp')
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def save_json(path: str, data: Any) -> None:
+    encoded = json.dumps(data, indent=2).encode('utf-8')
+    atomic_write(path, lambda f: f.write(encoded))
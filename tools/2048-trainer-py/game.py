@@ -17,8 +17,13 @@
 15 = 32768
 """
 
-from typing import Optional, Tuple, List
+from typing import Dict, Optional, Tuple, List
+import hashlib
+import json
+import os
 import random
+import numpy as np
+from file_io import atomic_write
 
 Board = int
 Direction = int
@@ -26,6 +31,31 @@ Direction = int
 LEFT_TABLE: List[Tuple[int, int]] = [(0, 0)] * 65536
 RIGHT_TABLE: List[Tuple[int, int]] = [(0, 0)] * 65536
 
+# 列表：以列的 16 位值（上方方块在高位）为键，结果按列铺开到 nibble 0/4/8/12 上
+# （即位 48/32/16/0），左移 (3 - c) * 4 位即可放回第 c 列，垂直移动无需转置
+UP_TABLE: List[Tuple[int, int]] = [(0, 0)] * 65536
+DOWN_TABLE: List[Tuple[int, int]] = [(0, 0)] * 65536
+
+# 批量移动与 Numba 后端使用的 NumPy 表（与上面的列表内容一致），
+# 由 init_tables 绑定为缓存文件的只读内存映射视图
+LEFT_ROW_TABLE = np.zeros(65536, dtype=np.uint64)
+RIGHT_ROW_TABLE = np.zeros(65536, dtype=np.uint64)
+UP_COLUMN_TABLE = np.zeros(65536, dtype=np.uint64)
+DOWN_COLUMN_TABLE = np.zeros(65536, dtype=np.uint64)
+LEFT_SCORE_TABLE = np.zeros(65536, dtype=np.uint32)
+RIGHT_SCORE_TABLE = np.zeros(65536, dtype=np.uint32)
+
+# 每行最大方块指数
+ROW_MAX_TABLE: List[int] = [0] * 65536
+
+# 移动表缓存：模块旁的一对 .npy 文件加一个记录版本和校验和的 JSON 文件。
+# 表的编码变化时递增 MOVE_TABLES_VERSION，旧缓存会被视为过期并重建。
+MOVE_TABLES_VERSION = 1
+MOVE_TABLES_DIR = os.path.dirname(os.path.abspath(__file__))
+MOVE_TABLES_BOARDS_FILE = 'move_tables_boards.npy'
+MOVE_TABLES_SCORES_FILE = 'move_tables_scores.npy'
+MOVE_TABLES_META_FILE = 'move_tables.json'
+
 tables_initialized = False
 
 
@@ -69,24 +99,135 @@ def reverse_row(row: int) -> int:
     )
 
 
-def init_tables() -> None:
-    global tables_initialized
-    if tables_initialized:
-        return
+def spread_column(row: int) -> int:
+    """把 16 位行值的 4 个 nibble 铺开为一列（位 48/32/16/0）。"""
+    return (
+        ((row & 0xF000) << 36) |
+        ((row & 0x0F00) << 24) |
+        ((row & 0x00F0) << 12) |
+        (row & 0x000F)
+    )
+
+
+def build_move_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算全部移动表。
+
+    Returns:
+        (boards, scores)：boards 为 uint64 (4, 65536)，依次为左/右行结果和上/下列结果；
+        scores 为 uint32 (3, 65536)，依次为左/右得分和行最大方块指数。
+        合并两个 15 会溢出到第 17 位，行结果截断到 16 位。
+    """
+    left_rows: List[int] = []
+    right_rows: List[int] = []
+    left_scores: List[int] = []
+    right_scores: List[int] = []
+    row_max: List[int] = []
 
     for row in range(65536):
-        LEFT_TABLE[row] = compute_row_left(row)
+        left_row, left_score = compute_row_left(row)
+        right_row, right_score = compute_row_left(reverse_row(row))
+        left_rows.append(left_row & 0xFFFF)
+        right_rows.append(reverse_row(right_row))
+        left_scores.append(left_score)
+        right_scores.append(right_score)
+        row_max.append(max(row >> 12, (row >> 8) & 0xF, (row >> 4) & 0xF, row & 0xF))
+
+    boards = np.array([
+        left_rows,
+        right_rows,
+        [spread_column(r) for r in left_rows],
+        [spread_column(r) for r in right_rows],
+    ], dtype=np.uint64)
+    scores = np.array([left_scores, right_scores, row_max], dtype=np.uint32)
+
+    return (boards, scores)
+
+
+def move_tables_checksums(boards: np.ndarray, scores: np.ndarray) -> Dict[str, str]:
+    return {
+        MOVE_TABLES_BOARDS_FILE: hashlib.sha256(np.ascontiguousarray(boards)).hexdigest(),
+        MOVE_TABLES_SCORES_FILE: hashlib.sha256(np.ascontiguousarray(scores)).hexdigest(),
+    }
+
+
+def save_move_tables(boards: np.ndarray, scores: np.ndarray, directory: str = MOVE_TABLES_DIR) -> None:
+    """原子地写入缓存；元数据最后写入，因此中断的写入只会让缓存被判为过期。"""
+    atomic_write(os.path.join(directory, MOVE_TABLES_BOARDS_FILE), lambda f: np.save(f, boards))
+    atomic_write(os.path.join(directory, MOVE_TABLES_SCORES_FILE), lambda f: np.save(f, scores))
+
+    meta = {
+        'version': MOVE_TABLES_VERSION,
+        'sha256': move_tables_checksums(boards, scores),
+    }
+    atomic_write(
+        os.path.join(directory, MOVE_TABLES_META_FILE),
+        lambda f: f.write(json.dumps(meta, indent=2).encode('utf-8')),
+    )
+
+
+def load_move_tables(directory: str = MOVE_TABLES_DIR) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    以只读内存映射加载缓存，多个进程共享同一份页缓存。
+    缓存缺失、版本不符、形状不符或校验和不符时返回 None。
+    """
+    try:
+        with open(os.path.join(directory, MOVE_TABLES_META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != MOVE_TABLES_VERSION:
+            return None
+        boards = np.load(os.path.join(directory, MOVE_TABLES_BOARDS_FILE), mmap_mode='r')
+        scores = np.load(os.path.join(directory, MOVE_TABLES_SCORES_FILE), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+    if (boards.shape != (4, 65536) or boards.dtype != np.uint64 or
+            scores.shape != (3, 65536) or scores.dtype != np.uint32):
+        return None
+    if move_tables_checksums(boards, scores) != meta.get('sha256'):
+        return None
+
+    return (boards, scores)
+
 
-        reversed_row = reverse_row(row)
-        left_result = compute_row_left(reversed_row)
-        RIGHT_TABLE[row] = (
-            reverse_row(left_result[0]),
-            left_result[1]
-        )
+def install_move_tables(boards: np.ndarray, scores: np.ndarray) -> None:
+    global LEFT_ROW_TABLE, RIGHT_ROW_TABLE, UP_COLUMN_TABLE, DOWN_COLUMN_TABLE
+    global LEFT_SCORE_TABLE, RIGHT_SCORE_TABLE, tables_initialized
+
+    LEFT_ROW_TABLE, RIGHT_ROW_TABLE, UP_COLUMN_TABLE, DOWN_COLUMN_TABLE = (np.asarray(t) for t in boards)
+    LEFT_SCORE_TABLE, RIGHT_SCORE_TABLE = np.asarray(scores[0]), np.asarray(scores[1])
+
+    # 标量路径使用 Python 列表（对 int 下标比 NumPy 标量索引快得多）
+    left_rows, right_rows, up_columns, down_columns = boards.tolist()
+    left_scores, right_scores, row_max = scores.tolist()
+    LEFT_TABLE[:] = zip(left_rows, left_scores)
+    RIGHT_TABLE[:] = zip(right_rows, right_scores)
+    UP_TABLE[:] = zip(up_columns, left_scores)
+    DOWN_TABLE[:] = zip(down_columns, right_scores)
+    ROW_MAX_TABLE[:] = row_max
 
     tables_initialized = True
 
 
+def init_tables() -> None:
+    """
+    首次使用时加载移动表：优先读取模块旁的缓存，缓存不可用时重新计算并尝试写回。
+    目录不可写时只在内存中使用新计算的表。
+    """
+    if tables_initialized:
+        return
+
+    tables = load_move_tables()
+    if tables is None:
+        tables = build_move_tables()
+        try:
+            save_move_tables(*tables)
+        except OSError:
+            pass
+
+    install_move_tables(*tables)
+
+
 def extract_row(board: Board, row_index: int) -> int:
     shift = (3 - row_index) * 16
     return (board >> shift) & 0xFFFF
@@ -98,7 +239,30 @@ def set_row(board: Board, row_index: int, row: int) -> Board:
     return (board & mask) | (row << shift)
 
 
+COLUMN_MASK = 0x000F000F000F000F
+
+
+def extract_column(board: Board, col_index: int) -> int:
+    """取第 col_index 列为 16 位值（第 0 行在高位），与 extract_row 的行值布局一致。"""
+    x = (board >> ((3 - col_index) * 4)) & COLUMN_MASK
+    return (x >> 36 | x >> 24 | x >> 12 | x) & 0xFFFF
+
+
 def transpose(board: Board) -> Board:
+    # 两轮位交换：先交换 2x2 块内的反对角 nibble，再交换 4x4 内的反对角 2x2 块
+    a = (
+        (board & 0xF0F00F0FF0F00F0F) |
+        ((board & 0x0000F0F00000F0F0) << 12) |
+        ((board & 0x0F0F00000F0F0000) >> 12)
+    )
+    return (
+        (a & 0xFF00FF0000FF00FF) |
+        ((a & 0x00FF00FF00000000) >> 24) |
+        ((a & 0x00000000FF00FF00) << 24)
+    )
+
+
+def transpose_reference(board: Board) -> Board:
     tiles: List[int] = []
     for i in range(16):
         shift = (15 - i) * 4
@@ -116,58 +280,55 @@ def transpose(board: Board) -> Board:
     return result
 
 
+def move_rows(board: Board, table: List[Tuple[int, int]]) -> Optional[Tuple[Board, int]]:
+    r0 = table[(board >> 48) & 0xFFFF]
+    r1 = table[(board >> 32) & 0xFFFF]
+    r2 = table[(board >> 16) & 0xFFFF]
+    r3 = table[board & 0xFFFF]
+    new_board = (r0[0] << 48) | (r1[0] << 32) | (r2[0] << 16) | r3[0]
+    if new_board == board:
+        return None
+    return (new_board, r0[1] + r1[1] + r2[1] + r3[1])
+
+
+def move_columns(board: Board, table: List[Tuple[int, int]]) -> Optional[Tuple[Board, int]]:
+    # 与 extract_column 相同，展开以省去函数调用
+    x0 = (board >> 12) & COLUMN_MASK
+    x1 = (board >> 8) & COLUMN_MASK
+    x2 = (board >> 4) & COLUMN_MASK
+    x3 = board & COLUMN_MASK
+    c0 = table[(x0 >> 36 | x0 >> 24 | x0 >> 12 | x0) & 0xFFFF]
+    c1 = table[(x1 >> 36 | x1 >> 24 | x1 >> 12 | x1) & 0xFFFF]
+    c2 = table[(x2 >> 36 | x2 >> 24 | x2 >> 12 | x2) & 0xFFFF]
+    c3 = table[(x3 >> 36 | x3 >> 24 | x3 >> 12 | x3) & 0xFFFF]
+    new_board = (c0[0] << 12) | (c1[0] << 8) | (c2[0] << 4) | c3[0]
+    if new_board == board:
+        return None
+    return (new_board, c0[1] + c1[1] + c2[1] + c3[1])
+
+
 def move_left(board: Board) -> Optional[Tuple[Board, int]]:
     if not tables_initialized:
         init_tables()
-
-    new_board = 0
-    total_score = 0
-    moved = False
-
-    for r in range(4):
-        row = extract_row(board, r)
-        result = LEFT_TABLE[row]
-        new_board = set_row(new_board, r, result[0])
-        total_score += result[1]
-        if result[0] != row:
-            moved = True
-
-    return (new_board, total_score) if moved else None
+    return move_rows(board, LEFT_TABLE)
 
 
 def move_right(board: Board) -> Optional[Tuple[Board, int]]:
     if not tables_initialized:
         init_tables()
-
-    new_board = 0
-    total_score = 0
-    moved = False
-
-    for r in range(4):
-        row = extract_row(board, r)
-        result = RIGHT_TABLE[row]
-        new_board = set_row(new_board, r, result[0])
-        total_score += result[1]
-        if result[0] != row:
-            moved = True
-
-    return (new_board, total_score) if moved else None
+    return move_rows(board, RIGHT_TABLE)
 
 
 def move_up(board: Board) -> Optional[Tuple[Board, int]]:
-    transposed = transpose(board)
-    result = move_left(transposed)
-    if result is None:
-        return None
-    return (transpose(result[0]), result[1])
+    if not tables_initialized:
+        init_tables()
+    return move_columns(board, UP_TABLE)
 
 
 def move_down(board: Board) -> Optional[Tuple[Board, int]]:
-    transposed = transpose(board)
-    result = move_right(transposed)
-    if result is None:
-        return None
-    return (transpose(result[0]), result[1])
+    if not tables_initialized:
+        init_tables()
+    return move_columns(board, DOWN_TABLE)
 
 
 def move(board: Board, dir: Direction) -> Optional[Tuple[Board, int]]:
@@ -182,22 +343,145 @@ def move(board: Board, dir: Direction) -> Optional[Tuple[Board, int]]:
     return None
 
 
+_ROW_MASK = np.uint64(0xFFFF)
+_ROW_SHIFTS = [np.uint64((3 - r) * 16) for r in range(4)]
+_COLUMN_MASK = np.uint64(COLUMN_MASK)
+_COLUMN_SHIFTS = [np.uint64((3 - c) * 4) for c in range(4)]
+
+_T_KEEP = np.uint64(0xF0F00F0FF0F00F0F)
+_T_UP12 = np.uint64(0x0000F0F00000F0F0)
+_T_DOWN12 = np.uint64(0x0F0F00000F0F0000)
+_T_KEEP2 = np.uint64(0xFF00FF0000FF00FF)
+_T_DOWN24 = np.uint64(0x00FF00FF00000000)
+_T_UP24 = np.uint64(0x00000000FF00FF00)
+_SHIFT12 = np.uint64(12)
+_SHIFT24 = np.uint64(24)
+_SHIFT36 = np.uint64(36)
+
+
+def transpose_batch(boards: np.ndarray) -> np.ndarray:
+    a = (boards & _T_KEEP) | ((boards & _T_UP12) << _SHIFT12) | ((boards & _T_DOWN12) >> _SHIFT12)
+    return (a & _T_KEEP2) | ((a & _T_DOWN24) >> _SHIFT24) | ((a & _T_UP24) << _SHIFT24)
+
+
+def move_batch(boards: np.ndarray, dir: Direction) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    对一批棋盘同时执行同一方向的移动。
+
+    Args:
+        boards: uint64 棋盘数组
+        dir: 移动方向（0=上，1=右，2=下，3=左）
+
+    Returns:
+        (new_boards, rewards, moved_mask)。未移动的棋盘在 new_boards 中保持原样。
+    """
+    if not tables_initialized:
+        init_tables()
+
+    boards = np.asarray(boards, dtype=np.uint64)
+    new_boards = np.zeros_like(boards)
+    rewards = np.zeros(boards.shape, dtype=np.uint32)
+
+    if dir == 3:
+        table, score_table = LEFT_ROW_TABLE, LEFT_SCORE_TABLE
+    elif dir == 1:
+        table, score_table = RIGHT_ROW_TABLE, RIGHT_SCORE_TABLE
+    elif dir == 0:
+        table, score_table = UP_COLUMN_TABLE, LEFT_SCORE_TABLE
+    elif dir == 2:
+        table, score_table = DOWN_COLUMN_TABLE, RIGHT_SCORE_TABLE
+    else:
+        raise ValueError(f'Invalid direction: {dir}')
+
+    if dir == 1 or dir == 3:
+        for shift in _ROW_SHIFTS:
+            rows = (boards >> shift) & _ROW_MASK
+            new_boards |= table[rows] << shift
+            rewards += score_table[rows]
+    else:
+        # 列直接从棋盘中抽出，列表结果已按列铺开，无需转置
+        for shift in _COLUMN_SHIFTS:
+            x = (boards >> shift) & _COLUMN_MASK
+            columns = (x | (x >> _SHIFT12) | (x >> _SHIFT24) | (x >> _SHIFT36)) & _ROW_MASK
+            new_boards |= table[columns] << shift
+            rewards += score_table[columns]
+
+    return (new_boards, rewards, new_boards != boards)
+
+
+_TILE_SHIFTS = np.array([(15 - pos) * 4 for pos in range(16)], dtype=np.uint64)
+_TILE_MASK = np.uint64(0xF)
+
+
+def add_random_tile_batch(boards: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    为每个棋盘在随机空格放置一个新方块（90% 为 2，10% 为 4），无空格的棋盘保持不变。
+    """
+    boards = np.asarray(boards, dtype=np.uint64)
+    empty = ((boards[:, None] >> _TILE_SHIFTS) & _TILE_MASK) == 0
+    counts = empty.sum(axis=1)
+
+    pick = (rng.random(len(boards)) * counts).astype(np.int64)
+    rank = np.cumsum(empty, axis=1) - 1
+    pos = np.argmax(empty & (rank == pick[:, None]), axis=1)
+    values = np.where(rng.random(len(boards)) < 0.9, 1, 2).astype(np.uint64)
+
+    return np.where(counts > 0, boards | (values << _TILE_SHIFTS[pos]), boards)
+
+
+def new_board_batch(count: int, rng: np.random.Generator) -> np.ndarray:
+    boards = np.zeros(count, dtype=np.uint64)
+    return add_random_tile_batch(add_random_tile_batch(boards, rng), rng)
+
+
+# ---- 位运算工具层 ----
+# 以下函数对整块 64 位棋盘做常数次位运算，代替逐个 nibble 的 Python 循环。
+# 原有的循环实现保留为 *_reference，作为测试对照。
+
+NIBBLE_LOW_BITS = 0x1111111111111111
+# 水平相邻对：nibble i 与 i+1 同行（从低位数，i % 4 != 3）
+HORIZONTAL_PAIR_MASK = 0x0111011101110111
+# 垂直相邻对：nibble i 与 i+4（低 12 个 nibble）
+VERTICAL_PAIR_MASK = 0x0000111111111111
+
+if hasattr(int, 'bit_count'):
+    def popcount(x: int) -> int:
+        return x.bit_count()
+else:
+    def popcount(x: int) -> int:
+        return bin(x).count('1')
+
+
+def zero_nibble_mask(x: int) -> int:
+    """返回一个掩码：x 中值为 0 的 nibble 对应位置的最低位为 1，其余为 0。"""
+    x |= x >> 2
+    x |= x >> 1
+    return ~x & NIBBLE_LOW_BITS
+
+
+def empty_mask(board: Board) -> int:
+    return zero_nibble_mask(board)
+
+
+def select_nth_set_bit(mask: int, n: int) -> int:
+    """返回 mask 中从最高位数起第 n 个（从 0 开始）置位的位序号。"""
+    for _ in range(popcount(mask) - 1 - n):
+        mask &= mask - 1
+    return (mask & -mask).bit_length() - 1
+
+
 def count_empty(board: Board) -> int:
-    count = 0
-    b = board
-    for _ in range(16):
-        if (b & 0xF) == 0:
-            count += 1
-        b >>= 4
-    return count
+    return popcount(empty_mask(board))
 
 
 def get_empty_positions(board: Board) -> List[int]:
     positions: List[int] = []
-    for i in range(16):
-        shift = (15 - i) * 4
-        if ((board >> shift) & 0xF) == 0:
-            positions.append(i)
+    mask = empty_mask(board)
+    while mask:
+        low = mask & -mask
+        positions.append(15 - (low.bit_length() - 1) // 4)
+        mask ^= low
+    positions.reverse()
     return positions
 
 
@@ -213,7 +497,65 @@ def get_tile(board: Board, pos: int) -> int:
 
 
 def add_random_tile(board: Board) -> Board:
-    empty_positions = get_empty_positions(board)
+    mask = empty_mask(board)
+    if mask == 0:
+        return board
+
+    # 与 random.choice(get_empty_positions(board)) 消耗相同的随机数并选中同一格
+    n = random.randrange(popcount(mask))
+    shift = select_nth_set_bit(mask, n)
+    value = 1 if random.random() < 0.9 else 2
+
+    return board | (value << shift)
+
+
+def get_max_tile(board: Board) -> int:
+    if not tables_initialized:
+        init_tables()
+
+    max_exp = max(
+        ROW_MAX_TABLE[(board >> 48) & 0xFFFF],
+        ROW_MAX_TABLE[(board >> 32) & 0xFFFF],
+        ROW_MAX_TABLE[(board >> 16) & 0xFFFF],
+        ROW_MAX_TABLE[board & 0xFFFF],
+    )
+    return 0 if max_exp == 0 else 1 << max_exp
+
+
+def is_game_over(board: Board) -> bool:
+    if empty_mask(board):
+        return False
+
+    # 棋盘已满时，只要存在相邻相等的方块就还能移动：相邻 nibble 异或为 0 即相等
+    if zero_nibble_mask(board ^ (board >> 4)) & HORIZONTAL_PAIR_MASK:
+        return False
+    if zero_nibble_mask(board ^ (board >> 16)) & VERTICAL_PAIR_MASK:
+        return False
+
+    return True
+
+
+def count_empty_reference(board: Board) -> int:
+    count = 0
+    b = board
+    for _ in range(16):
+        if (b & 0xF) == 0:
+            count += 1
+        b >>= 4
+    return count
+
+
+def get_empty_positions_reference(board: Board) -> List[int]:
+    positions: List[int] = []
+    for i in range(16):
+        shift = (15 - i) * 4
+        if ((board >> shift) & 0xF) == 0:
+            positions.append(i)
+    return positions
+
+
+def add_random_tile_reference(board: Board) -> Board:
+    empty_positions = get_empty_positions_reference(board)
     if len(empty_positions) == 0:
         return board
 
@@ -223,7 +565,7 @@ def add_random_tile(board: Board) -> Board:
     return set_tile(board, pos, value)
 
 
-def get_max_tile(board: Board) -> int:
+def get_max_tile_reference(board: Board) -> int:
     max_exp = 0
     b = board
     for _ in range(16):
@@ -234,8 +576,8 @@ def get_max_tile(board: Board) -> int:
     return 0 if max_exp == 0 else 1 << max_exp
 
 
-def is_game_over(board: Board) -> bool:
-    if count_empty(board) > 0:
+def is_game_over_reference(board: Board) -> bool:
+    if count_empty_reference(board) > 0:
         return False
 
     for r in range(4):
@@ -311,6 +653,11 @@ class Game:
     def get_afterstate(self, dir: Direction) -> Optional[Tuple[Board, int]]:
         return move(self.board, dir)
 
+    def apply_afterstate(self, afterstate: Board, reward: int) -> None:
+        """直接采用已由 get_afterstate 算出的结果，避免重复执行移动。"""
+        self.board = afterstate
+        self.score += reward
+
     def add_random_tile(self) -> None:
         self.board = add_random_tile(self.board)
 
@@ -0,0 +1,224 @@
+"""
+2048 N-Tuple Network Training - Numba Backend
+
+可选的编译后端：整局 TD(0) 训练（选择最佳移动、评估后继状态、TD 更新、生成随机方块）
+全部在 Numba 编译的代码中完成，直接操作 uint64 位棋盘和扁平权重数组。
+
+权重仍然是 NTupleNetwork.flat_weights（float64 或 float32），因此与 Python 后端、
+检查点和导出的权重文件完全兼容。未安装 Numba 时 NUMBA_AVAILABLE 为 False，
+训练器会回退到 Python 后端。降基数查找表下方块指数同样先截断到 max_tile_exponent，
+分阶段网络的阶段同样用字节通道比较判定（见 features）。
+
+与 Python 后端的差异：随机方块使用 Numba 自己的随机数状态，
+评估值按顺序累加，与 NumPy 的成对求和可能有最低位的浮点差异。
+"""
+
+from typing import Tuple
+import numpy as np
+import game
+from network import NTupleNetwork, DIRTY_BLOCK_SHIFT
+from features import LANE_HIGH, LANE_MASK
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
+
+
+@njit(cache=True)
+def move(board, direction, left_rows, right_rows, up_columns, down_columns, left_scores, right_scores):
+    result = np.uint64(0)
+    reward = 0
+    if direction == 1 or direction == 3:
+        rows = left_rows if direction == 3 else right_rows
+        scores = left_scores if direction == 3 else right_scores
+        for r in range(4):
+            shift = np.uint64((3 - r) * 16)
+            row = (board >> shift) & np.uint64(0xFFFF)
+            result |= np.uint64(rows[row]) << shift
+            reward += scores[row]
+    else:
+        columns = up_columns if direction == 0 else down_columns
+        scores = left_scores if direction == 0 else right_scores
+        for c in range(4):
+            shift = np.uint64((3 - c) * 4)
+            x = (board >> shift) & np.uint64(0x000F000F000F000F)
+            key = (x | (x >> np.uint64(12)) | (x >> np.uint64(24)) | (x >> np.uint64(36))) & np.uint64(0xFFFF)
+            result |= columns[key] << shift
+            reward += scores[key]
+    return result, reward
+
+
+@njit(cache=True)
+def add_random_tile(board):
+    empty = 0
+    for pos in range(16):
+        if (board >> np.uint64((15 - pos) * 4)) & np.uint64(0xF) == 0:
+            empty += 1
+    if empty == 0:
+        return board
+
+    pick = np.random.randint(0, empty)
+    value = np.uint64(1) if np.random.random() < 0.9 else np.uint64(2)
+    for pos in range(16):
+        shift = np.uint64((15 - pos) * 4)
+        if (board >> shift) & np.uint64(0xF) == 0:
+            if pick == 0:
+                return board | (value << shift)
+            pick -= 1
+    return board
+
+
+@njit(cache=True)
+def seed(value):
+    """设置编译代码使用的随机数状态（与 NumPy 全局状态相互独立）。"""
+    np.random.seed(value)
+
+
+@njit(cache=True)
+def max_tile(board):
+    max_exp = 0
+    for pos in range(16):
+        exp = np.int64((board >> np.uint64(pos * 4)) & np.uint64(0xF))
+        if exp > max_exp:
+            max_exp = exp
+    return 0 if max_exp == 0 else 1 << max_exp
+
+
+@njit(cache=True)
+def stage_offset(board, stage_subtrahends, stage_size):
+    even = (board & np.uint64(LANE_MASK)) | np.uint64(LANE_HIGH)
+    odd = ((board >> np.uint64(4)) & np.uint64(LANE_MASK)) | np.uint64(LANE_HIGH)
+    stage = 0
+    for subtrahend in stage_subtrahends:
+        if ((even - subtrahend) | (odd - subtrahend)) & np.uint64(LANE_HIGH):
+            stage += 1
+    return stage * stage_size
+
+
+@njit(cache=True)
+def evaluate(flat_weights, board, gather, radix, base, max_exp, stage_subtrahends, stage_size, indices):
+    tiles = np.empty(16, dtype=np.int64)
+    for pos in range(16):
+        tiles[pos] = min(np.int64((board >> np.uint64((15 - pos) * 4)) & np.uint64(0xF)), max_exp)
+
+    offset = stage_offset(board, stage_subtrahends, stage_size)
+    total = 0.0
+    for m in range(len(base)):
+        index = base[m] + offset
+        for j in range(gather.shape[1]):
+            index += tiles[gather[m, j]] * radix[m, j]
+        indices[m] = index
+        total += flat_weights[index]
+    return total
+
+
+@njit(cache=True)
+def apply_update(flat_weights, touched, dirty_blocks, track_dirty, indices, scale, delta):
+    for m in range(len(indices)):
+        flat_weights[indices[m]] += delta * scale[m]
+        touched[indices[m]] = True
+        if track_dirty:
+            dirty_blocks[indices[m] >> DIRTY_BLOCK_SHIFT] = True
+
+
+@njit(cache=True)
+def train_episode(
+    flat_weights, touched, dirty_blocks, track_dirty,
+    gather, radix, base, scale, max_exp, stage_subtrahends, stage_size,
+    left_rows, right_rows, up_columns, down_columns, left_scores, right_scores,
+    learning_rate,
+):
+    board = add_random_tile(add_random_tile(np.uint64(0)))
+    score = 0
+    moves = 0
+
+    count = len(base)
+    candidate = np.empty(count, dtype=np.int64)
+    current = np.empty(count, dtype=np.int64)
+    previous = np.empty(count, dtype=np.int64)
+    has_previous = False
+    previous_value = 0.0
+
+    while True:
+        best_dir = -1
+        best_total = -np.inf
+        best_afterstate = np.uint64(0)
+        best_reward = 0
+        best_value = 0.0
+
+        for direction in range(4):
+            afterstate, reward = move(
+                board, direction, left_rows, right_rows, up_columns, down_columns, left_scores, right_scores
+            )
+            if afterstate == board:
+                continue
+            value = evaluate(
+                flat_weights, afterstate, gather, radix, base, max_exp, stage_subtrahends, stage_size, candidate
+            )
+            if reward + value > best_total:
+                best_total = reward + value
+                best_dir = direction
+                best_afterstate = afterstate
+                best_reward = reward
+                best_value = value
+                current[:] = candidate
+
+        if best_dir == -1:
+            break
+
+        if has_previous:
+            td_error = best_reward + best_value - previous_value
+            apply_update(flat_weights, touched, dirty_blocks, track_dirty, previous, scale, learning_rate * td_error)
+
+        board = add_random_tile(best_afterstate)
+        score += best_reward
+        moves += 1
+
+        previous, current = current, previous
+        previous_value = best_value
+        has_previous = True
+
+    if has_previous:
+        apply_update(
+            flat_weights, touched, dirty_blocks, track_dirty, previous, scale, learning_rate * (0 - previous_value)
+        )
+
+    return score, max_tile(board), moves
+
+
+class NumbaEpisodeRunner:
+    """把 NTupleNetwork 的权重与特征表交给编译后的 train_episode。"""
+
+    def __init__(self, network: NTupleNetwork):
+        game.init_tables()
+        self.network = network
+        self.gather, self.radix, self.base = network.features.padded_tables()
+        # 合并对称查找表后每个特征的增量倍数（见 NTupleNetwork.update_scale），顺序与 base 相同
+        self.scale = np.ascontiguousarray(
+            np.broadcast_to(network.update_scale, self.base.shape), dtype=np.float64
+        )
+        self.no_dirty = np.zeros(1, dtype=np.bool_)
+
+    def train_episode(self, learning_rate: float) -> Tuple[int, int, int]:
+        dirty_blocks = self.network.dirty_blocks
+        track_dirty = dirty_blocks is not None
+        score, tile, moves = train_episode(
+            self.network.flat_weights,
+            self.network.touched_mask(),
+            dirty_blocks if track_dirty else self.no_dirty,
+            track_dirty,
+            self.gather, self.radix, self.base, self.scale, self.network.max_tile_exponent,
+            self.network.features.stage_subtrahends_u64, self.network.stage_size,
+            game.LEFT_ROW_TABLE, game.RIGHT_ROW_TABLE,
+            game.UP_COLUMN_TABLE, game.DOWN_COLUMN_TABLE,
+            game.LEFT_SCORE_TABLE, game.RIGHT_SCORE_TABLE,
+            learning_rate,
+        )
+        return int(score), int(tile), int(moves)
@@ -0,0 +1,159 @@
+"""
+2048 N-Tuple Network Training - TD Learning Algorithms
+
+训练循环与更新规则解耦：train_episode 每走一步把所选后继状态的 (索引向量, 估值, 奖励)
+交给学习器，由学习器决定更新哪些历史后继状态。
+
+- td0：V(s_{t-1}) += α (r_t + V(s_t) - V(s_{t-1}))，与原训练器完全相同
+- tdlambda：截断的资格迹。只保留最近 trace_length 个后继状态的索引向量，
+  每个 TD 误差 δ 按 λ^k 分配给倒数第 k 个后继状态，所有行合并为一次散射更新
+- nstep：n 步回报。s_{t-n} 的目标为其后 n 步奖励之和加 V(s_t)，
+  对局结束时剩余后继状态用剩余奖励之和（终局价值为 0）更新
+
+历史后继状态保存在预分配的环形数组中，每步的代价只与迹长度或 n 有关，不会回扫整局。
+tdlambda 与 nstep 在更新时用当前权重重新求 V(s)（只查表，不提取特征），
+因为同一局中较早的更新可能已经改变了这些后继状态的估值。
+"""
+
+from abc import ABC, abstractmethod
+from typing import Optional
+import numpy as np
+from network import NTupleNetwork
+
+ALGORITHMS = ['td0', 'tdlambda', 'nstep']
+
+
+class TDLearner(ABC):
+    def __init__(self, network: NTupleNetwork):
+        self.network = network
+
+    @abstractmethod
+    def start_episode(self) -> None:
+        ...
+
+    @abstractmethod
+    def step(self, indices: np.ndarray, value: float, reward: float, learning_rate: float) -> None:
+        """
+        Args:
+            indices: 本步所选后继状态的索引向量
+            value: 该后继状态的估值 V(s_t)
+            reward: 到达该后继状态获得的奖励 r_t
+        """
+
+    @abstractmethod
+    def finish_episode(self, learning_rate: float) -> None:
+        ...
+
+
+class TD0Learner(TDLearner):
+    def __init__(self, network: NTupleNetwork):
+        super().__init__(network)
+        self.prev_indices: Optional[np.ndarray] = None
+        self.prev_value = 0.0
+
+    def start_episode(self) -> None:
+        self.prev_indices = None
+        self.prev_value = 0.0
+
+    def step(self, indices: np.ndarray, value: float, reward: float, learning_rate: float) -> None:
+        if self.prev_indices is not None:
+            td_error = reward + value - self.prev_value
+            self.network.update_weights_by_indices(self.prev_indices, learning_rate * td_error)
+
+        self.prev_indices = indices
+        self.prev_value = value
+
+    def finish_episode(self, learning_rate: float) -> None:
+        if self.prev_indices is not None:
+            self.network.update_weights_by_indices(self.prev_indices, learning_rate * (0 - self.prev_value))
+        self.prev_indices = None
+
+
+class TDLambdaLearner(TDLearner):
+    def __init__(self, network: NTupleNetwork, lam: float, trace_length: int):
+        super().__init__(network)
+        self.trace_length = trace_length
+        self.decay = lam ** np.arange(trace_length, dtype=np.float64)
+        self.trace = np.zeros((trace_length, network.features.num_features), dtype=np.int64)
+        self.head = 0
+        self.size = 0
+
+    def start_episode(self) -> None:
+        self.head = 0
+        self.size = 0
+
+    def propagate(self, td_error: float, learning_rate: float) -> None:
+        # 第 k 新的后继状态（k = 0 为最新）位于 head - 1 - k
+        rows = (self.head - 1 - np.arange(self.size)) % self.trace_length
+        deltas = learning_rate * td_error * self.decay[:self.size]
+        self.network.update_weights_batch_by_indices(self.trace[rows], deltas)
+
+    def step(self, indices: np.ndarray, value: float, reward: float, learning_rate: float) -> None:
+        if self.size > 0:
+            latest = self.trace[(self.head - 1) % self.trace_length]
+            td_error = reward + value - self.network.evaluate_indices(latest)
+            self.propagate(td_error, learning_rate)
+
+        self.trace[self.head] = indices
+        self.head = (self.head + 1) % self.trace_length
+        self.size = min(self.size + 1, self.trace_length)
+
+    def finish_episode(self, learning_rate: float) -> None:
+        if self.size > 0:
+            latest = self.trace[(self.head - 1) % self.trace_length]
+            self.propagate(0 - self.network.evaluate_indices(latest), learning_rate)
+        self.size = 0
+
+
+class NStepLearner(TDLearner):
+    def __init__(self, network: NTupleNetwork, n: int):
+        super().__init__(network)
+        self.n = n
+        self.pending = np.zeros((n, network.features.num_features), dtype=np.int64)
+        self.returns = np.zeros(n, dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def start_episode(self) -> None:
+        self.head = 0
+        self.size = 0
+
+    def update_oldest(self, bootstrap: float, learning_rate: float) -> None:
+        """用 回报 + bootstrap 作为目标更新最早的待更新后继状态，并将其移出。"""
+        oldest = (self.head - self.size) % self.n
+        indices = self.pending[oldest]
+        td_error = self.returns[oldest] + bootstrap - self.network.evaluate_indices(indices)
+        self.network.update_weights_by_indices(indices, learning_rate * td_error)
+        self.size -= 1
+
+    def step(self, indices: np.ndarray, value: float, reward: float, learning_rate: float) -> None:
+        # 本步奖励计入所有尚未更新的后继状态的回报（环形数组中未占用的位置不影响结果）
+        self.returns += reward
+
+        if self.size == self.n:
+            self.update_oldest(value, learning_rate)
+
+        self.pending[self.head] = indices
+        self.returns[self.head] = 0.0
+        self.head = (self.head + 1) % self.n
+        self.size += 1
+
+    def finish_episode(self, learning_rate: float) -> None:
+        while self.size > 0:
+            self.update_oldest(0.0, learning_rate)
+
+
+def create_learner(
+    network: NTupleNetwork,
+    algorithm: str = 'td0',
+    lam: float = 0.5,
+    trace_length: int = 5,
+    n: int = 3,
+) -> TDLearner:
+    if algorithm == 'td0':
+        return TD0Learner(network)
+    if algorithm == 'tdlambda':
+        return TDLambdaLearner(network, lam, trace_length)
+    if algorithm == 'nstep':
+        return NStepLearner(network, n)
+    raise ValueError(f'Unknown learning algorithm: {algorithm}')
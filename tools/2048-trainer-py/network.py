@@ -1,19 +1,31 @@
 """
 2048 N-Tuple Network Training - Network Implementation
 
-训练专用的N-Tuple Network实现，使用numpy数组存储权重以提高精度。
+训练专用的N-Tuple Network实现，使用numpy数组存储权重（float64 或 float32）。
 支持从位棋盘直接提取特征，避免矩阵转换开销。
+所有查找表存放在一个扁平数组中，特征索引向量可在评估与更新之间复用。
+互为对称像的模式（如四行四列）在构造时合并为共享查找表，减少每次评估的查表次数。
+可选的 Temporal Coherence 自适应学习率为每个权重维护两个 float32 累加器，布局与扁平权重数组相同。
+分阶段网络按棋盘上已出现的大方块（如 8192、16384）为每个阶段保存一整套查找表，
+每次评估只查所在阶段的表，查表次数与单阶段网络相同。
 
 与Web应用的NTupleNetwork兼容，可以导出/导入相同格式的权重文件。
 """
 
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Tuple, Union
+from multiprocessing import shared_memory
 import numpy as np
 from game import Board, get_tile
-from patterns import Pattern, calculate_lut_size
+from patterns import MAX_TILE_EXPONENT, Pattern, calculate_lut_size, convert_lut, expand_lut_index
+from features import FeatureExtractor
+from weights_io import FLOAT_DTYPES, is_binary_weights, load_binary_weights, load_weights_config, save_binary_weights
 
 BOARD_SIZE = 4
 
+# 脏块跟踪粒度：每 2^12 个权重为一块，检查点只复制上次快照后被修改过的块
+DIRTY_BLOCK_SHIFT = 12
+DIRTY_BLOCK_SIZE = 1 << DIRTY_BLOCK_SHIFT
+
 
 PositionTransform = Callable[[int], int]
 
@@ -78,6 +90,51 @@ def precompute_symmetric_patterns(pattern: Pattern) -> List[Pattern]:
     return [list(map(transform, pattern)) for transform in SYMMETRY_TRANSFORMS]
 
 
+def find_pattern_orbits(patterns: List[Pattern]) -> Tuple[List[Pattern], List[Tuple[int, Tuple[int, ...]]]]:
+    """
+    把互为对称像的模式归并到同一个查找表。
+
+    模式 q 的位置集合等于某个已有代表模式 r 在某种对称变换 T 下的像时，q 的 8 个对称像
+    与 r 的 8 个对称像逐一对应（只是格子顺序不同），两者的查找表可以合并为一张：
+    合并表 = 各成员表按格子顺序转置后之和，评估结果不变，查表次数按成员数减少。
+
+    Returns:
+        (代表模式列表, 每个输入模式的 (所属代表下标, 格子排列 perm))，
+        perm[k] 为该模式第 k 格在 T(r) 中的位置；代表模式自身的 perm 为恒等排列
+    """
+    representatives: List[Pattern] = []
+    orbits: List[Tuple[int, Tuple[int, ...]]] = []
+    for pattern in patterns:
+        orbit = None
+        for table, representative in enumerate(representatives):
+            if len(representative) != len(pattern):
+                continue
+            for transform in SYMMETRY_TRANSFORMS:
+                image = [transform(pos) for pos in representative]
+                if sorted(image) == sorted(pattern):
+                    orbit = (table, tuple(image.index(pos) for pos in pattern))
+                    break
+            if orbit is not None:
+                break
+        if orbit is None:
+            orbit = (len(representatives), tuple(range(len(pattern))))
+            representatives.append(list(pattern))
+        orbits.append(orbit)
+    return representatives, orbits
+
+
+def permute_lut(table: np.ndarray, axes: Tuple[int, ...], radix: int) -> np.ndarray:
+    """按格子排列转置查找表：结果的第 k 个数字取自原表的第 axes[k] 个数字。"""
+    if axes == tuple(range(len(axes))):
+        return table
+    return np.ascontiguousarray(np.reshape(table, (radix,) * len(axes)).transpose(axes)).ravel()
+
+
+def stage_exponents_from_tiles(stage_tiles: List[int]) -> List[int]:
+    """权重文件头部的 stageTiles（方块值）转换为方块指数。"""
+    return [int(tile).bit_length() - 1 for tile in stage_tiles]
+
+
 def extract_tuple_index(board: Board, pattern: Pattern) -> int:
     index = 0
     for pos in pattern:
@@ -87,77 +144,531 @@ def extract_tuple_index(board: Board, pattern: Pattern) -> int:
 
 
 class NTupleNetwork:
-    def __init__(self, patterns: List[Pattern]):
-        self.patterns: List[Pattern] = patterns
-        self.lut_sizes: List[int] = [calculate_lut_size(len(p)) for p in patterns]
-
-        self.weights: List[np.ndarray] = [np.zeros(size, dtype=np.float64) for size in self.lut_sizes]
+    def __init__(
+        self,
+        patterns: List[Pattern],
+        flat_weights: Optional[np.ndarray] = None,
+        dtype: str = 'float64',
+        max_tile_exponent: int = MAX_TILE_EXPONENT,
+        merge_symmetric: bool = True,
+        stage_exponents: Optional[List[int]] = None,
+    ):
+        """
+        Args:
+            patterns: N-Tuple 模式列表
+            flat_weights: 已有的扁平权重数组（如内存映射或共享内存），其类型决定网络精度
+            dtype: 新建权重数组的类型（'float64' 或 'float32'）
+            max_tile_exponent: 查找表可区分的最大方块指数，更大的方块按上限计；
+                               小于 15 时使用降基数编码，每个表 (max_tile_exponent + 1) ** n 项
+            merge_symmetric: 把互为对称像的模式合并为共享查找表（见 find_pattern_orbits）
+            stage_exponents: 划分阶段的方块指数（升序），例如 [13, 14] 表示 8192 与 16384 出现前后
+                             共 3 个阶段；为 None 时只有一个阶段
+        """
+        # source_patterns 是导出格式中的模式；patterns 是实际存储的查找表（合并后的代表模式）
+        self.source_patterns: List[Pattern] = patterns
+        if merge_symmetric:
+            self.patterns, self.pattern_orbits = find_pattern_orbits(patterns)
+        else:
+            self.patterns = patterns
+            self.pattern_orbits = [(i, tuple(range(len(p)))) for i, p in enumerate(patterns)]
+        self.multiplicities: List[int] = [0] * len(self.patterns)
+        for table, _ in self.pattern_orbits:
+            self.multiplicities[table] += 1
+        self.max_tile_exponent = max_tile_exponent
+        self.lut_sizes: List[int] = [calculate_lut_size(len(p), max_tile_exponent) for p in self.patterns]
+        self.offsets: List[int] = [sum(self.lut_sizes[:i]) for i in range(len(self.lut_sizes))]
+
+        # lut_sizes 与 offsets 描述一个阶段内的布局，各阶段的整套查找表在扁平数组中依次排列
+        self.stage_exponents: List[int] = list(stage_exponents) if stage_exponents else []
+        self.num_stages = len(self.stage_exponents) + 1
+        self.stage_size = sum(self.lut_sizes)
+
+        # 所有查找表存放在同一个扁平数组中，weights 为各阶段各模式对应的视图（阶段优先）
+        if flat_weights is None:
+            flat_weights = np.zeros(self.stage_size * self.num_stages, dtype=FLOAT_DTYPES[dtype])
+        self.flat_weights: np.ndarray = flat_weights
+        self.weights: List[np.ndarray] = self.split_weights(flat_weights)
+
+        # 共享内存模式下由其他进程更新权重，此时为 None 表示不跟踪
+        self.dirty_blocks: Optional[np.ndarray] = np.ones(
+            -(-len(flat_weights) // DIRTY_BLOCK_SIZE), dtype=bool
+        )
+
+        # 每个权重是否被 TD 更新过（每个权重 1 字节），第一次更新时才分配（见 touched_mask）
+        self.touched: Optional[np.ndarray] = None
+
+        # Temporal Coherence 累加器（见 enable_temporal_coherence），None 表示使用固定学习率
+        self.tc_errors: Optional[np.ndarray] = None
+        self.tc_abs_errors: Optional[np.ndarray] = None
 
         self.symmetric_patterns: List[List[Pattern]] = [
             precompute_symmetric_patterns(pattern) for pattern in self.patterns
         ]
+        self.features = FeatureExtractor(
+            self.symmetric_patterns, self.offsets, max_tile_exponent, self.stage_exponents, self.stage_size
+        )
+
+        # 合并表的每次查找代替了 multiplicity 次原始查找，更新增量相应放大，训练过程与不合并时一致；
+        # 各表倍数相同时为标量，否则为与特征索引向量对齐的数组
+        scale_by_offset = dict(zip(self.offsets, self.multiplicities))
+        scales = np.array([scale_by_offset[b] for b in np.concatenate(self.features.bases)], dtype=np.float64)
+        self.update_scale: Union[float, np.ndarray] = float(scales[0]) if np.all(scales == scales[0]) else scales
+
+    def lookups_per_evaluation(self) -> Tuple[int, int]:
+        """(不合并时的查表次数, 实际查表次数)，每个模式 8 个对称像各查一次。"""
+        return len(SYMMETRY_TRANSFORMS) * len(self.source_patterns), self.features.num_features
+
+    def stage_tiles(self) -> List[int]:
+        """划分阶段的方块值（权重文件头部的 stageTiles）。"""
+        return [1 << exponent for exponent in self.stage_exponents]
+
+    def stored_lut_sizes(self) -> List[int]:
+        """扁平数组中全部查找表的大小，各阶段依次排列。"""
+        return self.lut_sizes * self.num_stages
+
+    def split_weights(self, flat_weights: np.ndarray) -> List[np.ndarray]:
+        return [
+            flat_weights[start + offset:start + offset + size]
+            for start in range(0, self.stage_size * self.num_stages, self.stage_size)
+            for offset, size in zip(self.offsets, self.lut_sizes)
+        ]
 
-    def evaluate(self, board: Board) -> float:
-        total_score = 0.0
-
-        for pattern_idx in range(len(self.patterns)):
-            symmetric_patterns_for_tuple = self.symmetric_patterns[pattern_idx]
-            weights_for_tuple = self.weights[pattern_idx]
+    def extract_indices(self, board: Board) -> np.ndarray:
+        return self.features.extract(board)
+
+    def evaluate_indices(self, indices: np.ndarray) -> float:
+        return float(self.flat_weights[indices].sum())
+
+    def update_weights_by_indices(self, indices: np.ndarray, delta: float) -> None:
+        if self.tc_errors is not None:
+            deltas = np.asarray(delta * self.update_scale, dtype=np.float32)
+            self.apply_coherent_update(indices, np.broadcast_to(deltas, indices.shape))
+        else:
+            # 增量先转换为权重类型：类型不一致时 np.add.at 会走逐元素转换的慢路径
+            np.add.at(self.flat_weights, indices, np.asarray(delta * self.update_scale, dtype=self.flat_weights.dtype))
+        self.mark_updated(indices)
+
+    def enable_temporal_coherence(self) -> None:
+        """
+        启用 Temporal Coherence 自适应学习率：每个权重的实际增量为 delta × |E| / A，
+        E 为该权重历次增量之和，A 为历次增量绝对值之和（从未更新过时系数为 1）。
+        更新方向一致的权重保持原步长，正负来回抵消的权重步长逐渐趋近于 0。
+        两个累加器均为 float32，每个权重额外占用 8 字节。
+        """
+        self.tc_errors = np.zeros(len(self.flat_weights), dtype=np.float32)
+        self.tc_abs_errors = np.zeros(len(self.flat_weights), dtype=np.float32)
+        self.mark_dirty()
+
+    def apply_coherent_update(self, indices: np.ndarray, deltas: np.ndarray) -> None:
+        """按 Temporal Coherence 系数缩放逐项增量后写入权重，并累加 E 与 A。"""
+        errors = self.tc_errors[indices]
+        abs_errors = self.tc_abs_errors[indices]
+        rates = np.divide(np.abs(errors), abs_errors, out=np.ones_like(errors), where=abs_errors > 0)
+        np.add.at(self.flat_weights, indices, (rates * deltas).astype(self.flat_weights.dtype))
+        np.add.at(self.tc_errors, indices, deltas)
+        np.add.at(self.tc_abs_errors, indices, np.abs(deltas))
+
+    def tracked_arrays(self) -> List[np.ndarray]:
+        """检查点需要保存的、按脏块跟踪的数组：扁平权重，以及启用时的 TC 累加器 E、A。"""
+        if self.tc_errors is None:
+            return [self.flat_weights]
+        return [self.flat_weights, self.tc_errors, self.tc_abs_errors]
+
+    def touched_mask(self) -> np.ndarray:
+        """与扁平权重等长的布尔数组，记录被 TD 更新过的权重；载入与乐观初始化不算更新。"""
+        if self.touched is None:
+            self.touched = np.zeros(len(self.flat_weights), dtype=bool)
+        return self.touched
+
+    def mark_updated(self, indices: np.ndarray) -> None:
+        """TD 更新路径在写入增量后调用：记录被更新的权重，并把所在块标记为脏。"""
+        self.touched_mask()[indices] = True
+        self.mark_dirty(indices)
+
+    def mark_dirty(self, indices: Optional[np.ndarray] = None) -> None:
+        if self.dirty_blocks is None:
+            return
+        if indices is None:
+            self.dirty_blocks.fill(True)
+        else:
+            self.dirty_blocks[indices >> DIRTY_BLOCK_SHIFT] = True
 
-            for transformed_pattern in symmetric_patterns_for_tuple:
-                index = extract_tuple_index(board, transformed_pattern)
-                total_score += weights_for_tuple[index]
+    def evaluate(self, board: Board) -> float:
+        return self.evaluate_indices(self.features.extract(board))
 
-        return total_score
+    def evaluate_with_indices(self, board: Board) -> Tuple[float, np.ndarray]:
+        """
+        评估棋盘，同时返回其索引向量。TD 学习中该棋盘下一步才会被更新，
+        把索引向量交给 update_weights_by_indices 即可，无需再次提取特征。
+        """
+        indices = self.features.extract(board)
+        return self.evaluate_indices(indices), indices
 
     def update_weights(self, board: Board, delta: float) -> None:
-        for pattern_idx in range(len(self.patterns)):
-            symmetric_patterns_for_tuple = self.symmetric_patterns[pattern_idx]
-            weights_for_tuple = self.weights[pattern_idx]
-
-            for transformed_pattern in symmetric_patterns_for_tuple:
-                index = extract_tuple_index(board, transformed_pattern)
-                weights_for_tuple[index] += delta
+        self.update_weights_by_indices(self.features.extract(board), delta)
+
+    def evaluate_batch(self, boards: np.ndarray) -> np.ndarray:
+        return self.evaluate_batch_with_indices(boards)[0]
+
+    def evaluate_batch_with_indices(self, boards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """批量版本的 evaluate_with_indices，索引矩阵形状为 (棋盘数, 特征数)。"""
+        indices = self.features.extract_batch(boards)
+        return self.flat_weights[indices].sum(axis=1), indices
+
+    def update_weights_batch(self, boards: np.ndarray, deltas: np.ndarray) -> None:
+        if len(boards) == 0:
+            return
+        self.update_weights_batch_by_indices(self.features.extract_batch(boards), deltas)
+
+    def update_weights_batch_by_indices(
+        self, indices: np.ndarray, deltas: np.ndarray, average_overlaps: bool = False
+    ) -> None:
+        """
+        对每行索引应用各自的增量，所有行合并为一次 np.add.at 散射；
+        同一权重在多行中出现时增量累加。
+
+        average_overlaps 为 True 时，每个权重的增量除以命中它的行数（同一行内的重复命中仍累加），
+        即多行共享的权重取各行增量的平均。各行来自不同对局时用它代替累加，
+        否则开局等常见局面的共享权重在一批内被推动 N 次，批越大越容易发散。
+        """
+        if len(indices) == 0:
+            return
+
+        flat_indices = indices.ravel()
+        dtype = np.float32 if self.tc_errors is not None else self.flat_weights.dtype
+        row_deltas = np.asarray(deltas, dtype=dtype)[:, None] * np.asarray(self.update_scale, dtype=dtype)
+        row_deltas = np.broadcast_to(row_deltas, indices.shape).ravel()
+        if average_overlaps and len(indices) > 1:
+            row_deltas = row_deltas / self.overlap_row_counts(indices).astype(dtype)
+        if self.tc_errors is not None:
+            self.apply_coherent_update(flat_indices, row_deltas)
+        else:
+            np.add.at(self.flat_weights, flat_indices, row_deltas)
+        self.mark_updated(flat_indices)
+
+    @staticmethod
+    def overlap_row_counts(indices: np.ndarray) -> np.ndarray:
+        """
+        与 indices.ravel() 一一对应：该位置的权重出现在多少行中（同一行内的重复只计一次）。
+        按 (权重, 行) 排序一次，相邻比较得出分组，避免两次 np.unique。
+        """
+        rows, width = indices.shape
+        keys = indices.ravel().astype(np.int64) * rows + np.repeat(np.arange(rows, dtype=np.int64), width)
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        sorted_weights = sorted_keys // rows
+
+        new_pair = np.empty(len(keys), dtype=bool)
+        new_pair[0] = True
+        np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=new_pair[1:])
+        new_weight = np.empty(len(keys), dtype=bool)
+        new_weight[0] = True
+        np.not_equal(sorted_weights[1:], sorted_weights[:-1], out=new_weight[1:])
+
+        group = np.cumsum(new_weight) - 1
+        counts = np.bincount(group, weights=new_pair)
+        result = np.empty(len(keys), dtype=np.float64)
+        result[order] = counts[group]
+        return result
 
     def init_optimistic(self, value: float) -> None:
-        for weights in self.weights:
-            weights.fill(value)
+        """每个原始查找表的条目初始化为 value；合并表为其成员之和。"""
+        for table, multiplicity in zip(self.weights, self.multiplicities * self.num_stages):
+            table.fill(value * multiplicity)
+        self.mark_dirty()
+
+    def touched_fractions(self) -> List[float]:
+        """每个查找表中被本网络的 TD 更新触及过的条目比例（见 touched_mask），各阶段依次排列。"""
+        return [float(np.count_nonzero(t)) / len(t) for t in self.split_weights(self.touched_mask())]
+
+    def expand_tables(self, weights: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        把（合并后的）查找表展开为 source_patterns 的布局：每个成员取合并表的 1/multiplicity
+        并转置回自己的格子顺序，成员求和后与合并表给出相同的评估结果。分阶段时逐阶段展开。
+        """
+        radix = self.max_tile_exponent + 1
+        tables = []
+        for start in range(0, len(weights), len(self.patterns)):
+            for table, perm in self.pattern_orbits:
+                weight = weights[start + table]
+                if self.multiplicities[table] > 1:
+                    weight = weight / self.multiplicities[table]
+                tables.append(permute_lut(weight, perm, radix))
+        return tables
+
+    def fold_tables(self, tables: List[np.ndarray], target: np.ndarray) -> None:
+        """expand_tables 的逆操作：把 source_patterns 布局的查找表按格子顺序转置后累加进 target。"""
+        radix = self.max_tile_exponent + 1
+        target[:] = 0
+        orbits = self.pattern_orbits * self.num_stages
+        for i, ((table, perm), weight) in enumerate(zip(orbits, tables)):
+            start = i // len(self.pattern_orbits) * self.stage_size + self.offsets[table]
+            target[start:start + self.lut_sizes[table]] += permute_lut(
+                np.asarray(weight, dtype=target.dtype), tuple(np.argsort(perm)), radix
+            )
 
-    def export_weights(self, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        return {
+    def export_weights(
+        self,
+        metadata: Optional[Dict[str, Any]] = None,
+        flat_weights: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
+        """
+        导出为 Web 应用的 JSON 格式：合并表展开为 source_patterns 的布局，
+        降基数查找表会展开成标准的 16 ** n 布局。分阶段网络只能导出为二进制格式（见 weights_io）。
+        """
+        if self.num_stages > 1:
+            raise ValueError('Staged networks can only be exported as .bin; the web app JSON format has no stages')
+        weights = self.expand_tables(self.weights if flat_weights is None else self.split_weights(flat_weights))
+        if self.max_tile_exponent != MAX_TILE_EXPONENT:
+            weights = [
+                w[expand_lut_index(len(p), self.max_tile_exponent)]
+                for w, p in zip(weights, self.source_patterns * self.num_stages)
+            ]
+        config: Dict[str, Any] = {
             'version': 1,
-            'patterns': self.patterns,
-            'weights': [w.tolist() for w in self.weights],
+            'patterns': self.source_patterns,
+            'weights': [w.tolist() for w in weights],
             'metadata': metadata,
         }
-
-    def load_weights(self, config: Dict[str, Any]) -> None:
-        if len(config['patterns']) != len(self.patterns):
+        return config
+
+    def merged_source_patterns(self) -> Optional[List[Pattern]]:
+        """合并了对称模式时为原始模式列表（二进制头部的 sourcePatterns），否则为 None。"""
+        if len(self.patterns) == len(self.source_patterns):
+            return None
+        return self.source_patterns
+
+    def save_binary(
+        self,
+        path: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        dtype: Optional[str] = None,
+        flat_weights: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        按实际存储的布局写出二进制权重文件（flat_weights 为 None 时为当前权重），不展开合并表，
+        from_binary 可直接内存映射；dtype 见 weights_io.save_binary_weights。
+        """
+        save_binary_weights(
+            path,
+            self.patterns,
+            self.stored_lut_sizes(),
+            self.flat_weights if flat_weights is None else flat_weights,
+            metadata,
+            dtype,
+            self.max_tile_exponent,
+            self.stage_tiles(),
+            self.merged_source_patterns(),
+        )
+
+    def check_layout(
+        self,
+        patterns: List[Pattern],
+        lut_sizes: List[int],
+        max_tile_exponent: Optional[int] = None,
+        expected: Optional[List[Pattern]] = None,
+    ) -> None:
+        """
+        Args:
+            max_tile_exponent: lut_sizes 所用的指数上限，为 None 时与本网络相同
+            expected: 期望的模式布局，为 None 时为实际存储的查找表（self.patterns）；
+                      分阶段时 lut_sizes 依次为各阶段的整套查找表
+        """
+        if max_tile_exponent is None:
+            max_tile_exponent = self.max_tile_exponent
+        if expected is None:
+            expected = self.patterns
+
+        if len(patterns) != len(expected):
             raise ValueError(
-                f'Pattern count mismatch: expected {len(self.patterns)}, got {len(config["patterns"])}'
+                f'Pattern count mismatch: expected {len(expected)}, got {len(patterns)}'
             )
 
-        for i in range(len(self.patterns)):
-            if len(config['patterns'][i]) != len(self.patterns[i]):
+        for i in range(len(expected)):
+            if len(patterns[i]) != len(expected[i]):
                 raise ValueError(
-                    f'Pattern size mismatch at index {i}: expected {len(self.patterns[i])}, got {len(config["patterns"][i])}'
+                    f'Pattern size mismatch at index {i}: expected {len(expected[i])}, got {len(patterns[i])}'
                 )
 
-        if len(config['weights']) != len(self.patterns):
+        if len(lut_sizes) != len(expected) * self.num_stages:
             raise ValueError(
-                f'Weight array count mismatch: expected {len(self.patterns)}, got {len(config["weights"])}'
+                f'Weight array count mismatch: expected {len(expected) * self.num_stages}, got {len(lut_sizes)}'
             )
 
-        for i in range(len(config['weights'])):
-            expected_size = self.lut_sizes[i]
-            actual_size = len(config['weights'][i])
+        for i in range(len(lut_sizes)):
+            expected_size = calculate_lut_size(len(expected[i % len(expected)]), max_tile_exponent)
+            actual_size = lut_sizes[i]
 
             if actual_size != expected_size:
                 raise ValueError(
                     f'Weight dimension mismatch for tuple {i}: expected {expected_size}, got {actual_size}'
                 )
 
-            self.weights[i] = np.array(config['weights'][i], dtype=np.float64)
+    def load_tables(
+        self,
+        patterns: List[Pattern],
+        tables: List[np.ndarray],
+        max_tile_exponent: int,
+        target: np.ndarray,
+    ) -> None:
+        """
+        把逐表给出的数据写入与扁平权重同布局的 target。表的数量与实际存储的查找表相同时
+        逐表复制，否则按 source_patterns 布局校验后合并（见 fold_tables）；指数上限不同时转换布局。
+        只有一个阶段的数据载入分阶段网络时复制到每个阶段，作为各阶段的共同起点。
+        """
+        folded = len(patterns) != len(self.patterns)
+        expected = self.source_patterns if folded else self.patterns
+        if len(tables) == len(expected):
+            tables = list(tables) * self.num_stages
+        self.check_layout(patterns, [len(t) for t in tables], max_tile_exponent, expected)
+
+        tables = [
+            convert_lut(np.asarray(table, dtype=target.dtype), len(p), max_tile_exponent, self.max_tile_exponent)
+            for table, p in zip(tables, expected * self.num_stages)
+        ]
+        if folded:
+            self.fold_tables(tables, target)
+        else:
+            for view, table in zip(self.split_weights(target), tables):
+                view[:] = table
+        self.mark_dirty()
+
+    def check_stages(self, stage_tiles: List[int]) -> None:
+        """权重文件的阶段划分须与本网络相同；不分阶段的文件可以载入任意阶段数的网络（见 load_tables）。"""
+        if stage_tiles and stage_tiles != self.stage_tiles():
+            raise ValueError(f'Stage mismatch: expected {self.stage_tiles()}, got {stage_tiles}')
+
+    def load_weights(self, config: Dict[str, Any]) -> None:
+        """载入 JSON 格式（标准 16 ** n 布局）的权重，必要时压缩为降基数布局、合并对称的查找表。"""
+        self.check_stages(config.get('stageTiles', []))
+        self.load_tables(config['patterns'], config['weights'], MAX_TILE_EXPONENT, self.flat_weights)
+
+    def load_flat_weights(self, header: Dict[str, Any], flat_weights: np.ndarray) -> None:
+        """从二进制权重文件（见 weights_io）的头部和数据载入权重，布局不同时转换。"""
+        self.load_flat_array(header, flat_weights, self.flat_weights)
+
+    def load_temporal_coherence(
+        self,
+        errors: Tuple[Dict[str, Any], np.ndarray],
+        abs_errors: Tuple[Dict[str, Any], np.ndarray],
+    ) -> None:
+        """载入检查点中保存的 TC 累加器，参数为 load_binary_weights 返回的 (头部, 数据)。"""
+        if self.tc_errors is None:
+            self.enable_temporal_coherence()
+        self.load_flat_array(*errors, self.tc_errors)
+        self.load_flat_array(*abs_errors, self.tc_abs_errors)
+
+    def load_flat_array(self, header: Dict[str, Any], source: np.ndarray, target: np.ndarray) -> None:
+        exponent = header.get('maxTileExponent', MAX_TILE_EXPONENT)
+        stage_tiles = header.get('stageTiles', [])
+        self.check_stages(stage_tiles)
+        if (exponent == self.max_tile_exponent and len(header['patterns']) == len(self.patterns)
+                and stage_tiles == self.stage_tiles()):
+            self.check_layout(header['patterns'], header['lutSizes'], exponent)
+            target[:] = source
+            self.mark_dirty()
+            return
+
+        if 'sourcePatterns' in header:
+            # 合并布局的文件先按它自己的合并方式展开回原始模式布局，再按本网络的布局载入
+            stored = NTupleNetwork(
+                header['sourcePatterns'], source, max_tile_exponent=exponent,
+                stage_exponents=stage_exponents_from_tiles(stage_tiles),
+            )
+            stored.check_layout(header['patterns'], header['lutSizes'])
+            self.load_tables(header['sourcePatterns'], stored.expand_tables(stored.weights), exponent, target)
+            return
+
+        offsets = np.cumsum([0] + header['lutSizes'])
+        tables = [source[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        self.load_tables(header['patterns'], tables, exponent, target)
+
+    @classmethod
+    def from_binary(cls, path: str, mmap_mode: str = 'r') -> 'NTupleNetwork':
+        """
+        直接以内存映射方式打开二进制权重文件，不复制权重数据。
+        文件中有可合并的对称模式时（展开保存的旧文件）改为复制并合并。
+        """
+        return cls.from_binary_data(*load_binary_weights(path, mmap_mode))
+
+    @classmethod
+    def from_binary_data(cls, header: Dict[str, Any], flat_weights: np.ndarray) -> 'NTupleNetwork':
+        """由 load_binary_weights 返回的 (头部, 数据) 构造网络，合并布局时直接使用 flat_weights。"""
+        exponent = header.get('maxTileExponent', MAX_TILE_EXPONENT)
+        stages = stage_exponents_from_tiles(header.get('stageTiles', []))
+        if 'sourcePatterns' in header:
+            network = cls(header['sourcePatterns'], flat_weights, max_tile_exponent=exponent, stage_exponents=stages)
+            if network.patterns != header['patterns']:
+                raise ValueError('Merged patterns in the header do not match sourcePatterns')
+            network.check_layout(header['patterns'], header['lutSizes'])
+        elif len(find_pattern_orbits(header['patterns'])[0]) == len(header['patterns']):
+            network = cls(header['patterns'], flat_weights, max_tile_exponent=exponent, stage_exponents=stages)
+            network.check_layout(header['patterns'], header['lutSizes'])
+        else:
+            network = cls(
+                header['patterns'], dtype=flat_weights.dtype.name, max_tile_exponent=exponent, stage_exponents=stages
+            )
+            network.load_flat_weights(header, flat_weights)
+        return network
+
+    @classmethod
+    def from_file(cls, path: str) -> 'NTupleNetwork':
+        """按文件头自动识别 JSON 或二进制格式，返回载入权重后的网络。"""
+        if is_binary_weights(path):
+            return cls.from_binary(path)
+
+        config = load_weights_config(path)
+        network = cls(config['patterns'], stage_exponents=stage_exponents_from_tiles(config.get('stageTiles', [])))
+        network.load_weights(config)
+        return network
+
+    def share_memory(self) -> shared_memory.SharedMemory:
+        """
+        把权重表移入共享内存，供多个训练进程无锁（Hogwild）并发更新；
+        touched_mask 紧接在权重之后，各进程的更新记录汇总到同一个数组。
+        返回的共享内存块需在训练结束后交给 release_shared_memory 释放。
+        """
+        count = len(self.flat_weights)
+        block = shared_memory.SharedMemory(create=True, size=self.flat_weights.nbytes + count)
+        shared = np.ndarray(self.flat_weights.shape, dtype=self.flat_weights.dtype, buffer=block.buf)
+        shared[:] = self.flat_weights
+        touched = np.ndarray((count,), dtype=bool, buffer=block.buf, offset=self.flat_weights.nbytes)
+        touched[:] = self.touched_mask()
+        self.flat_weights = shared
+        self.weights = self.split_weights(shared)
+        self.touched = touched
+        self.dirty_blocks = None
+        return block
+
+    def release_shared_memory(self, block: shared_memory.SharedMemory) -> None:
+        self.flat_weights = np.array(self.flat_weights)
+        self.weights = self.split_weights(self.flat_weights)
+        self.touched = np.array(self.touched)
+        self.dirty_blocks = np.ones(-(-len(self.flat_weights) // DIRTY_BLOCK_SIZE), dtype=bool)
+        block.close()
+        block.unlink()
+
+    @classmethod
+    def from_shared_memory(
+        cls,
+        patterns: List[Pattern],
+        name: str,
+        dtype: str = 'float64',
+        max_tile_exponent: int = MAX_TILE_EXPONENT,
+        merge_symmetric: bool = True,
+        stage_exponents: Optional[List[int]] = None,
+    ) -> tuple['NTupleNetwork', shared_memory.SharedMemory]:
+        block = shared_memory.SharedMemory(name=name)
+        tables = find_pattern_orbits(patterns)[0] if merge_symmetric else patterns
+        total = sum(calculate_lut_size(len(p), max_tile_exponent) for p in tables)
+        total *= len(stage_exponents or []) + 1
+        flat_weights = np.ndarray((total,), dtype=FLOAT_DTYPES[dtype], buffer=block.buf)
+        network = cls(
+            patterns, flat_weights, max_tile_exponent=max_tile_exponent,
+            merge_symmetric=merge_symmetric, stage_exponents=stage_exponents,
+        )
+        network.touched = np.ndarray((total,), dtype=bool, buffer=block.buf, offset=flat_weights.nbytes)
+        return network, block
 
     def get_patterns(self) -> List[Pattern]:
         return self.patterns
@@ -167,3 +678,6 @@ class NTupleNetwork:
 
     def get_weights(self) -> List[np.ndarray]:
         return self.weights
+
+    def get_dtype(self) -> str:
+        return self.flat_weights.dtype.name
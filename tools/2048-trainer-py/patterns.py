@@ -3,6 +3,7 @@
 
 定义用于2048游戏AI训练的N-Tuple元组模式。
 这些模式与Web应用中的模式兼容，确保训练出的权重可以直接在Web应用中使用。
+PATTERN_SETS 为命名的模式集，train.py --patterns 与 sweep_patterns.py 按名称或 JSON 文件选择。
 
 2048棋盘位置索引布局（4x4）：
  0  1  2  3
@@ -11,10 +12,15 @@
 12 13 14 15
 """
 
-from typing import List
+from typing import Any, Dict, List
+import json
+import numpy as np
 
 Pattern = List[int]
 
+# 标准编码下每格 4 位，指数 0-15；降基数编码把大于上限的指数截断到上限
+MAX_TILE_EXPONENT = 15
+
 HORIZONTAL_4TUPLE: List[Pattern] = [
     [0, 1, 2, 3],
     [4, 5, 6, 7],
@@ -65,6 +71,86 @@ ROW_COL_4TUPLE_PATTERNS: List[Pattern] = [
 
 DEFAULT_TRAINING_PATTERNS: List[Pattern] = ROW_COL_4TUPLE_PATTERNS
 
+PATTERN_SETS: Dict[str, List[Pattern]] = {
+    '4tuple': ROW_COL_4TUPLE_PATTERNS,
+    'horizontal-4tuple': HORIZONTAL_4TUPLE,
+    'rectangle-6tuple': RECTANGLE_6TUPLE,
+    'corner-6tuple': CORNER_6TUPLE,
+    '6tuple': STANDARD_6TUPLE_PATTERNS,
+}
+
+DEFAULT_PATTERN_SET = '4tuple'
+
+
+def validate_patterns(patterns: Any) -> List[Pattern]:
+    """检查模式集：非空列表，每个模式为不重复的格子位置 0-15。"""
+    if not isinstance(patterns, list) or len(patterns) == 0:
+        raise ValueError('Pattern set must be a non-empty list of patterns')
+    for i, pattern in enumerate(patterns):
+        if not isinstance(pattern, list) or len(pattern) == 0:
+            raise ValueError(f'Pattern {i} must be a non-empty list of positions')
+        if any(not isinstance(pos, int) or pos < 0 or pos > 15 for pos in pattern):
+            raise ValueError(f'Pattern {i} has positions outside 0-15: {pattern}')
+        if len(set(pattern)) != len(pattern):
+            raise ValueError(f'Pattern {i} repeats a position: {pattern}')
+    return patterns
+
+
+def resolve_pattern_set(spec: str) -> List[Pattern]:
+    """
+    按名称（PATTERN_SETS 的键）或 JSON 文件路径取得模式集。
+    文件内容为模式列表，或带 patterns 字段的对象（例如 JSON 权重文件）。
+    """
+    if spec in PATTERN_SETS:
+        return PATTERN_SETS[spec]
+    try:
+        with open(spec, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f'Unknown pattern set: {spec} (expected one of {", ".join(PATTERN_SETS)} or a JSON file)')
+    if isinstance(data, dict):
+        data = data.get('patterns')
+    return validate_patterns(data)
+
+
+def calculate_lut_size(tuple_size: int, max_tile_exponent: int = MAX_TILE_EXPONENT) -> int:
+    """查找表大小：每格取值 0..max_tile_exponent，共 (max_tile_exponent + 1) ** tuple_size 项。"""
+    return (max_tile_exponent + 1) ** tuple_size
+
+
+def expand_lut_index(tuple_size: int, max_tile_exponent: int) -> np.ndarray:
+    """
+    标准（基数 16）索引 -> 降基数索引的映射，长度 16 ** tuple_size。
+    用于把降基数查找表展开成 Web 应用使用的标准布局：full = reduced[expand_lut_index(...)]。
+    """
+    radix = max_tile_exponent + 1
+    full = np.arange(16 ** tuple_size, dtype=np.int64)
+    reduced = np.zeros_like(full)
+    for j in range(tuple_size):
+        digit = (full >> (4 * (tuple_size - 1 - j))) & 0xF
+        reduced = reduced * radix + np.minimum(digit, max_tile_exponent)
+    return reduced
+
+
+def compress_lut_index(tuple_size: int, max_tile_exponent: int) -> np.ndarray:
+    """
+    降基数索引 -> 各格指数相同的标准索引的映射，长度 (max_tile_exponent + 1) ** tuple_size。
+    用于从标准布局载入降基数查找表：reduced = full[compress_lut_index(...)]。
+    """
+    radix = max_tile_exponent + 1
+    reduced = np.arange(radix ** tuple_size, dtype=np.int64)
+    full = np.zeros_like(reduced)
+    for j in range(tuple_size):
+        digit = (reduced // radix ** (tuple_size - 1 - j)) % radix
+        full = full * 16 + digit
+    return full
+
 
-def calculate_lut_size(tuple_size: int) -> int:
-    return 16 ** tuple_size
+def convert_lut(table: np.ndarray, tuple_size: int, from_exponent: int, to_exponent: int) -> np.ndarray:
+    """在两种指数上限的查找表布局之间转换（经由标准布局）。"""
+    if from_exponent == to_exponent:
+        return table
+    full = table if from_exponent == MAX_TILE_EXPONENT else table[expand_lut_index(tuple_size, from_exponent)]
+    if to_exponent == MAX_TILE_EXPONENT:
+        return full
+    return full[compress_lut_index(tuple_size, to_exponent)]
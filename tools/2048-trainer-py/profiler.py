@@ -0,0 +1,89 @@
+"""
+2048 N-Tuple Network Training - Phase Profiler
+
+训练热路径的分阶段计时器：每个阶段累计耗时与调用次数，用于定位轮/秒下降的原因。
+
+阶段名用点号表示嵌套（如 select_move.evaluate 是 select_move 的一部分），
+汇总时只有顶层阶段参与占比计算，嵌套阶段按其父阶段的占比展示。
+训练器在未启用 --profile 时不创建 PhaseProfiler，热路径上只剩一次 None 判断。
+"""
+
+from typing import Any, Dict, List
+import threading
+import time
+
+clock = time.perf_counter
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.samples: List[Dict[str, Any]] = []
+        self.start_time = clock()
+        # 后台写入线程也会记录阶段耗时
+        self.lock = threading.Lock()
+
+    def add(self, phase: str, elapsed: float, calls: int = 1) -> None:
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + elapsed
+        self.calls[phase] = self.calls.get(phase, 0) + calls
+
+    def lap(self, phase: str, start: float) -> float:
+        """记录从 start 到现在的耗时，返回当前时刻作为下一阶段的起点。"""
+        now = clock()
+        self.add(phase, now - start)
+        return now
+
+    def add_threadsafe(self, phase: str, elapsed: float, calls: int = 1) -> None:
+        with self.lock:
+            self.add(phase, elapsed, calls)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.seconds.clear()
+            self.calls.clear()
+        self.samples.clear()
+        self.start_time = clock()
+
+    def wall_time(self) -> float:
+        return clock() - self.start_time
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        wall = self.wall_time()
+        with self.lock:
+            items = list(self.seconds.items())
+            calls = dict(self.calls)
+        return {
+            name: {
+                'seconds': seconds,
+                'calls': calls[name],
+                'meanMicros': seconds / calls[name] * 1e6 if calls[name] > 0 else 0.0,
+                'share': seconds / wall if wall > 0 else 0.0,
+            }
+            for name, seconds in sorted(items)
+        }
+
+    def format_breakdown(self) -> str:
+        """顶层阶段按耗时占比降序排列的一行摘要，其余时间计为 other。"""
+        breakdown = self.breakdown()
+        top = [(name, entry['share']) for name, entry in breakdown.items() if '.' not in name]
+        top.sort(key=lambda item: -item[1])
+        other = max(0.0, 1.0 - sum(share for _, share in top))
+        parts = [f'{name} {share * 100:.1f}%' for name, share in top]
+        parts.append(f'other {other * 100:.1f}%')
+        return ' | '.join(parts)
+
+    def sample(self, episode: int) -> None:
+        self.samples.append({
+            'episode': episode,
+            'wallTime': self.wall_time(),
+            'phases': {name: entry['seconds'] for name, entry in self.breakdown().items()},
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'wallTime': self.wall_time(),
+            'timestamp': int(time.time() * 1000),
+            'phases': self.breakdown(),
+            'samples': self.samples,
+        }
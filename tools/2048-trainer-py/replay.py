@@ -0,0 +1,205 @@
+"""
+2048 N-Tuple Network Training - Self-Play Replay Dataset
+
+把自我对弈（或 Expectimax 对局）产生的转移 (afterstate, reward, next_afterstate)
+流式写入分块、只追加的二进制文件，离线训练时以内存映射方式读回，
+按打乱的小批量做向量化 TD(0) 更新。生成对局与学习因此可以解耦，
+同一批对局可在不同超参数下反复使用，无需重新生成。
+
+分块文件布局（目录下按序号命名为 chunk-000000.bin、chunk-000001.bin ...）：
+  magic        8 字节   b'NTREPLAY'
+  version      uint32   格式版本
+  record_size  uint32   每条记录的字节数（20）
+  records      紧凑的小端记录，每条：
+                 afterstate       uint64   采取动作后的棋盘
+                 next_afterstate  uint64   下一步的后继状态，0 表示对局结束
+                 reward           uint32   下一步移动获得的奖励（对局结束时为 0）
+
+TD(0) 目标为 V(afterstate) <- reward + V(next_afterstate)，与 Trainer.train_episode 相同。
+文件只追加不改写，记录数由文件大小推出；进程被中断时最后一条不完整的记录会被忽略。
+"""
+
+from typing import BinaryIO, Iterator, List, Optional
+import os
+import struct
+import numpy as np
+from network import NTupleNetwork
+
+REPLAY_MAGIC = b'NTREPLAY'
+REPLAY_VERSION = 1
+PREFIX_FORMAT = '<8sII'
+PREFIX_SIZE = struct.calcsize(PREFIX_FORMAT)
+
+RECORD_DTYPE = np.dtype([
+    ('afterstate', '<u8'),
+    ('next_afterstate', '<u8'),
+    ('reward', '<u4'),
+])
+
+CHUNK_PREFIX = 'chunk-'
+CHUNK_SUFFIX = '.bin'
+
+# 每个分块最多 2^22 条记录（80 MiB），写入缓冲 2^16 条
+DEFAULT_CHUNK_RECORDS = 1 << 22
+DEFAULT_BUFFER_RECORDS = 1 << 16
+
+
+def list_chunks(directory: str) -> List[str]:
+    """目录下按序号排列的分块文件路径。"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(CHUNK_PREFIX) and name.endswith(CHUNK_SUFFIX)
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+def load_chunk(path: str, mmap_mode: str = 'r') -> np.ndarray:
+    """以内存映射方式打开一个分块，返回 RECORD_DTYPE 结构化数组（忽略末尾不完整的记录）。"""
+    with open(path, 'rb') as f:
+        magic, version, record_size = struct.unpack(PREFIX_FORMAT, f.read(PREFIX_SIZE))
+    if magic != REPLAY_MAGIC:
+        raise ValueError(f'Not a replay chunk: {path}')
+    if version != REPLAY_VERSION:
+        raise ValueError(f'Unsupported replay chunk version: expected {REPLAY_VERSION}, got {version}')
+    if record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f'Record size mismatch: expected {RECORD_DTYPE.itemsize}, got {record_size}')
+
+    count = (os.path.getsize(path) - PREFIX_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode=mmap_mode, offset=PREFIX_SIZE, shape=(count,))
+
+
+class TransitionRecorder:
+    """
+    把转移追加到 directory 下的分块文件。记录先进入固定大小的缓冲区，满了才写盘；
+    已有的分块不会被改写，新的记录从下一个序号的分块开始。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        chunk_records: int = DEFAULT_CHUNK_RECORDS,
+        buffer_records: int = DEFAULT_BUFFER_RECORDS,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_records = chunk_records
+        self.buffer = np.zeros(buffer_records, dtype=RECORD_DTYPE)
+        self.buffered = 0
+        self.records = 0
+
+        self.next_chunk = len(list_chunks(directory))
+        self.file: Optional[BinaryIO] = None
+        self.file_records = 0
+
+    def add(self, afterstate: int, reward: int, next_afterstate: int) -> None:
+        """追加一条转移；对局结束时 next_afterstate 与 reward 传 0。"""
+        if self.buffered == len(self.buffer):
+            self.flush()
+        record = self.buffer[self.buffered]
+        record['afterstate'] = afterstate
+        record['next_afterstate'] = next_afterstate
+        record['reward'] = reward
+        self.buffered += 1
+        self.records += 1
+
+    def add_batch(self, afterstates: np.ndarray, rewards: np.ndarray, next_afterstates: np.ndarray) -> None:
+        """批量追加转移，参数为等长的一维数组。"""
+        count = len(afterstates)
+        if count == 0:
+            return
+        if self.buffered + count > len(self.buffer):
+            self.flush()
+        if count > len(self.buffer):
+            records = np.zeros(count, dtype=RECORD_DTYPE)
+            records['afterstate'] = afterstates
+            records['next_afterstate'] = next_afterstates
+            records['reward'] = rewards
+            self.write(records)
+        else:
+            target = self.buffer[self.buffered:self.buffered + count]
+            target['afterstate'] = afterstates
+            target['next_afterstate'] = next_afterstates
+            target['reward'] = rewards
+            self.buffered += count
+        self.records += count
+
+    def flush(self) -> None:
+        if self.buffered > 0:
+            self.write(self.buffer[:self.buffered])
+            self.buffered = 0
+        if self.file is not None:
+            self.file.flush()
+
+    def write(self, records: np.ndarray) -> None:
+        while len(records) > 0:
+            if self.file is None or self.file_records >= self.chunk_records:
+                self.open_next_chunk()
+            count = min(len(records), self.chunk_records - self.file_records)
+            self.file.write(memoryview(np.ascontiguousarray(records[:count])).cast('B'))
+            self.file_records += count
+            records = records[count:]
+
+    def open_next_chunk(self) -> None:
+        if self.file is not None:
+            self.file.close()
+        path = os.path.join(self.directory, f'{CHUNK_PREFIX}{self.next_chunk:06d}{CHUNK_SUFFIX}')
+        self.file = open(path, 'xb')
+        self.file.write(struct.pack(PREFIX_FORMAT, REPLAY_MAGIC, REPLAY_VERSION, RECORD_DTYPE.itemsize))
+        self.next_chunk += 1
+        self.file_records = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ReplayDataset:
+    """目录下全部分块的只读内存映射视图。"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.chunks = [chunk for chunk in map(load_chunk, list_chunks(directory)) if len(chunk) > 0]
+        self.records = sum(len(chunk) for chunk in self.chunks)
+        self.episodes = sum(int(np.count_nonzero(chunk['next_afterstate'] == 0)) for chunk in self.chunks)
+
+    def __len__(self) -> int:
+        return self.records
+
+    def batches(self, batch_size: int, rng: np.random.Generator) -> Iterator[np.ndarray]:
+        """
+        按打乱的顺序产出小批量：分块顺序随机，分块内按随机排列取记录。
+        每个小批量是从内存映射中收集出的普通数组，只有被访问的页会从磁盘读入。
+        """
+        for chunk_index in rng.permutation(len(self.chunks)):
+            chunk = self.chunks[chunk_index]
+            order = rng.permutation(len(chunk))
+            for start in range(0, len(order), batch_size):
+                yield chunk[np.sort(order[start:start + batch_size])]
+
+
+def replay_td_update(network: NTupleNetwork, batch: np.ndarray, learning_rate: float) -> float:
+    """
+    对一个小批量做向量化 TD(0) 更新：先用更新前的权重评估全部后继状态，再合并为一次散射更新。
+    同一权重被批内多条转移命中时取各条增量的平均（average_overlaps），
+    常见局面的有效步长不随批大小增长，大批量不会发散。
+
+    Returns:
+        本批 TD 误差绝对值的平均值
+    """
+    values, indices = network.evaluate_batch_with_indices(batch['afterstate'])
+
+    next_afterstates = batch['next_afterstate']
+    live = next_afterstates != 0
+    next_values = np.zeros(len(batch), dtype=np.float64)
+    if live.any():
+        next_values[live] = network.evaluate_batch(next_afterstates[live])
+
+    td_errors = batch['reward'] + next_values - values
+    network.update_weights_batch_by_indices(indices, learning_rate * td_errors, average_overlaps=True)
+    return float(np.abs(td_errors).mean())
@@ -0,0 +1,309 @@
+"""
+2048 N-Tuple Network Training - Pattern Set Sweep
+
+在相同的墙钟时间预算下比较多个 N-Tuple 模式集：每个候选模式集在独立的进程中从零开始串行训练，
+预算用完后保存权重，再用固定种子的对局（与 evaluate.py 相同的 Expectimax 玩家）衡量强度，
+最后输出排名报告：默认按平均得分排名，--rank-by efficiency 按每训练 CPU 秒的平均得分排名。
+
+每个候选记录：
+  - 权重内存（扁平权重数组大小）与训练期间的进程峰值常驻内存（导出权重后的峰值另记）
+  - 训练轮数、轮/秒与训练占用的 CPU 秒
+  - 每次评估的查表次数，以及评估对局中的叶子评估/秒
+  - 评估对局的得分分布与到达率（evaluate.summarize），以及平均得分 / 训练 CPU 秒
+
+候选之间比较的是相同墙钟时间内能学到多少：大模式集每轮更慢、表更大，但容量更高。
+并行进程数超过 CPU 核数时各候选分到的 CPU 时间不同，结果中的 CPU 秒可用于核对公平性。
+
+用法：
+  python sweep_patterns.py [options]
+
+选项：
+  --sets <l>             候选模式集，逗号分隔，名称或 JSON 文件（默认：全部已登记的模式集）
+  --budget <n>           每个候选的训练时间（秒）（默认：600）
+  --jobs <n>             同时训练的候选数（默认：候选数与 CPU 核数中较小者）
+  --games <n>            每个候选的评估对局数（默认：200）
+  --depth <n>            评估的 Expectimax 机会层深度，0 为贪心（默认：0）
+  --learning-rate <n>    学习率（默认：0.0025）
+  --dtype <name>         训练权重精度：float64 或 float32（默认：float64）
+  --max-tile-exponent <n> 查找表区分的最大方块指数（默认：15）
+  --backend <name>       训练后端：python 或 numba（默认：python）
+  --seed <n>             训练随机种子；评估第 i 局使用 seed + i（默认：0）
+  --rank-by <name>       排名依据：score（平均得分）或 efficiency（平均得分 / 训练 CPU 秒）（默认：score）
+  --output-dir <dir>     权重与报告的输出目录（默认：sweep）
+  --json <path>          报告 JSON 路径（默认：<output-dir>/report.json）
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import unicodedata
+import numpy as np
+import evaluate
+from expectimax import ExpectimaxPlayer
+from file_io import save_json
+from network import NTupleNetwork
+from patterns import MAX_TILE_EXPONENT, PATTERN_SETS, resolve_pattern_set
+from trainer import SCRIPT_DIR, Trainer, TrainingConfig
+from weights_io import FLOAT_DTYPES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mib() -> float:
+    """当前进程的峰值常驻内存（MiB），无法获取时为 0。"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KiB 为单位，macOS 以字节为单位
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def set_label(spec: str) -> str:
+    """候选的名称：已登记的模式集用其名称，JSON 文件用去掉扩展名的文件名。"""
+    if spec in PATTERN_SETS:
+        return spec
+    return os.path.splitext(os.path.basename(spec))[0]
+
+
+def run_candidate(task: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """在当前进程中训练并评估一个候选模式集（由进程池调用，每个候选独占一个进程）。"""
+    spec, settings = task
+    label = set_label(spec)
+    patterns = resolve_pattern_set(spec)
+
+    random.seed(settings['seed'])
+    np.random.seed(settings['seed'])
+
+    network = NTupleNetwork(patterns, dtype=settings['dtype'], max_tile_exponent=settings['maxTileExponent'])
+    weights_path = os.path.join(settings['outputDir'], f'{label}.bin')
+    config = TrainingConfig(
+        learning_rate=settings['learningRate'],
+        output_path=weights_path,
+        pattern_set=spec,
+        checkpoint_interval=0,
+        weights_save_interval=0,
+        backend=settings['backend'],
+        dtype=settings['dtype'],
+        max_tile_exponent=settings['maxTileExponent'],
+    )
+    trainer = Trainer(network, config)
+
+    # 与 Trainer.train 的串行循环相同，但按时间预算结束，不输出进度、不保存检查点
+    trainer.start_time = time.time()
+    cpu_start = time.process_time()
+    deadline = trainer.start_time + settings['budget']
+    episode = 0
+    moves = 0
+    while time.time() < deadline:
+        result = trainer.train_episode()
+        episode += 1
+        moves += result.moves
+        trainer.update_stats(episode, result)
+    train_seconds = time.time() - trainer.start_time
+    cpu_seconds = time.process_time() - cpu_start
+    train_peak = peak_rss_mib()
+
+    # 导出时合并的查找表展开为每个模式一张表，峰值内存可能远高于训练时
+    trainer.write_weights(weights_path)
+
+    player = ExpectimaxPlayer(network, settings['depth'])
+    records = [evaluate.play_game(player, settings['seed'] + i) for i in range(settings['games'])]
+    summary = evaluate.summarize(records)
+    play_seconds = sum(r.elapsed for r in records)
+
+    full_lookups, lookups = network.lookups_per_evaluation()
+    return {
+        'name': label,
+        'spec': spec,
+        'patterns': len(network.source_patterns),
+        'tupleSizes': sorted({len(p) for p in network.source_patterns}),
+        'tables': len(network.patterns),
+        'lookupsPerEvaluation': lookups,
+        'unmergedLookupsPerEvaluation': full_lookups,
+        'weightEntries': len(network.flat_weights),
+        'weightMiB': network.flat_weights.nbytes / 2 ** 20,
+        'peakRssMiB': train_peak,
+        'exportPeakRssMiB': peak_rss_mib(),
+        'episodes': episode,
+        'trainMoves': moves,
+        'trainSeconds': train_seconds,
+        'cpuSeconds': cpu_seconds,
+        'episodesPerSecond': episode / train_seconds if train_seconds > 0 else 0.0,
+        'trainAvgScore': trainer.stats.avg_score,
+        'recentAvgScore': trainer.stats.recent_avg_score,
+        'evaluationsPerSecond': player.evaluations / play_seconds if play_seconds > 0 else 0.0,
+        'scorePerCpuSecond': summary['meanScore'] / cpu_seconds if cpu_seconds > 0 else 0.0,
+        'weights': weights_path,
+        'evaluation': summary,
+    }
+
+
+RANK_KEYS: Dict[str, Callable[[Dict[str, Any]], float]] = {
+    'score': lambda r: r['evaluation']['meanScore'],
+    'efficiency': lambda r: r['scorePerCpuSecond'],
+}
+
+
+def pad(text: str, width: int, left: bool = False) -> str:
+    """按终端显示宽度（中文字符占两列）补齐到 width 列。"""
+    fill = ' ' * max(0, width - sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text))
+    return text + fill if left else fill + text
+
+
+def print_report(results: List[Dict[str, Any]], rank_by: str) -> None:
+    """按 rank_by 降序打印排名表，results 已排好序；相对最佳按同一指标计算。"""
+    key = RANK_KEYS[rank_by]
+    best = key(results[0]) if results else 0.0
+    print('=' * 128)
+    header = [('排名', 4), ('模式集', -20), ('查表/次', 7), ('权重MiB', 9), ('峰值MiB', 9), ('轮数', 8),
+              ('轮/秒', 8), ('评估/秒', 10), ('CPU秒', 8), ('平均得分', 9), ('中位数', 8), ('2048', 7),
+              ('均分/CPU秒', 10), ('相对最佳', 8)]
+    print(' '.join(pad(title, abs(width), width < 0) for title, width in header))
+    print('-' * 128)
+    for rank, r in enumerate(results, 1):
+        ev = r['evaluation']
+        relative = key(r) / best if best > 0 else 0.0
+        print(f'{rank:>4} {r["name"]:<20} {r["lookupsPerEvaluation"]:>7} {r["weightMiB"]:>9.1f} '
+              f'{r["peakRssMiB"]:>9.1f} {r["episodes"]:>8,} {r["episodesPerSecond"]:>8.1f} '
+              f'{r["evaluationsPerSecond"]:>10,.0f} {r["cpuSeconds"]:>8.0f} {ev["meanScore"]:>9.0f} '
+              f'{ev["medianScore"]:>8.0f} {ev["reachRates"]["2048"] * 100:>6.1f}% '
+              f'{r["scorePerCpuSecond"]:>10.1f} {relative * 100:>7.1f}%')
+    print('=' * 128)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='2048 N-Tuple 模式集比较（相同时间预算）')
+    parser.add_argument('--sets', type=str, default=','.join(PATTERN_SETS),
+                        help='候选模式集，逗号分隔，名称或 JSON 文件（默认：全部已登记的模式集）')
+    parser.add_argument('--budget', type=float, default=600, help='每个候选的训练时间（秒）（默认：600）')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='同时训练的候选数（默认：候选数与 CPU 核数中较小者）')
+    parser.add_argument('--games', '-g', type=int, default=200, help='每个候选的评估对局数（默认：200）')
+    parser.add_argument('--depth', type=int, default=0, help='评估的 Expectimax 机会层深度，0 为贪心（默认：0）')
+    parser.add_argument('--learning-rate', '-l', type=float, default=0.0025, help='学习率（默认：0.0025）')
+    parser.add_argument('--dtype', type=str, choices=list(FLOAT_DTYPES), default='float64',
+                        help='训练权重精度（默认：float64）')
+    parser.add_argument('--max-tile-exponent', type=int, default=MAX_TILE_EXPONENT,
+                        help=f'查找表区分的最大方块指数（默认：{MAX_TILE_EXPONENT}）')
+    parser.add_argument('--backend', type=str, choices=['python', 'numba'], default='python',
+                        help='训练后端（默认：python）')
+    parser.add_argument('--seed', type=int, default=0, help='训练随机种子；评估第 i 局使用 seed + i（默认：0）')
+    parser.add_argument('--rank-by', type=str, choices=list(RANK_KEYS), default='score',
+                        help='排名依据：score（平均得分）或 efficiency（平均得分 / 训练 CPU 秒）（默认：score）')
+    parser.add_argument('--output-dir', type=str, default='sweep', help='权重与报告的输出目录（默认：sweep）')
+    parser.add_argument('--json', type=str, default=None, help='报告 JSON 路径（默认：<output-dir>/report.json）')
+    args = parser.parse_args()
+
+    args.sets = [spec for spec in args.sets.split(',') if spec]
+    if len(args.sets) == 0:
+        print('Error: at least one pattern set is required')
+        sys.exit(1)
+
+    for spec in args.sets:
+        try:
+            resolve_pattern_set(spec)
+        except (OSError, ValueError) as e:
+            print(f'Error: {e}')
+            sys.exit(1)
+
+    labels = [set_label(spec) for spec in args.sets]
+    if len(set(labels)) != len(labels):
+        print('Error: pattern set names must be unique')
+        sys.exit(1)
+
+    if args.budget <= 0:
+        print('Error: budget must be positive')
+        sys.exit(1)
+
+    if args.jobs is None:
+        args.jobs = min(len(args.sets), os.cpu_count() or 1)
+    if args.jobs <= 0:
+        print('Error: jobs must be positive')
+        sys.exit(1)
+
+    if args.games <= 0:
+        print('Error: games must be positive')
+        sys.exit(1)
+
+    if args.depth < 0:
+        print('Error: depth must be non-negative')
+        sys.exit(1)
+
+    if args.learning_rate <= 0 or args.learning_rate > 1:
+        print('Error: learning rate must be between 0 and 1')
+        sys.exit(1)
+
+    if args.max_tile_exponent < 1 or args.max_tile_exponent > MAX_TILE_EXPONENT:
+        print(f'Error: max tile exponent must be between 1 and {MAX_TILE_EXPONENT}')
+        sys.exit(1)
+
+    if not os.path.isabs(args.output_dir):
+        args.output_dir = os.path.join(SCRIPT_DIR, args.output_dir)
+    if args.json is None:
+        args.json = os.path.join(args.output_dir, 'report.json')
+
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    settings = {
+        'budget': args.budget,
+        'games': args.games,
+        'depth': args.depth,
+        'learningRate': args.learning_rate,
+        'dtype': args.dtype,
+        'maxTileExponent': args.max_tile_exponent,
+        'backend': args.backend,
+        'seed': args.seed,
+        'outputDir': args.output_dir,
+    }
+
+    cores = os.cpu_count() or 1
+    rounds = -(-len(args.sets) // args.jobs)
+    print(f'候选模式集: {", ".join(set_label(spec) for spec in args.sets)}')
+    print(f'每个候选训练 {args.budget:.0f} 秒，评估 {args.games} 局（深度 {args.depth}）| '
+          f'并行 {args.jobs} 个（CPU 核数 {cores}），预计至少 {rounds * args.budget / 60:.1f} 分钟')
+    if args.jobs > cores:
+        print('警告：并行数超过 CPU 核数，各候选分到的 CPU 时间会少于预算，比较结果时参考 CPU 秒')
+    print()
+
+    # 每个候选使用新的进程（maxtasksperchild=1），峰值内存只反映该候选
+    ctx = multiprocessing.get_context()
+    results: List[Dict[str, Any]] = []
+    start = time.time()
+    with ctx.Pool(args.jobs, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(run_candidate, [(spec, settings) for spec in args.sets]):
+            results.append(result)
+            print(f'[{time.time() - start:6.0f}s] {result["name"]}: {result["episodes"]:,} 轮，'
+                  f'平均得分 {result["evaluation"]["meanScore"]:.0f}，权重: {result["weights"]}', flush=True)
+    print()
+
+    results.sort(key=lambda r: -RANK_KEYS[args.rank_by](r))
+    print_report(results, args.rank_by)
+
+    cpu = [r['cpuSeconds'] for r in results]
+    if min(cpu) < 0.9 * max(cpu):
+        print(f'警告：各候选的训练 CPU 秒相差超过 10%（{min(cpu):.0f} - {max(cpu):.0f}），排名可能受调度影响')
+
+    save_json(args.json, {
+        'settings': {key: value for key, value in settings.items() if key != 'outputDir'},
+        'jobs': args.jobs,
+        'cpuCount': cores,
+        'rankBy': args.rank_by,
+        'timestamp': int(time.time() * 1000),
+        'results': results,
+    })
+    print(f'报告已写入: {args.json}')
+
+
+if __name__ == '__main__':
+    main()
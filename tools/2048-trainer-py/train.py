@@ -12,11 +12,31 @@
   --learning-rate <n>  学习率（默认：0.0025）
   --output <path>      输出文件路径（默认：weights.json）
   --decay              启用学习率衰减
+  --patterns <name>    N-Tuple 模式集名称或 JSON 文件（默认：4tuple）
   --optimistic <n>     乐观初始值（默认：0，不使用）
   --report <n>         进度报告间隔（默认：100）
   --checkpoint <n>     检查点保存间隔（默认：1000）
   --checkpoint-path <p> 检查点文件路径（默认：checkpoint.json）
   --weights-save <n>   权重保存间隔（秒）（默认：300）
+  --parallel-games <n> 同步推进的对局数（默认：1，即串行）
+  --workers <n>        训练进程数（默认：1）
+  --backend <name>     训练后端：python 或 numba（默认：python）
+  --dtype <name>       训练权重精度：float64 或 float32（默认：float64）
+  --export-dtype <name> 导出权重类型：float64、float32、int16 或 int8（默认：与 --dtype 相同）
+  --max-tile-exponent <n> 查找表区分的最大方块指数，更大的方块按上限计（默认：15）
+  --stages <l>         分阶段网络的阶段方块，逗号分隔（如 8192,16384；默认：不分阶段）
+  --profile [path]     启用分阶段计时，结果写入 JSON 轨迹（默认路径：profile.json）
+  --stats-windows <l>  滚动统计窗口，逗号分隔（默认：1000,10000,100000）
+  --algo <name>        学习算法：td0、tdlambda 或 nstep（默认：td0）
+  --lambda <x>         TD(λ) 的 λ（默认：0.5）
+  --trace-length <n>   TD(λ) 资格迹保留的后继状态数（默认：5）
+  --nstep <n>          n 步 TD 的步数（默认：3）
+  --adaptive-lr <name> 逐权重自适应学习率：none 或 tc（默认：none）
+  --record <dir>       把自我对弈的转移记录到回放目录
+  --replay <dir>       离线训练：回放目录中记录的转移，不进行自我对弈
+  --replay-epochs <n>  离线训练的回放遍数（默认：1）
+  --batch-size <n>     离线训练的小批量大小（默认：256）
+  --seed <n>           离线训练打乱顺序的随机种子（默认：随机）
   --resume             从检查点恢复训练
   --help               显示帮助信息
 """
@@ -25,7 +45,10 @@ import argparse
 import sys
 from network import NTupleNetwork
 from trainer import Trainer, TrainingConfig
-from patterns import DEFAULT_TRAINING_PATTERNS
+from patterns import DEFAULT_PATTERN_SET, MAX_TILE_EXPONENT, PATTERN_SETS, resolve_pattern_set
+from rolling_stats import DEFAULT_WINDOWS
+from learners import ALGORITHMS
+from weights_io import FLOAT_DTYPES, QUANTIZED_DTYPES
 
 
 def print_help() -> None:
@@ -40,14 +63,52 @@ def print_help() -> None:
   --learning-rate <n>  学习率 α（默认：0.0025）
   --output <path>      权重输出文件路径（默认：weights.json）
   --decay              启用学习率衰减
+  --patterns <name>    N-Tuple 模式集：4tuple（默认）、horizontal-4tuple、rectangle-6tuple、corner-6tuple、
+                       6tuple，或模式列表 JSON 文件（也可以是带 patterns 字段的权重 JSON）；
+                       sweep_patterns.py 可在相同时间预算下比较多个模式集
   --optimistic <n>     乐观初始权重值（默认：0，禁用）
   --report <n>         进度报告间隔（默认：100）
   --checkpoint <n>     检查点保存间隔（默认：1000）
   --checkpoint-path <p> 检查点文件路径（默认：checkpoint.json）
   --weights-save <n>   权重保存间隔（秒）（默认：300，0表示禁用）
+  --stats-windows <l>  滚动统计窗口（轮），逗号分隔（默认：1000,10000,100000）
+                       最小的窗口用于进度条中的得分
   --resume             从检查点恢复训练
   --help               显示此帮助信息
 
+学习算法：
+  --algo <name>        td0（默认）、tdlambda 或 nstep；tdlambda/nstep 不支持 numba 后端与 --parallel-games
+  --lambda <x>         TD(λ) 的 λ，0 到 1（默认：0.5）
+  --trace-length <n>   TD(λ) 资格迹保留的最近后继状态数，每步更新这么多个后继状态（默认：5）
+  --nstep <n>          n 步 TD 的步数（默认：3）
+  --adaptive-lr <name> none（默认，全局学习率）或 tc（Temporal Coherence：每个权重按其历次更新的
+                       一致程度 |ΣΔ|/Σ|Δ| 缩放步长，累加器每个权重 8 字节，随检查点保存；
+                       不支持 numba 后端与 --workers）
+
+回放数据集：
+  --record <dir>       把自我对弈的每个转移 (后继状态, 奖励, 下一后继状态) 追加到 dir 下的分块文件
+                       （每条 20 字节；不支持 numba 后端与 --workers）。evaluate.py --record 可记录 Expectimax 对局
+  --replay <dir>       离线训练：以内存映射方式读取 dir 中的转移，按打乱的小批量做向量化 TD(0) 更新，
+                       不进行自我对弈；--episodes、--checkpoint 与 --resume 不适用
+  --replay-epochs <n>  回放遍数（默认：1）；启用 --decay 时每遍结束后衰减学习率
+  --batch-size <n>     小批量大小（默认：256）；批内同一权重取各条增量的平均，批越大每遍学到的越少
+  --seed <n>           打乱顺序的随机种子（默认：随机）
+
+性能选项：
+  --parallel-games <n> 同步推进的对局数，批量评估与更新（默认：1，即串行）
+  --workers <n>        训练进程数，共享内存权重无锁更新（默认：1）
+  --backend <name>     训练后端：python 或 numba（整局编译执行，需安装 numba）
+  --dtype <name>       训练与检查点的权重精度：float64 或 float32（内存减半）
+  --export-dtype <name> 导出权重类型：float64、float32，或 int16/int8 定点（每个元组一个缩放系数，仅 .bin 输出）；
+                        定点权重在训练结束时另存为 <output>.int16.bin 等，--output 保持训练精度以便继续训练
+  --max-tile-exponent <n> 查找表区分的最大方块指数（默认：15）；例如 13 表示 8192 及以上视为同一种方块，
+                       6-tuple 表从 16^6 缩小到 14^6 项。导出 JSON 时自动展开为标准布局
+  --stages <l>         分阶段网络：按棋盘上已出现的阶段方块（逗号分隔，如 8192,16384）选择独立的一套
+                       查找表，每次评估的查表次数不变，权重内存乘以阶段数；只能输出 .bin；
+                       --output 已有不分阶段的权重时复制到每个阶段作为起点
+  --profile [path]     分阶段计时（选择移动、评估、TD 更新、生成方块、统计、保存），
+                       进度报告中显示耗时占比，结束时写入 JSON 轨迹（默认：profile.json）
+
 示例：
   # 基本训练，100,000 轮
   python train.py --output weights.json
@@ -58,15 +119,43 @@ def print_help() -> None:
   # 恢复中断的训练
   python train.py --resume --output weights.json
 
+  # 使用 6-tuple 模式集训练
+  python train.py --patterns 6tuple --output weights-6tuple.bin
+
   # 自定义检查点间隔（每 5000 轮保存一次）
   python train.py --checkpoint 5000 --output weights.json
 
+  # 记录自我对弈，再用不同学习率离线回放
+  python train.py --episodes 20000 --record replay/ --output weights.json
+  python train.py --replay replay/ --replay-epochs 3 --learning-rate 0.001 --output replay-weights.json
+
   # 自定义权重保存间隔（每 10 分钟保存一次）
   python train.py --weights-save 600 --output weights.json
 
   # 禁用定时权重保存
   python train.py --weights-save 0 --output weights.json
 
+  # 32 局同步自我对弈（局数越多每轮越快，但每轮学到的越少）
+  python train.py --parallel-games 32 --output weights.json
+
+  # 8 个训练进程共享同一份权重
+  python train.py --workers 8 --output weights.json
+
+  # 使用 Numba 编译后端
+  python train.py --backend numba --output weights.json
+
+  # float32 训练，另外导出 int16 定点权重 weights.int16.bin
+  python train.py --dtype float32 --export-dtype int16 --output weights.bin
+
+  # TD(λ)，λ=0.5，资格迹保留最近 5 个后继状态
+  python train.py --algo tdlambda --lambda 0.5 --trace-length 5 --output weights.json
+
+  # 降基数查找表：方块指数截断到 13（8192）
+  python train.py --max-tile-exponent 13 --output weights.bin
+
+  # 三阶段网络：8192 出现前、8192 出现后、16384 出现后各用一套查找表
+  python train.py --stages 8192,16384 --output weights-staged.bin
+
 注意：
   - 按 Ctrl+C 中断训练，进度将自动保存到检查点。
   - 使用 --resume 从上次中断的位置继续训练。
@@ -106,6 +195,13 @@ def parse_args() -> argparse.Namespace:
         help='启用学习率衰减'
     )
 
+    parser.add_argument(
+        '--patterns', '-p',
+        type=str,
+        default=DEFAULT_PATTERN_SET,
+        help=f'N-Tuple 模式集名称（{", ".join(PATTERN_SETS)}）或 JSON 文件（默认：{DEFAULT_PATTERN_SET}）'
+    )
+
     parser.add_argument(
         '--optimistic',
         type=float,
@@ -141,6 +237,147 @@ def parse_args() -> argparse.Namespace:
         help='权重保存间隔（秒）（默认：300，0表示禁用）'
     )
 
+    parser.add_argument(
+        '--parallel-games',
+        type=int,
+        default=1,
+        help='同步推进的对局数（默认：1，即串行）'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='训练进程数（默认：1）'
+    )
+
+    parser.add_argument(
+        '--backend',
+        type=str,
+        choices=['python', 'numba'],
+        default='python',
+        help='训练后端（默认：python）'
+    )
+
+    parser.add_argument(
+        '--dtype',
+        type=str,
+        choices=list(FLOAT_DTYPES),
+        default='float64',
+        help='训练权重精度（默认：float64）'
+    )
+
+    parser.add_argument(
+        '--export-dtype',
+        type=str,
+        choices=list(FLOAT_DTYPES) + list(QUANTIZED_DTYPES),
+        default=None,
+        help='导出权重类型（默认：与 --dtype 相同）'
+    )
+
+    parser.add_argument(
+        '--max-tile-exponent',
+        type=int,
+        default=MAX_TILE_EXPONENT,
+        help=f'查找表区分的最大方块指数（默认：{MAX_TILE_EXPONENT}）'
+    )
+
+    parser.add_argument(
+        '--stages',
+        type=str,
+        default=None,
+        help='分阶段网络的阶段方块，逗号分隔（默认：不分阶段）'
+    )
+
+    parser.add_argument(
+        '--profile',
+        type=str,
+        nargs='?',
+        const='profile.json',
+        default=None,
+        help='启用分阶段计时并写入 JSON 轨迹（默认路径：profile.json）'
+    )
+
+    parser.add_argument(
+        '--stats-windows',
+        type=str,
+        default=','.join(str(w) for w in DEFAULT_WINDOWS),
+        help='滚动统计窗口，逗号分隔（默认：1000,10000,100000）'
+    )
+
+    parser.add_argument(
+        '--algo',
+        type=str,
+        choices=ALGORITHMS,
+        default='td0',
+        help='学习算法（默认：td0）'
+    )
+
+    parser.add_argument(
+        '--lambda',
+        dest='td_lambda',
+        type=float,
+        default=0.5,
+        help='TD(λ) 的 λ（默认：0.5）'
+    )
+
+    parser.add_argument(
+        '--trace-length',
+        type=int,
+        default=5,
+        help='TD(λ) 资格迹长度（默认：5）'
+    )
+
+    parser.add_argument(
+        '--nstep',
+        type=int,
+        default=3,
+        help='n 步 TD 的步数（默认：3）'
+    )
+
+    parser.add_argument(
+        '--adaptive-lr',
+        type=str,
+        choices=['none', 'tc'],
+        default='none',
+        help='逐权重自适应学习率（默认：none）'
+    )
+
+    parser.add_argument(
+        '--record',
+        type=str,
+        default=None,
+        help='把自我对弈的转移记录到回放目录'
+    )
+
+    parser.add_argument(
+        '--replay',
+        type=str,
+        default=None,
+        help='离线训练：回放目录中记录的转移'
+    )
+
+    parser.add_argument(
+        '--replay-epochs',
+        type=int,
+        default=1,
+        help='离线训练的回放遍数（默认：1）'
+    )
+
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=256,
+        help='离线训练的小批量大小（默认：256）'
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+        help='离线训练打乱顺序的随机种子（默认：随机）'
+    )
+
     parser.add_argument(
         '--resume',
         action='store_true',
@@ -179,28 +416,151 @@ def parse_args() -> argparse.Namespace:
         print('Error: weights save interval must be non-negative')
         sys.exit(1)
 
+    if args.parallel_games <= 0:
+        print('Error: parallel games must be positive')
+        sys.exit(1)
+
+    if args.workers <= 0:
+        print('Error: workers must be positive')
+        sys.exit(1)
+
+    if args.backend == 'numba' and args.parallel_games > 1:
+        print('Error: --backend numba and --parallel-games cannot be combined')
+        sys.exit(1)
+
+    if args.workers > 1 and args.parallel_games > 1:
+        print('Error: --workers and --parallel-games cannot be combined')
+        sys.exit(1)
+
+    if args.max_tile_exponent < 1 or args.max_tile_exponent > MAX_TILE_EXPONENT:
+        print(f'Error: max tile exponent must be between 1 and {MAX_TILE_EXPONENT}')
+        sys.exit(1)
+
+    if args.td_lambda < 0 or args.td_lambda > 1:
+        print('Error: lambda must be between 0 and 1')
+        sys.exit(1)
+
+    if args.trace_length <= 0:
+        print('Error: trace length must be positive')
+        sys.exit(1)
+
+    if args.nstep <= 0:
+        print('Error: nstep must be positive')
+        sys.exit(1)
+
+    if args.algo != 'td0' and (args.backend == 'numba' or args.parallel_games > 1):
+        print(f'Error: --algo {args.algo} cannot be combined with --backend numba or --parallel-games')
+        sys.exit(1)
+
+    if args.adaptive_lr != 'none' and (args.backend == 'numba' or args.workers > 1):
+        print(f'Error: --adaptive-lr {args.adaptive_lr} cannot be combined with --backend numba or --workers')
+        sys.exit(1)
+
+    if args.record is not None and (args.backend == 'numba' or args.workers > 1):
+        print('Error: --record cannot be combined with --backend numba or --workers')
+        sys.exit(1)
+
+    if args.replay is not None and (args.record is not None or args.resume or args.workers > 1):
+        print('Error: --replay cannot be combined with --record, --resume or --workers')
+        sys.exit(1)
+
+    if args.replay_epochs <= 0:
+        print('Error: replay epochs must be positive')
+        sys.exit(1)
+
+    if args.batch_size <= 0:
+        print('Error: batch size must be positive')
+        sys.exit(1)
+
+    try:
+        args.pattern_list = resolve_pattern_set(args.patterns)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    args.stage_exponents = []
+    if args.stages is not None:
+        try:
+            stage_tiles = [int(tile) for tile in args.stages.split(',')]
+        except ValueError:
+            print('Error: stages must be a comma-separated list of tile values')
+            sys.exit(1)
+        if any(tile < 4 or tile & (tile - 1) or tile > 1 << MAX_TILE_EXPONENT for tile in stage_tiles):
+            print(f'Error: stage tiles must be powers of two between 4 and {1 << MAX_TILE_EXPONENT}')
+            sys.exit(1)
+        if any(a >= b for a, b in zip(stage_tiles, stage_tiles[1:])):
+            print('Error: stage tiles must be strictly increasing')
+            sys.exit(1)
+        args.stage_exponents = [tile.bit_length() - 1 for tile in stage_tiles]
+
+    try:
+        args.stats_windows = [int(w) for w in args.stats_windows.split(',')]
+    except ValueError:
+        print('Error: stats windows must be a comma-separated list of integers')
+        sys.exit(1)
+
+    if min(args.stats_windows) <= 0:
+        print('Error: stats windows must be positive')
+        sys.exit(1)
+
+    if args.stage_exponents and not args.output.endswith('.bin'):
+        print('Error: --stages requires a .bin output path (the web app JSON format has no stages)')
+        sys.exit(1)
+
+    if args.export_dtype in QUANTIZED_DTYPES and not args.output.endswith('.bin'):
+        print('Error: quantized --export-dtype requires a .bin output path')
+        sys.exit(1)
+
     return args
 
 
 def main() -> None:
     args = parse_args()
 
-    network = NTupleNetwork(DEFAULT_TRAINING_PATTERNS)
+    network = NTupleNetwork(
+        args.pattern_list,
+        dtype=args.dtype,
+        max_tile_exponent=args.max_tile_exponent,
+        stage_exponents=args.stage_exponents,
+    )
 
     config = TrainingConfig(
         episodes=args.episodes,
         learning_rate=args.learning_rate,
         output_path=args.output,
         enable_decay=args.decay,
+        pattern_set=args.patterns,
         optimistic_init=args.optimistic,
         report_interval=args.report,
         checkpoint_interval=args.checkpoint,
         checkpoint_path=args.checkpoint_path,
         weights_save_interval=args.weights_save,
+        parallel_games=args.parallel_games,
+        workers=args.workers,
+        backend=args.backend,
+        dtype=args.dtype,
+        export_dtype=args.export_dtype,
+        max_tile_exponent=args.max_tile_exponent,
+        stage_exponents=args.stage_exponents,
+        profile_path=args.profile,
+        stats_windows=args.stats_windows,
+        algorithm=args.algo,
+        td_lambda=args.td_lambda,
+        trace_length=args.trace_length,
+        n_step=args.nstep,
+        adaptive_lr=args.adaptive_lr,
+        record_dir=args.record,
+        replay_dir=args.replay,
+        replay_epochs=args.replay_epochs,
+        batch_size=args.batch_size,
+        seed=args.seed,
     )
 
     trainer = Trainer(network, config)
-    trainer.train(args.resume)
+    if args.replay is not None:
+        trainer.train_replay()
+    else:
+        trainer.train(args.resume)
 
 
 if __name__ == '__main__':
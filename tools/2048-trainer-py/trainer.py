@@ -2,6 +2,9 @@
 2048 N-Tuple Network Training - TD Learning Trainer
 
 实现TD(0) Learning算法的训练器，通过自我对弈来学习最优的权重参数。
+串行与多进程训练还可选用 TD(λ) 或 n 步 TD（见 learners），
+以及逐权重的 Temporal Coherence 自适应学习率（见 NTupleNetwork.enable_temporal_coherence）。
+自我对弈的转移可以记录到回放数据集，之后用 train_replay 离线训练（见 replay）。
 
 TD Learning核心思想：
 1. AI使用当前权重进行游戏决策
@@ -11,14 +14,34 @@ TD Learning核心思想：
 更新公式：w += α × (reward + V(next_afterstate) - V(current_afterstate))
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import gc
+import glob
 import json
 import time
 import signal
 import sys
 import os
-from game import Game, Board, Direction
+import queue
+import multiprocessing
+import numpy as np
+from game import Board, Game, Direction, move_batch, add_random_tile_batch, new_board_batch, get_max_tile
 from network import NTupleNetwork
+from patterns import DEFAULT_PATTERN_SET, MAX_TILE_EXPONENT
+from file_io import save_json
+from weights_io import (
+    FLOAT_DTYPES,
+    QUANTIZED_DTYPES,
+    is_binary_weights,
+    load_binary_weights,
+    save_json_weights,
+)
+from checkpoint_io import CheckpointWriter
+from profiler import PhaseProfiler, clock
+from rolling_stats import DEFAULT_WINDOWS, RollingStats
+from learners import TDLearner, create_learner
+from replay import ReplayDataset, TransitionRecorder, replay_td_update
+import jit_backend
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -31,18 +54,40 @@ class TrainingConfig:
         enable_decay: bool = False,
         decay_rate: float = 0.95,
         decay_interval: int = 10000,
+        pattern_set: str = DEFAULT_PATTERN_SET,
         optimistic_init: float = 0,
         report_interval: int = 100,
         output_path: str = 'weights.json',
         checkpoint_interval: int = 1000,
         checkpoint_path: str = 'checkpoint.json',
         weights_save_interval: int = 300,
+        parallel_games: int = 1,
+        workers: int = 1,
+        backend: str = 'python',
+        dtype: str = 'float64',
+        export_dtype: Optional[str] = None,
+        max_tile_exponent: int = MAX_TILE_EXPONENT,
+        stage_exponents: Optional[List[int]] = None,
+        profile_path: Optional[str] = None,
+        stats_windows: Optional[List[int]] = None,
+        algorithm: str = 'td0',
+        td_lambda: float = 0.5,
+        trace_length: int = 5,
+        n_step: int = 3,
+        adaptive_lr: str = 'none',
+        record_dir: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+        replay_epochs: int = 1,
+        batch_size: int = 256,
+        seed: Optional[int] = None,
     ):
         self.episodes = episodes
         self.learning_rate = learning_rate
         self.enable_decay = enable_decay
         self.decay_rate = decay_rate
         self.decay_interval = decay_interval
+        # 模式集名称或 JSON 路径（见 patterns.resolve_pattern_set），仅用于显示；网络由调用方构建
+        self.pattern_set = pattern_set
         self.optimistic_init = optimistic_init
         self.report_interval = report_interval
         
@@ -59,6 +104,48 @@ class TrainingConfig:
             self.checkpoint_path = checkpoint_path
             
         self.weights_save_interval = weights_save_interval
+        self.parallel_games = parallel_games
+        self.workers = workers
+        self.backend = backend
+        # 训练与检查点使用 dtype；导出权重使用 export_dtype（None 表示与 dtype 相同）
+        self.dtype = dtype
+        self.export_dtype = export_dtype if export_dtype is not None else dtype
+        # 查找表可区分的最大方块指数，小于 15 时使用降基数查找表
+        self.max_tile_exponent = max_tile_exponent
+        # 分阶段网络的阶段方块指数（升序），空列表表示单阶段
+        self.stage_exponents = list(stage_exponents) if stage_exponents else []
+
+        # 学习算法（见 learners）：td0、tdlambda（λ 与截断迹长度）或 nstep（步数）
+        self.algorithm = algorithm
+        self.td_lambda = td_lambda
+        self.trace_length = trace_length
+        self.n_step = n_step
+
+        # 逐权重自适应学习率：none（全局学习率）或 tc（Temporal Coherence，累加器随检查点保存）
+        self.adaptive_lr = adaptive_lr
+
+        # 回放数据集（见 replay）：record_dir 记录自我对弈的转移；replay_dir 为离线训练读取的目录，
+        # 按 batch_size 条一批、共 replay_epochs 遍打乱回放，seed 为打乱顺序的随机种子
+        if record_dir is not None and not os.path.isabs(record_dir):
+            self.record_dir: Optional[str] = os.path.join(SCRIPT_DIR, record_dir)
+        else:
+            self.record_dir = record_dir
+        if replay_dir is not None and not os.path.isabs(replay_dir):
+            self.replay_dir: Optional[str] = os.path.join(SCRIPT_DIR, replay_dir)
+        else:
+            self.replay_dir = replay_dir
+        self.replay_epochs = replay_epochs
+        self.batch_size = batch_size
+        self.seed = seed
+
+        # 滚动统计的窗口大小（轮），最小的窗口用于 recent_avg_score
+        self.stats_windows = list(stats_windows) if stats_windows is not None else list(DEFAULT_WINDOWS)
+
+        # 分阶段计时的 JSON 轨迹路径，None 表示不启用
+        if profile_path is not None and not os.path.isabs(profile_path):
+            self.profile_path: Optional[str] = os.path.join(SCRIPT_DIR, profile_path)
+        else:
+            self.profile_path = profile_path
 
 
 class EpisodeResult:
@@ -92,10 +179,18 @@ class CheckpointData:
         current_learning_rate: float,
         stats: Dict[str, Any],
         milestone_count: Dict[str, int],
-        recent_scores: List[float],
+        recent_scores: Optional[List[float]],
         weights: Dict[str, Any],
         timestamp: int,
+        rolling_stats: Optional[Dict[str, Any]] = None,
+        temporal_coherence: Optional[Dict[str, str]] = None,
     ):
+        """
+        Args:
+            recent_scores: 版本 1/2 检查点的最近 1000 轮得分
+            rolling_stats: 版本 3 起的滚动统计（RollingStats.to_dict），代替 recent_scores
+            temporal_coherence: TC 累加器附属文件名 {"errorsFile", "absErrorsFile"}，未启用时为 None
+        """
         self.version = version
         self.config = config
         self.episode = episode
@@ -103,21 +198,29 @@ class CheckpointData:
         self.stats = stats
         self.milestone_count = milestone_count
         self.recent_scores = recent_scores
+        self.rolling_stats = rolling_stats
         self.weights = weights
         self.timestamp = timestamp
+        self.temporal_coherence = temporal_coherence
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        data = {
             'version': self.version,
             'config': self.config,
             'episode': self.episode,
             'currentLearningRate': self.current_learning_rate,
             'stats': self.stats,
             'milestoneCount': self.milestone_count,
-            'recentScores': self.recent_scores,
             'weights': self.weights,
             'timestamp': self.timestamp,
         }
+        if self.rolling_stats is not None:
+            data['rollingStats'] = self.rolling_stats
+        else:
+            data['recentScores'] = self.recent_scores
+        if self.temporal_coherence is not None:
+            data['temporalCoherence'] = self.temporal_coherence
+        return data
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'CheckpointData':
@@ -128,15 +231,60 @@ class CheckpointData:
             current_learning_rate=data['currentLearningRate'],
             stats=data['stats'],
             milestone_count=data['milestoneCount'],
-            recent_scores=data['recentScores'],
+            recent_scores=data.get('recentScores'),
             weights=data['weights'],
             timestamp=data['timestamp'],
+            rolling_stats=data.get('rollingStats'),
+            temporal_coherence=data.get('temporalCoherence'),
         )
 
 
 DEFAULT_TRAINING_CONFIG = TrainingConfig()
 
 
+def run_worker(
+    patterns: List[List[int]],
+    shm_name: str,
+    config: TrainingConfig,
+    total: int,
+    claimed: Any,
+    learning_rate: Any,
+    results: Any,
+) -> None:
+    """
+    训练子进程入口：挂载共享权重，不断领取轮次并把 (score, max_tile, moves) 发回主进程。
+    """
+    # Ctrl+C 由主进程处理；SIGTERM 恢复默认动作，否则 fork 出的子进程会继承主进程的 handle_interrupt，
+    # 被 terminate() 时用自己（未训练过的）统计覆盖检查点和权重文件
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    network, block = NTupleNetwork.from_shared_memory(
+        patterns, shm_name, config.dtype, config.max_tile_exponent, stage_exponents=config.stage_exponents
+    )
+    # 共享权重已由主进程初始化，子进程不能再做乐观初始化；分阶段计时只在主进程进行
+    config.optimistic_init = 0
+    config.profile_path = None
+    trainer = Trainer(network, config)
+
+    while True:
+        with claimed.get_lock():
+            if claimed.value >= total:
+                break
+            claimed.value += 1
+
+        trainer.current_learning_rate = learning_rate.value
+        result = trainer.train_episode()
+        results.put((result.score, result.max_tile, result.moves))
+
+    results.put(None)
+
+    # 先释放所有引用共享内存的数组，再关闭本进程的映射（共享内存块由主进程 unlink）
+    del trainer, network
+    gc.collect()
+    block.close()
+
+
 class Trainer:
     def __init__(self, network: NTupleNetwork, config: Optional[TrainingConfig] = None):
         self.network = network
@@ -146,14 +294,44 @@ class Trainer:
         self.weights_loaded = False
 
         self.stats = TrainingStats()
-        self.recent_scores: List[float] = []
+        self.rolling = RollingStats(self.config.stats_windows)
         self.milestone_count = {'tile2048': 0, 'tile4096': 0, 'tile8192': 0}
         self.start_time = 0
         self.last_weights_save_time = 0
+        self.last_progress_time = 0
+        self.last_checkpoint_episode = 0
+        self.checkpoint_writer = CheckpointWriter()
+        self.episode_runner: Optional[jit_backend.NumbaEpisodeRunner] = None
+        self.profiler: Optional[PhaseProfiler] = PhaseProfiler() if self.config.profile_path else None
+        self.recorder: Optional[TransitionRecorder] = (
+            TransitionRecorder(self.config.record_dir) if self.config.record_dir is not None else None
+        )
+        self.learner: TDLearner = create_learner(
+            self.network,
+            self.config.algorithm,
+            self.config.td_lambda,
+            self.config.trace_length,
+            self.config.n_step,
+        )
 
         if self.config.optimistic_init > 0:
             self.network.init_optimistic(self.config.optimistic_init)
 
+        if self.config.adaptive_lr == 'tc':
+            self.network.enable_temporal_coherence()
+
+        if self.config.backend == 'numba':
+            if self.config.algorithm != 'td0':
+                print(f'警告：Numba 后端只支持 td0，{self.config.algorithm} 使用 Python 后端')
+            elif self.config.adaptive_lr != 'none':
+                print('警告：Numba 后端不支持自适应学习率，使用 Python 后端')
+            elif self.recorder is not None:
+                print('警告：Numba 后端不支持记录转移，使用 Python 后端')
+            elif jit_backend.NUMBA_AVAILABLE:
+                self.episode_runner = jit_backend.NumbaEpisodeRunner(self.network)
+            else:
+                print('警告：未安装 Numba，回退到 Python 后端')
+
     def load_checkpoint(self, checkpoint_path: Optional[str] = None) -> bool:
         path = checkpoint_path if checkpoint_path is not None else self.config.checkpoint_path
 
@@ -161,8 +339,8 @@ class Trainer:
             with open(path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
 
-            if data['version'] != 1:
-                print(f'警告：检查点版本不匹配：期望 1，实际 {data["version"]}')
+            if data['version'] not in (1, 2, 3):
+                print(f'警告：检查点版本不匹配：期望 1、2 或 3，实际 {data["version"]}')
                 return False
 
             checkpoint = CheckpointData.from_dict(data)
@@ -183,11 +361,36 @@ class Trainer:
             self.stats.estimated_remaining = checkpoint.stats['estimatedRemaining']
 
             self.milestone_count = checkpoint.milestone_count
-            self.recent_scores = checkpoint.recent_scores
+            if checkpoint.rolling_stats is not None:
+                self.rolling = RollingStats.from_dict(checkpoint.rolling_stats, self.config.stats_windows)
+            else:
+                self.rolling = RollingStats.from_scores(checkpoint.recent_scores, self.config.stats_windows)
+
+            directory = os.path.dirname(os.path.abspath(path))
 
-            self.network.load_weights(checkpoint.weights)
+            def load_sidecar(name: str, mmap_mode: Optional[str] = 'r') -> Tuple[Dict[str, Any], np.ndarray]:
+                """附属文件头部的 trainedGames 须与检查点轮数一致，否则不是同一次保存写出的。"""
+                header, data = load_binary_weights(os.path.join(directory, name), mmap_mode)
+                trained = (header.get('metadata') or {}).get('trainedGames')
+                if trained is not None and trained != checkpoint.episode:
+                    raise ValueError(f'{name} 保存于第 {trained} 轮，与检查点的第 {checkpoint.episode} 轮不一致')
+                return header, data
+
+            if 'binaryFile' in checkpoint.weights:
+                self.network.load_flat_weights(*load_sidecar(checkpoint.weights['binaryFile']))
+            else:
+                self.network.load_weights(checkpoint.weights)
             self.weights_loaded = True
 
+            if self.network.tc_errors is not None:
+                if checkpoint.temporal_coherence is not None:
+                    self.network.load_temporal_coherence(
+                        load_sidecar(checkpoint.temporal_coherence['errorsFile'], None),
+                        load_sidecar(checkpoint.temporal_coherence['absErrorsFile'], None),
+                    )
+                else:
+                    print('检查点不含 Temporal Coherence 累加器，从零开始累计')
+
             print(f'检查点已从 {path} 加载')
             print(f'从第 {self.start_episode} 轮继续训练')
 
@@ -199,13 +402,21 @@ class Trainer:
             return False
 
     def load_weights(self, weights_path: Optional[str] = None) -> bool:
+        """载入已有权重作为训练起点；定点量化（int16/int8）导出有损，不能作为起点。"""
         path = weights_path if weights_path is not None else self.config.output_path
 
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if is_binary_weights(path):
+                header, flat_weights = load_binary_weights(path)
+                if 'scales' in header:
+                    raise ValueError('定点量化导出是有损的，不能继续训练；请以去掉类型后缀的浮点权重文件为 --output')
+                self.network.load_flat_weights(header, flat_weights)
+                data = header
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.network.load_weights(data)
 
-            self.network.load_weights(data)
             self.weights_loaded = True
 
             if 'metadata' in data and data['metadata']:
@@ -225,8 +436,8 @@ class Trainer:
             print(f'加载权重失败: {e}')
             return False
 
-    def save_checkpoint(self) -> None:
-        metadata = {
+    def build_metadata(self) -> Dict[str, Any]:
+        return {
             'trainedGames': self.stats.episode,
             'avgScore': round(self.stats.avg_score),
             'maxTile': self.stats.max_tile,
@@ -236,11 +447,85 @@ class Trainer:
             'trainingTime': round(self.stats.elapsed_time),
         }
 
-        weights_config = self.network.export_weights(metadata)
+    def output_dtype(self) -> str:
+        """--output 的存储类型：定点导出时 --output 保持训练精度，以便之后继续训练。"""
+        if self.config.export_dtype in QUANTIZED_DTYPES:
+            return self.config.dtype
+        return self.config.export_dtype
+
+    def quantized_export_path(self) -> Optional[str]:
+        """定点导出的单独文件（weights.bin → weights.int16.bin），非定点导出时为 None。"""
+        if self.config.export_dtype not in QUANTIZED_DTYPES:
+            return None
+        root, ext = os.path.splitext(self.config.output_path)
+        return f'{root}.{self.config.export_dtype}{ext}'
+
+    def write_weights(
+        self,
+        path: str,
+        flat_weights: Optional[np.ndarray] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        dtype: Optional[str] = None,
+    ) -> None:
+        if dtype is None:
+            dtype = self.output_dtype()
+        if flat_weights is None:
+            flat_weights = self.network.flat_weights
+        if metadata is None:
+            metadata = self.build_metadata()
+
+        if path.endswith('.bin'):
+            self.network.save_binary(path, metadata, dtype, flat_weights)
+        else:
+            flat_weights = np.asarray(flat_weights, dtype=FLOAT_DTYPES[dtype])
+            save_json_weights(path, self.network.export_weights(metadata, flat_weights))
+
+    def checkpoint_weights_path(self, generation: str) -> str:
+        return f'{self.config.checkpoint_path}.{generation}.weights.bin'
+
+    def checkpoint_tc_paths(self, generation: str) -> Tuple[str, str]:
+        """TC 累加器 E、A 的附属文件路径，格式与二进制权重文件相同（float32）。"""
+        return (f'{self.config.checkpoint_path}.{generation}.tc-errors.bin',
+                f'{self.config.checkpoint_path}.{generation}.tc-abs-errors.bin')
+
+    def checkpoint_sidecars(self) -> List[str]:
+        """磁盘上属于本检查点的全部附属文件：各代，以及旧版不带代号的文件。"""
+        prefix = glob.escape(self.config.checkpoint_path)
+        return [
+            path
+            for suffix in ('.weights.bin', '.tc-errors.bin', '.tc-abs-errors.bin')
+            for path in glob.glob(prefix + suffix) + glob.glob(f'{prefix}.*{suffix}')
+        ]
+
+    def save_checkpoint(self, wait: bool = False) -> None:
+        """
+        拍摄权重快照后在后台线程写入检查点：先原子写入本代的二进制权重附属文件
+        （启用 Temporal Coherence 时还有两个累加器附属文件），文件名带代号（保存时刻的毫秒时间戳），
+        不会覆盖上一代；再原子写入 JSON 检查点（版本 3，按文件名引用本代附属文件，滚动统计紧凑编码），
+        JSON 替换完成即为提交点，之后删除其他各代的附属文件。任何时刻中断，JSON 引用的都是同一代的完整文件。
+        """
+        prof = self.profiler
+        start = clock() if prof is not None else 0.0
+
+        # 缓冲中的回放记录随检查点写入分块文件，进程被强制结束时最多丢失一个检查点间隔的转移
+        if self.recorder is not None:
+            self.recorder.flush()
+
+        snapshots = self.checkpoint_writer.capture(self.network)
+        metadata = self.build_metadata()
+        timestamp = int(time.time() * 1000)
+        weights_path = self.checkpoint_weights_path(str(timestamp))
+        tc_paths = self.checkpoint_tc_paths(str(timestamp))
+        temporal_coherence = None
+        if len(snapshots) > 1:
+            temporal_coherence = {
+                'errorsFile': os.path.basename(tc_paths[0]),
+                'absErrorsFile': os.path.basename(tc_paths[1]),
+            }
 
         checkpoint_data = CheckpointData(
-            version=1,
-            config=self.config.__dict__,
+            version=3,
+            config=dict(self.config.__dict__),
             episode=self.stats.episode,
             current_learning_rate=self.current_learning_rate,
             stats={
@@ -256,54 +541,112 @@ class Trainer:
                 'elapsedTime': self.stats.elapsed_time,
                 'estimatedRemaining': self.stats.estimated_remaining,
             },
-            milestone_count=self.milestone_count,
-            recent_scores=self.recent_scores,
-            weights=weights_config,
-            timestamp=int(time.time() * 1000),
+            milestone_count=dict(self.milestone_count),
+            recent_scores=None,
+            weights={'binaryFile': os.path.basename(weights_path)},
+            timestamp=timestamp,
+            rolling_stats=self.rolling.to_dict(),
+            temporal_coherence=temporal_coherence,
         )
-
-        with open(self.config.checkpoint_path, 'w', encoding='utf-8') as f:
-            json.dump(checkpoint_data.to_dict(), f, indent=2)
-
-    def save_weights_periodically(self) -> None:
-        metadata = {
-            'trainedGames': self.stats.episode,
-            'avgScore': round(self.stats.avg_score),
-            'maxTile': self.stats.max_tile,
-            'rate2048': round(self.stats.rate2048 * 10000) / 10000,
-            'rate4096': round(self.stats.rate4096 * 10000) / 10000,
-            'rate8192': round(self.stats.rate8192 * 10000) / 10000,
-            'trainingTime': round(self.stats.elapsed_time),
-        }
-
-        weights_config = self.network.export_weights(metadata)
-
-        with open(self.config.output_path, 'w', encoding='utf-8') as f:
-            json.dump(weights_config, f, indent=2)
-
-        print(f'\n  [权重已保存: {self.config.output_path} @ 第 {self.stats.episode} 轮]')
+        data = checkpoint_data.to_dict()
+        network = self.network
+        checkpoint_path = self.config.checkpoint_path
+
+        def write() -> None:
+            write_start = clock()
+            network.save_binary(weights_path, metadata, flat_weights=snapshots[0])
+            current = [weights_path]
+            for tc_path, tc_snapshot in zip(tc_paths, snapshots[1:]):
+                network.save_binary(tc_path, metadata, flat_weights=tc_snapshot)
+                current.append(tc_path)
+            save_json(checkpoint_path, data)
+            for stale in set(self.checkpoint_sidecars()) - set(current):
+                os.remove(stale)
+            if prof is not None:
+                prof.add_threadsafe('background.checkpoint_write', clock() - write_start)
+
+        self.checkpoint_writer.submit(write)
+        if wait:
+            self.checkpoint_writer.wait()
+
+        if prof is not None:
+            prof.add_threadsafe('checkpoint', clock() - start)
+
+    def save_weights_periodically(self, wait: bool = False) -> None:
+        prof = self.profiler
+        start = clock() if prof is not None else 0.0
+
+        snapshot = self.checkpoint_writer.capture(self.network)[0]
+        metadata = self.build_metadata()
+        path = self.config.output_path
+        episode = self.stats.episode
+
+        def write() -> None:
+            write_start = clock()
+            self.write_weights(path, snapshot, metadata)
+            if prof is not None:
+                prof.add_threadsafe('background.weights_write', clock() - write_start)
+            # 写入完成后才报告，写入失败时由 CheckpointWriter 打印错误
+            print(f'\n  [权重已保存: {path} @ 第 {episode} 轮]')
+
+        self.checkpoint_writer.submit(write)
+        if wait:
+            self.checkpoint_writer.wait()
+
+        if prof is not None:
+            prof.add_threadsafe('weights_save', clock() - start)
+
+    def report_incompatible(self, path: str) -> None:
+        """已有文件载入失败时不能从零开始训练，否则会覆盖它。"""
+        print(f'错误：{path} 无法作为当前训练的起点（见上方原因），为避免覆盖已停止训练。')
+        print('请换一个 --output / --checkpoint-path，或确认后删除该文件再重试。')
 
     def train(self, resume: bool = False) -> None:
         if resume:
             if not self.load_checkpoint():
+                if os.path.exists(self.config.checkpoint_path):
+                    self.report_incompatible(self.config.checkpoint_path)
+                    return
                 print('未找到检查点文件，尝试加载权重文件...')
                 if not self.load_weights():
+                    if os.path.exists(self.config.output_path):
+                        self.report_incompatible(self.config.output_path)
+                        return
                     print('未找到已有权重，从零开始训练。')
         else:
             if os.path.exists(self.config.output_path):
                 print(f'发现已有权重文件: {self.config.output_path}')
                 print('加载权重以继续训练...')
-                if self.load_weights():
-                    print()
-                else:
-                    print('加载权重失败，从零开始训练。')
-                    print()
+                if not self.load_weights():
+                    self.report_incompatible(self.config.output_path)
+                    return
+                print()
 
         print('=' * 60)
         print('N-Tuple Network 训练')
         print('=' * 60)
         print(f'训练轮数: {self.config.episodes}')
         print(f'学习率: {self.config.learning_rate}')
+        if self.config.algorithm == 'tdlambda':
+            print(f'学习算法: TD(λ) (λ={self.config.td_lambda}, 迹长度={self.config.trace_length})')
+        elif self.config.algorithm == 'nstep':
+            print(f'学习算法: {self.config.n_step} 步 TD')
+        else:
+            print('学习算法: TD(0)')
+        full_lookups, lookups = self.network.lookups_per_evaluation()
+        print(f'模式集: {self.config.pattern_set}（{len(self.network.source_patterns)} 个模式，'
+              f'{"/".join(sorted({str(len(p)) for p in self.network.source_patterns}))}-tuple）')
+        if lookups < full_lookups:
+            print(f'对称合并: {len(self.network.source_patterns)} 个模式 -> {len(self.network.patterns)} 个查找表，'
+                  f'每次评估查表 {full_lookups} -> {lookups} 次')
+        if self.network.num_stages > 1:
+            print(f'分阶段: {self.network.num_stages} 个阶段（阶段方块 '
+                  f'{"/".join(str(tile) for tile in self.network.stage_tiles())}），'
+                  f'权重 {self.network.flat_weights.nbytes / 2 ** 20:.1f} MB')
+        if self.network.tc_errors is not None:
+            tc_bytes = self.network.tc_errors.nbytes + self.network.tc_abs_errors.nbytes
+            print(f'自适应学习率: Temporal Coherence（累加器 {tc_bytes / 2 ** 20:.1f} MB，'
+                  f'权重 {self.network.flat_weights.nbytes / 2 ** 20:.1f} MB）')
         if self.config.enable_decay:
             print(f'学习率衰减: 启用 (衰减率={self.config.decay_rate}, 间隔={self.config.decay_interval})')
         else:
@@ -312,20 +655,39 @@ class Trainer:
         print(f'输出文件: {self.config.output_path}')
         print(f'检查点: {self.config.checkpoint_path} (每 {self.config.checkpoint_interval} 轮)')
         print(f'权重保存: 每 {self.config.weights_save_interval} 秒')
+        if self.config.parallel_games > 1:
+            print(f'并行对局: {self.config.parallel_games} 局同步推进')
+        if self.config.workers > 1:
+            print(f'训练进程: {self.config.workers} 个（共享内存权重）')
+        print(f'后端: {"numba" if self.episode_runner is not None else "python"}')
+        print(f'权重精度: {self.network.get_dtype()} | 导出: {self.output_dtype()}')
+        if self.quantized_export_path() is not None:
+            print(f'定点导出: {self.quantized_export_path()}（{self.config.export_dtype}，训练结束时写出）')
+        if self.profiler is not None:
+            print(f'分阶段计时: 启用（轨迹: {self.config.profile_path}）')
+        if self.recorder is not None:
+            print(f'记录转移: {self.config.record_dir}')
+        if self.network.max_tile_exponent < MAX_TILE_EXPONENT:
+            print(f'查找表: 降基数（方块上限 {1 << self.network.max_tile_exponent}），'
+                  f'共 {len(self.network.flat_weights):,} 项')
         if self.start_episode > 1:
             print(f'从第 {self.start_episode} 轮继续训练')
         print('=' * 60)
         print()
 
         self.start_time = time.time()
+        if self.profiler is not None:
+            self.profiler.reset()
         self.last_weights_save_time = self.start_time
-        last_progress_time = self.start_time
-        last_checkpoint_episode = self.start_episode - 1
+        self.last_progress_time = self.start_time
+        self.last_checkpoint_episode = self.start_episode - 1
 
         def handle_interrupt(signum, frame):
             print('\n\n训练中断！保存检查点和权重...')
-            self.save_checkpoint()
-            self.save_weights_periodically()
+            self.save_checkpoint(wait=True)
+            self.save_weights_periodically(wait=True)
+            self.save_profile()
+            self.close_recorder()
             print('检查点和权重已保存。使用 --resume 标志继续训练。')
             sys.exit(0)
 
@@ -337,97 +699,411 @@ class Trainer:
             print('保存初始权重...')
             self.save_weights_periodically()
 
-        for ep in range(self.start_episode, self.config.episodes + 1):
-            result = self.train_episode()
-            self.update_stats(ep, result)
-
-            if self.config.enable_decay and ep % self.config.decay_interval == 0:
-                self.current_learning_rate *= self.config.decay_rate
-
-            now = time.time()
-            time_since_last_progress = now - last_progress_time
-
-            if ep % self.config.report_interval == 0 or time_since_last_progress >= 5:
-                self.report_progress()
-                last_progress_time = now
-            elif ep % 10 == 0 and ep < self.start_episode + 100:
-                print('.', end='', flush=True)
-
-            if self.config.checkpoint_interval > 0 and ep - last_checkpoint_episode >= self.config.checkpoint_interval:
-                self.save_checkpoint()
-                last_checkpoint_episode = ep
-
-            if self.config.weights_save_interval > 0:
-                time_since_last_save = now - self.last_weights_save_time
-                if time_since_last_save >= self.config.weights_save_interval:
-                    self.save_weights_periodically()
-                    self.last_weights_save_time = now
+        if self.config.workers > 1:
+            self.train_workers()
+        elif self.config.parallel_games > 1:
+            self.train_lockstep()
+        else:
+            for ep in range(self.start_episode, self.config.episodes + 1):
+                result = self.train_episode()
+                self.finish_episode(ep, result)
 
         print()
         print('=' * 60)
         print('训练完成！')
         print('=' * 60)
         self.report_progress()
+        self.report_table_usage()
+        self.checkpoint_writer.wait()
         self.save_weights()
+        self.save_profile()
+        self.close_recorder()
 
+        # 先删除 JSON（提交点），中途中断时不会留下引用缺失文件的检查点
         if os.path.exists(self.config.checkpoint_path):
             os.remove(self.config.checkpoint_path)
             print('检查点文件已删除。')
+        for sidecar in self.checkpoint_sidecars():
+            os.remove(sidecar)
+
+    def finish_episode(self, ep: int, result: EpisodeResult) -> None:
+        prof = self.profiler
+        start = clock() if prof is not None else 0.0
+
+        self.update_stats(ep, result)
+
+        if prof is not None:
+            start = prof.lap('stats', start)
+
+        if self.config.enable_decay and ep % self.config.decay_interval == 0:
+            self.current_learning_rate *= self.config.decay_rate
+
+        now = time.time()
+        time_since_last_progress = now - self.last_progress_time
+
+        if ep % self.config.report_interval == 0 or time_since_last_progress >= 5:
+            self.report_progress()
+            self.last_progress_time = now
+        elif ep % 10 == 0 and ep < self.start_episode + 100:
+            print('.', end='', flush=True)
+
+        if prof is not None:
+            prof.lap('report', start)
+
+        if self.config.checkpoint_interval > 0 and ep - self.last_checkpoint_episode >= self.config.checkpoint_interval:
+            self.save_checkpoint()
+            self.last_checkpoint_episode = ep
+
+        if self.config.weights_save_interval > 0:
+            time_since_last_save = now - self.last_weights_save_time
+            if time_since_last_save >= self.config.weights_save_interval:
+                self.save_weights_periodically()
+                self.last_weights_save_time = now
+
+    def train_workers(self) -> None:
+        """
+        多进程训练：权重表放入共享内存，workers 个子进程各自自我对弈并无锁更新权重，
+        主进程汇总统计、衰减学习率并负责检查点和权重保存。
+        """
+        total = self.config.episodes - self.start_episode + 1
+        ctx = multiprocessing.get_context()
+
+        block = self.network.share_memory()
+        claimed = ctx.Value('q', 0)
+        learning_rate = ctx.Value('d', self.current_learning_rate, lock=False)
+        results = ctx.Queue()
+
+        processes = [
+            ctx.Process(
+                target=run_worker,
+                args=(
+                    self.network.source_patterns,
+                    block.name,
+                    self.config,
+                    total,
+                    claimed,
+                    learning_rate,
+                    results,
+                ),
+                daemon=True,
+            )
+            for _ in range(self.config.workers)
+        ]
+
+        try:
+            for process in processes:
+                process.start()
+
+            ep = self.start_episode
+            finished_workers = 0
+            while finished_workers < len(processes):
+                try:
+                    item = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        break
+                    continue
+
+                if item is None:
+                    finished_workers += 1
+                    continue
+
+                self.finish_episode(ep, EpisodeResult(*item))
+                learning_rate.value = self.current_learning_rate
+                ep += 1
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            self.network.release_shared_memory(block)
+
+    def train_lockstep(self) -> None:
+        """
+        同步推进 parallel_games 局游戏：每步用一次批量查表评估全部 4×N 个后继状态，
+        并批量应用 TD(0) 更新。结束的对局立即替换为新对局，保持批次满载。
+        上一步所选后继状态的索引向量随估值一起保存，TD 更新时不再重新提取特征。
+        """
+        total = self.config.episodes - self.start_episode + 1
+        n = min(self.config.parallel_games, total)
+        rng = np.random.default_rng()
+
+        boards = new_board_batch(n, rng)
+        scores = np.zeros(n, dtype=np.int64)
+        moves = np.zeros(n, dtype=np.int64)
+        prev_indices = np.zeros((n, self.network.features.num_features), dtype=np.int64)
+        prev_values = np.zeros(n, dtype=np.float64)
+        prev_afterstates = np.zeros(n, dtype=np.uint64)
+        has_prev = np.zeros(n, dtype=bool)
+        active = np.ones(n, dtype=bool)
+
+        launched = n
+        next_episode = self.start_episode
+
+        prof = self.profiler
+
+        while active.any():
+            start = t = clock() if prof is not None else 0.0
+            slots = np.flatnonzero(active)
+            current = boards[slots]
+            m = len(slots)
+
+            afterstates = np.empty((4, m), dtype=np.uint64)
+            rewards = np.empty((4, m), dtype=np.float64)
+            valid = np.empty((4, m), dtype=bool)
+            for dir in range(4):
+                afterstates[dir], rewards[dir], valid[dir] = move_batch(current, dir)
+
+            if prof is not None:
+                t = prof.lap('select_move.move', t)
+
+            values, indices = self.network.evaluate_batch_with_indices(afterstates.ravel())
+            values = values.reshape(4, m)
+            indices = indices.reshape(4, m, -1)
+
+            if prof is not None:
+                t = prof.lap('select_move.evaluate', t)
+                prof.add('select_move', t - start)
+
+            best = np.where(valid, rewards + values, -np.inf).argmax(axis=0)
+            alive = valid.any(axis=0)
+
+            columns = np.arange(m)
+            chosen = afterstates[best, columns]
+            chosen_reward = rewards[best, columns]
+            chosen_value = values[best, columns]
+            chosen_indices = indices[best, columns]
+
+            target = np.where(alive, chosen_reward + chosen_value, 0.0)
+            update = has_prev[slots]
+            deltas = self.current_learning_rate * (target - prev_values[slots])
+            self.network.update_weights_batch_by_indices(
+                prev_indices[slots][update], deltas[update], average_overlaps=True
+            )
+            if self.recorder is not None:
+                self.recorder.add_batch(
+                    prev_afterstates[slots][update],
+                    np.where(alive, chosen_reward, 0)[update].astype(np.uint32),
+                    np.where(alive, chosen, np.uint64(0))[update],
+                )
+
+            if prof is not None:
+                t = prof.lap('td_update', t)
+
+            live = slots[alive]
+            prev_indices[live] = chosen_indices[alive]
+            prev_values[live] = chosen_value[alive]
+            prev_afterstates[live] = chosen[alive]
+            has_prev[live] = True
+            scores[live] += chosen_reward[alive].astype(np.int64)
+            moves[live] += 1
+            boards[live] = add_random_tile_batch(chosen[alive], rng)
+
+            if prof is not None:
+                prof.lap('spawn', t)
+
+            for slot in slots[~alive]:
+                result = EpisodeResult(
+                    score=int(scores[slot]),
+                    max_tile=get_max_tile(int(boards[slot])),
+                    moves=int(moves[slot]),
+                )
+                self.finish_episode(next_episode, result)
+                next_episode += 1
+
+                if launched < total:
+                    boards[slot] = new_board_batch(1, rng)[0]
+                    scores[slot] = 0
+                    moves[slot] = 0
+                    has_prev[slot] = False
+                    launched += 1
+                else:
+                    active[slot] = False
+
+    def train_replay(self) -> None:
+        """
+        离线训练：不进行自我对弈，把 replay_dir 中记录的转移按打乱的小批量回放，
+        每批一次向量化 TD(0) 更新（见 replay.replay_td_update），共 replay_epochs 遍。
+        启用学习率衰减时每遍结束后衰减一次。已有输出权重时在其基础上继续训练。
+        """
+        dataset = ReplayDataset(self.config.replay_dir)
+        if len(dataset) == 0:
+            print(f'错误：{self.config.replay_dir} 中没有回放记录')
+            return
+
+        if os.path.exists(self.config.output_path):
+            print(f'发现已有权重文件: {self.config.output_path}')
+            if not self.load_weights():
+                self.report_incompatible(self.config.output_path)
+                return
+            print()
+
+        total = len(dataset) * self.config.replay_epochs
+        print('=' * 60)
+        print('N-Tuple Network 离线回放训练')
+        print('=' * 60)
+        print(f'回放数据: {self.config.replay_dir}（{len(dataset.chunks)} 个分块，'
+              f'{len(dataset):,} 条转移，{dataset.episodes:,} 局）')
+        print(f'遍数: {self.config.replay_epochs} | 批大小: {self.config.batch_size}')
+        print(f'学习率: {self.config.learning_rate}')
+        if self.config.enable_decay:
+            print(f'学习率衰减: 每遍 × {self.config.decay_rate}')
+        print(f'输出文件: {self.config.output_path}')
+        print('=' * 60)
+        print()
+
+        def handle_interrupt(signum, frame):
+            print('\n\n训练中断！保存权重...')
+            self.save_weights_periodically(wait=True)
+            self.save_profile()
+            sys.exit(0)
+
+        signal.signal(signal.SIGINT, handle_interrupt)
+        if hasattr(signal, 'SIGTERM'):
+            signal.signal(signal.SIGTERM, handle_interrupt)
+
+        rng = np.random.default_rng(self.config.seed)
+        prof = self.profiler
+        self.start_time = time.time()
+        self.last_weights_save_time = self.start_time
+        self.last_progress_time = 0.0
+        processed = 0
+
+        for epoch in range(1, self.config.replay_epochs + 1):
+            error_sum = 0.0
+            batches = 0
+            for batch in dataset.batches(self.config.batch_size, rng):
+                start = clock() if prof is not None else 0.0
+                error_sum += replay_td_update(self.network, batch, self.current_learning_rate)
+                if prof is not None:
+                    prof.add('replay_update', clock() - start)
+                batches += 1
+                processed += len(batch)
+
+                now = time.time()
+                if now - self.last_progress_time >= 1:
+                    elapsed = max(now - self.start_time, 1e-9)
+                    print(f'\r遍: {epoch}/{self.config.replay_epochs} | 转移: {processed:,}/{total:,} | '
+                          f'平均 |TD 误差|: {error_sum / batches:8.2f} | 速度: {processed / elapsed:,.0f} 条/秒',
+                          end='', flush=True)
+                    self.last_progress_time = now
+
+                if self.config.weights_save_interval > 0:
+                    if now - self.last_weights_save_time >= self.config.weights_save_interval:
+                        self.save_weights_periodically()
+                        self.last_weights_save_time = now
+
+            print()
+            print(f'  遍 {epoch} 完成 | 平均 |TD 误差|: {error_sum / batches:.2f} | '
+                  f'学习率: {self.current_learning_rate:.2e}')
+            if self.config.enable_decay:
+                self.current_learning_rate *= self.config.decay_rate
+
+        self.stats.elapsed_time = time.time() - self.start_time
+        print(f'离线训练完成：{processed:,} 条转移，用时 {self.stats.elapsed_time:.1f} 秒')
+        self.checkpoint_writer.wait()
+        self.save_weights()
+        self.save_profile()
 
     def train_episode(self) -> EpisodeResult:
+        # 启用 --profile 时每个阶段前后各取一次时钟；关闭时只剩 prof 的 None 判断
+        prof = self.profiler
+
+        if self.episode_runner is not None:
+            start = clock() if prof is not None else 0.0
+            score, max_tile, moves = self.episode_runner.train_episode(self.current_learning_rate)
+            if prof is not None:
+                prof.add('episode_native', clock() - start)
+            return EpisodeResult(score=score, max_tile=max_tile, moves=moves)
+
         game = Game()
         game.init()
 
+        learner = self.learner
+        learner.start_episode()
+        recorder = self.recorder
+        prev_afterstate = 0
         moves = 0
-        prev_afterstate: Optional[Board] = None
-        prev_value = 0.0
 
-        while not game.is_game_over():
-            best_move = self.select_best_move(game)
+        while True:
+            # 选择时已算出后继状态、奖励、索引向量和估值，这里直接复用；没有合法移动即游戏结束
+            choice = self.select_best_afterstate(game)
 
-            if best_move == -1:
+            if choice is None:
                 break
 
-            afterstate_result = game.get_afterstate(best_move)
+            _, afterstate, reward, indices, current_value = choice
+            t = clock() if prof is not None else 0.0
 
-            if afterstate_result is None:
-                continue
+            learner.step(indices, current_value, reward, self.current_learning_rate)
+            if recorder is not None:
+                if prev_afterstate != 0:
+                    recorder.add(prev_afterstate, reward, afterstate)
+                prev_afterstate = afterstate
 
-            afterstate, reward = afterstate_result
-            current_value = self.network.evaluate(afterstate)
+            if prof is not None:
+                t = prof.lap('td_update', t)
 
-            if prev_afterstate is not None:
-                td_error = reward + current_value - prev_value
-                self.network.update_weights(prev_afterstate, self.current_learning_rate * td_error)
-
-            game.move(best_move)
+            game.apply_afterstate(afterstate, reward)
             game.add_random_tile()
 
-            prev_afterstate = afterstate
-            prev_value = current_value
+            if prof is not None:
+                t = prof.lap('spawn', t)
+
             moves += 1
 
-        if prev_afterstate is not None:
-            final_td_error = 0 - prev_value
-            self.network.update_weights(prev_afterstate, self.current_learning_rate * final_td_error)
+        t = clock() if prof is not None else 0.0
+        learner.finish_episode(self.current_learning_rate)
+        if recorder is not None and prev_afterstate != 0:
+            recorder.add(prev_afterstate, 0, 0)
+
+        if prof is not None:
+            prof.lap('td_update', t)
 
         return EpisodeResult(score=game.score, max_tile=game.get_max_tile(), moves=moves)
 
-    def select_best_move(self, game: Game) -> Direction:
-        best_dir: Direction = -1
-        best_value = float('-inf')
+    def select_best_afterstate(
+        self, game: Game
+    ) -> Optional[Tuple[Direction, Board, int, np.ndarray, float]]:
+        """
+        贪心选择 reward + V(afterstate) 最大的移动。
+
+        Returns:
+            (方向, 后继状态, 奖励, 后继状态的索引向量, 后继状态的估值)，没有合法移动时返回 None。
+            索引向量和估值可直接用于 TD 更新，不必重新提取和评估
+        """
+        prof = self.profiler
+        if prof is not None:
+            start = t = clock()
+
+        best: Optional[Tuple[Direction, Board, int, np.ndarray, float]] = None
+        best_total = float('-inf')
 
         for dir in range(4):
             result = game.get_afterstate(dir)
 
+            if prof is not None:
+                t = prof.lap('select_move.move', t)
+
             if result is not None:
-                value = result[1] + self.network.evaluate(result[0])
+                afterstate, reward = result
+                value, indices = self.network.evaluate_with_indices(afterstate)
+
+                if prof is not None:
+                    t = prof.lap('select_move.evaluate', t)
+
+                if reward + value > best_total:
+                    best_total = reward + value
+                    best = (dir, afterstate, reward, indices, value)
 
-                if value > best_value:
-                    best_value = value
-                    best_dir = dir
+        if prof is not None:
+            prof.add('select_move', clock() - start)
 
-        return best_dir
+        return best
+
+    def select_best_move(self, game: Game) -> Direction:
+        choice = self.select_best_afterstate(game)
+        return -1 if choice is None else choice[0]
 
     def get_current_learning_rate(self) -> float:
         return self.current_learning_rate
@@ -451,12 +1127,8 @@ class Trainer:
         self.stats.rate4096 = self.milestone_count['tile4096'] / episode
         self.stats.rate8192 = self.milestone_count['tile8192'] / episode
 
-        self.recent_scores.append(result.score)
-        if len(self.recent_scores) > 1000:
-            self.recent_scores.pop(0)
-
-        recent_sum = sum(self.recent_scores)
-        self.stats.recent_avg_score = recent_sum / len(self.recent_scores)
+        self.rolling.push(result.score, result.max_tile)
+        self.stats.recent_avg_score = self.rolling.mean(self.rolling.windows[0])
 
         now = time.time()
         self.stats.elapsed_time = now - self.start_time
@@ -497,25 +1169,64 @@ class Trainer:
                   f'4096: {self.stats.rate4096 * 100:5.1f}% | '
                   f'8192: {self.stats.rate8192 * 100:5.1f}% | '
                   f'学习率: {self.current_learning_rate:.2e}')
+            print('  ' + ' | '.join(self.format_window(window) for window in self.rolling.windows))
+            if self.profiler is not None:
+                print(f'  耗时: {self.profiler.format_breakdown()}')
+                self.profiler.sample(self.stats.episode)
+
+    def report_table_usage(self) -> None:
+        """打印每个查找表被本次训练的 TD 更新触及的条目比例，用于判断表是否可以缩小。"""
+        fractions = self.network.touched_fractions()
+        total = len(self.network.flat_weights)
+        touched = sum(f * size for f, size in zip(fractions, self.network.stored_lut_sizes()))
+        print(f'查找表使用率: {touched / total * 100:.2f}% ({int(touched):,}/{total:,} 项)')
+        count = len(self.network.patterns)
+        for start in range(0, len(fractions), count):
+            prefix = f'阶段 {start // count}: ' if self.network.num_stages > 1 else ''
+            print('  ' + prefix + ' | '.join(
+                f'#{i}: {f * 100:.2f}%' for i, f in enumerate(fractions[start:start + count])
+            ))
+
+    def format_window(self, window: int) -> str:
+        """一个滚动窗口的摘要：均分、中位数、2048 到达率。"""
+        size = self.rolling.size(window)
+        label = f'{window // 1000}k' if window % 1000 == 0 else str(window)
+        if size == 0:
+            return f'近 {label}: -'
+        median = self.rolling.percentiles(window, (50,))['50']
+        return (f'近 {label}: 均分 {self.rolling.mean(window):.0f} 中位 {median:.0f} '
+                f'2048 {self.rolling.reach_rate(window, 2048) * 100:.1f}%')
+
+    def save_profile(self) -> None:
+        if self.profiler is None or self.config.profile_path is None:
+            return
+
+        trace = self.profiler.to_dict()
+        trace['episodes'] = self.stats.episode
+        trace['episodesThisRun'] = self.stats.episode - self.start_episode + 1
+        trace['backend'] = 'numba' if self.episode_runner is not None else 'python'
+        trace['parallelGames'] = self.config.parallel_games
+        trace['workers'] = self.config.workers
+        save_json(self.config.profile_path, trace)
+        print(f'分阶段计时已写入: {self.config.profile_path}')
+
+    def close_recorder(self) -> None:
+        """写出缓冲中的转移并关闭回放分块文件。"""
+        if self.recorder is None:
+            return
+        self.recorder.close()
+        print(f'已记录 {self.recorder.records:,} 条转移到: {self.config.record_dir}')
 
     def save_weights(self) -> None:
-        metadata = {
-            'trainedGames': self.stats.episode,
-            'avgScore': round(self.stats.avg_score),
-            'maxTile': self.stats.max_tile,
-            'rate2048': round(self.stats.rate2048 * 10000) / 10000,
-            'rate4096': round(self.stats.rate4096 * 10000) / 10000,
-            'rate8192': round(self.stats.rate8192 * 10000) / 10000,
-            'trainingTime': round(self.stats.elapsed_time),
-        }
-
-        weights_config = self.network.export_weights(metadata)
-
-        with open(self.config.output_path, 'w', encoding='utf-8') as f:
-            json.dump(weights_config, f, indent=2)
+        self.write_weights(self.config.output_path)
 
         print(f'权重已保存到: {self.config.output_path}')
 
+        quantized_path = self.quantized_export_path()
+        if quantized_path is not None:
+            self.write_weights(quantized_path, dtype=self.config.export_dtype)
+            print(f'定点权重已导出到: {quantized_path}')
+
     def get_stats(self) -> TrainingStats:
         return self.stats
 
@@ -0,0 +1,247 @@
+"""
+2048 N-Tuple Network Training - Weight File I/O
+
+权重文件读写，支持两种格式：
+
+1. JSON 格式（与 Web 应用兼容）：{"version", "patterns", "weights", "metadata"}
+2. 二进制格式（.bin）：适合大型 6-tuple 网络，可用 np.memmap 零拷贝加载
+
+二进制文件布局：
+  magic        8 字节   b'NTWEIGHT'
+  version      uint32   格式版本
+  header_size  uint32   JSON 头部字节数（含对齐填充）
+  header       JSON     {"patterns", "lutSizes", "dtype", "metadata"[, "scales"][, "maxTileExponent"][, "stageTiles"]
+                         [, "sourcePatterns"]}
+  data         原始小端数组，按模式顺序首尾相接，起始位置 64 字节对齐
+
+数据类型可以是 float64、float32，或 int16/int8 定点数。定点格式每个元组一个缩放系数
+（header["scales"]），真实权重 = 定点值 × scale，读取时自动还原为 float32。
+
+降基数查找表（见 patterns.calculate_lut_size）在头部记录 maxTileExponent，数据保持压缩布局；
+转换为 JSON 时展开成标准的 16 ** n 布局。
+
+分阶段网络在头部记录 stageTiles，例如 [8192, 16384]：
+棋盘上出现的这些方块个数决定所用的阶段。lutSizes 依次为各阶段的整套查找表，
+共 (len(stageTiles) + 1) × len(patterns) 个；patterns 只列出一次。
+Web 应用的 JSON 格式要求模式与查找表一一对应，分阶段权重只能写成二进制格式
+（binary_to_config 仍可把它读成带 stageTiles 的配置字典，供训练器内部载入）。
+
+训练器合并了对称模式时（见 network.find_pattern_orbits），patterns 为合并后的代表模式，
+数据即训练时的扁平数组，头部另以 sourcePatterns 记录原始模式列表；载入时由它重建同样的网络，
+数据可直接内存映射。展开回原始模式布局需要网络的合并信息，由 NTupleNetwork.export_weights 完成。
+"""
+
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import json
+import struct
+import numpy as np
+from file_io import atomic_write, save_json
+from patterns import MAX_TILE_EXPONENT, Pattern, convert_lut
+
+BINARY_MAGIC = b'NTWEIGHT'
+BINARY_VERSION = 1
+BINARY_ALIGNMENT = 64
+PREFIX_FORMAT = '<8sII'
+PREFIX_SIZE = struct.calcsize(PREFIX_FORMAT)
+
+FLOAT_DTYPES = {'float64': np.float64, 'float32': np.float32}
+QUANTIZED_DTYPES = {'int16': np.int16, 'int8': np.int8}
+
+
+def is_binary_weights(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except OSError:
+        return False
+
+
+def build_binary_header(
+    patterns: List[Pattern],
+    lut_sizes: List[int],
+    dtype: np.dtype,
+    metadata: Optional[Dict[str, Any]],
+    scales: Optional[List[float]] = None,
+    max_tile_exponent: int = MAX_TILE_EXPONENT,
+    stage_tiles: Optional[List[int]] = None,
+    source_patterns: Optional[List[Pattern]] = None,
+) -> bytes:
+    fields = {
+        'patterns': patterns,
+        'lutSizes': lut_sizes,
+        'dtype': np.dtype(dtype).newbyteorder('<').str,
+        'metadata': metadata,
+    }
+    if scales is not None:
+        fields['scales'] = scales
+    if max_tile_exponent != MAX_TILE_EXPONENT:
+        fields['maxTileExponent'] = max_tile_exponent
+    if stage_tiles:
+        fields['stageTiles'] = stage_tiles
+    if source_patterns is not None:
+        fields['sourcePatterns'] = source_patterns
+    header = json.dumps(fields).encode('utf-8')
+
+    padding = -(PREFIX_SIZE + len(header)) % BINARY_ALIGNMENT
+    header += b' ' * padding
+    return struct.pack(PREFIX_FORMAT, BINARY_MAGIC, BINARY_VERSION, len(header)) + header
+
+
+def quantize_weights(
+    flat_weights: np.ndarray,
+    lut_sizes: List[int],
+    dtype: np.dtype,
+) -> Tuple[np.ndarray, List[float]]:
+    """
+    把权重量化为对称定点数，每个元组一个缩放系数：scale = max|w| / 定点最大值。
+    """
+    limit = np.iinfo(dtype).max
+    quantized = np.empty(len(flat_weights), dtype=dtype)
+    scales: List[float] = []
+    offset = 0
+    for size in lut_sizes:
+        table = np.asarray(flat_weights[offset:offset + size], dtype=np.float64)
+        peak = float(np.abs(table).max()) if size > 0 else 0.0
+        scale = peak / limit if peak > 0 else 1.0
+        quantized[offset:offset + size] = np.clip(np.rint(table / scale), -limit, limit)
+        scales.append(scale)
+        offset += size
+    return quantized, scales
+
+
+def dequantize_weights(
+    quantized: np.ndarray,
+    lut_sizes: List[int],
+    scales: List[float],
+    dtype: np.dtype = np.float32,
+) -> np.ndarray:
+    flat_weights = np.empty(len(quantized), dtype=dtype)
+    offset = 0
+    for size, scale in zip(lut_sizes, scales):
+        np.multiply(quantized[offset:offset + size], scale, out=flat_weights[offset:offset + size])
+        offset += size
+    return flat_weights
+
+
+def save_binary_weights(
+    path: str,
+    patterns: List[Pattern],
+    lut_sizes: List[int],
+    flat_weights: np.ndarray,
+    metadata: Optional[Dict[str, Any]] = None,
+    dtype: Optional[str] = None,
+    max_tile_exponent: int = MAX_TILE_EXPONENT,
+    stage_tiles: Optional[List[int]] = None,
+    source_patterns: Optional[List[Pattern]] = None,
+) -> None:
+    """
+    Args:
+        dtype: 存储类型（FLOAT_DTYPES 或 QUANTIZED_DTYPES 的键），为 None 时沿用权重数组的类型
+        max_tile_exponent: 查找表的指数上限，小于 15 时 lut_sizes 为降基数布局的大小
+        stage_tiles: 分阶段网络的阶段方块，lut_sizes 依次为各阶段的整套查找表
+        source_patterns: patterns 为合并后的代表模式时，合并前的原始模式列表
+    """
+    scales: Optional[List[float]] = None
+    if dtype in QUANTIZED_DTYPES:
+        flat_weights, scales = quantize_weights(flat_weights, lut_sizes, QUANTIZED_DTYPES[dtype])
+    elif dtype is not None:
+        flat_weights = np.asarray(flat_weights, dtype=FLOAT_DTYPES[dtype])
+
+    data = np.ascontiguousarray(flat_weights, dtype=flat_weights.dtype.newbyteorder('<'))
+
+    def write(f: BinaryIO) -> None:
+        f.write(build_binary_header(
+            patterns, lut_sizes, data.dtype, metadata, scales, max_tile_exponent, stage_tiles, source_patterns
+        ))
+        f.write(memoryview(data).cast('B'))
+
+    atomic_write(path, write)
+
+
+def load_binary_weights(path: str, mmap_mode: Optional[str] = 'r') -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    读取二进制权重文件。
+
+    Args:
+        path: 文件路径
+        mmap_mode: 传给 np.memmap 的模式（'r' 只读零拷贝，'c' 写时复制）；
+                   为 None 时把数据完整读入内存。定点格式总是还原为内存中的 float32 数组
+
+    Returns:
+        (header, flat_weights)
+    """
+    with open(path, 'rb') as f:
+        magic, version, header_size = struct.unpack(PREFIX_FORMAT, f.read(PREFIX_SIZE))
+        if magic != BINARY_MAGIC:
+            raise ValueError(f'Not a binary weights file: {path}')
+        if version != BINARY_VERSION:
+            raise ValueError(f'Unsupported binary weights version: expected {BINARY_VERSION}, got {version}')
+        header = json.loads(f.read(header_size).decode('utf-8'))
+
+    dtype = np.dtype(header['dtype'])
+    count = sum(header['lutSizes'])
+    offset = PREFIX_SIZE + header_size
+
+    if mmap_mode is None:
+        flat_weights = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+    else:
+        flat_weights = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=(count,))
+
+    if len(flat_weights) != count:
+        raise ValueError(f'Truncated binary weights file: expected {count} entries, got {len(flat_weights)}')
+
+    if 'scales' in header:
+        flat_weights = dequantize_weights(flat_weights, header['lutSizes'], header['scales'])
+
+    return header, flat_weights
+
+
+def binary_to_config(header: Dict[str, Any], flat_weights: np.ndarray) -> Dict[str, Any]:
+    """未合并布局的二进制权重转换为配置字典；合并布局（带 sourcePatterns）须经 NTupleNetwork 展开。"""
+    if 'sourcePatterns' in header:
+        raise ValueError('Merged binary weights must be expanded by NTupleNetwork.export_weights')
+    exponent = header.get('maxTileExponent', MAX_TILE_EXPONENT)
+    stage_tiles = header.get('stageTiles', [])
+    weights: List[List[float]] = []
+    offset = 0
+    for pattern, size in zip(header['patterns'] * (len(stage_tiles) + 1), header['lutSizes']):
+        table = np.asarray(flat_weights[offset:offset + size], dtype=np.float64)
+        weights.append(convert_lut(table, len(pattern), exponent, MAX_TILE_EXPONENT).tolist())
+        offset += size
+
+    config = {
+        'version': 1,
+        'patterns': header['patterns'],
+        'weights': weights,
+        'metadata': header['metadata'],
+    }
+    if stage_tiles:
+        config['stageTiles'] = stage_tiles
+    return config
+
+
+def config_to_flat(config: Dict[str, Any]) -> Tuple[List[int], np.ndarray]:
+    lut_sizes = [len(w) for w in config['weights']]
+    flat_weights = np.concatenate([np.asarray(w, dtype=np.float64) for w in config['weights']])
+    return lut_sizes, flat_weights
+
+
+def check_json_exportable(config: Dict[str, Any]) -> None:
+    """Web 应用的 JSON 加载器要求模式数等于查找表数，分阶段权重写成 JSON 会被它拒绝。"""
+    if config.get('stageTiles'):
+        raise ValueError('Staged weights (stageTiles) can only be saved as .bin; the web app JSON format has no stages')
+
+
+def load_weights_config(path: str) -> Dict[str, Any]:
+    """读取任意格式的权重文件并返回 JSON 格式的配置字典。"""
+    if is_binary_weights(path):
+        header, flat_weights = load_binary_weights(path)
+        return binary_to_config(header, flat_weights)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json_weights(path: str, config: Dict[str, Any]) -> None:
+    check_json_exportable(config)
+    save_json(path, config)